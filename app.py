@@ -63,8 +63,9 @@ def main():
     with open('bundestweets/data/translation_set.json', 'r') as fp:
         translation_set = json.load(fp)
         
-    # transform tweet messages to sets of words (for topics page)
-    wordsets = vis_helpers.get_tweets_as_wordsets(content_tweets)
+    # token cube or keyword index for the topics page if they match the loaded tweets,
+    # otherwise vectorize the tweet messages
+    topic_engine, index, cube = vis_helpers.get_topic_backends(content_tweets, args.local)
     nmf_topics = vis_helpers.get_nmf_results()
 
     analysis = {
@@ -74,7 +75,9 @@ def main():
         "how_many": how_many,
         "member_stats": member_stats,
         "translation_set": translation_set,
-        "wordsets": wordsets,
+        "topic_engine": topic_engine,
+        "keyword_index": index,
+        "token_cube": cube,
         "topics": nmf_topics
     }
     
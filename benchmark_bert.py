@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""CPU throughput benchmark of the BERT model for offensive language identification:
+Runs the inference modes on the same tweets and compares tweets per second
+and the largest deviation of the probabilities from the default mode.
+Uses the pre-trained model if available, otherwise a randomly initialized one.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+import bundestweets.bert as bert
+import bundestweets.bert_benchmark as bert_benchmark
+from farm.infer import Inferencer
+
+MODES = ["padded", "bucketed", "proba", "stream", "int8", "onnx", "torchscript"]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model_dir", default=bert.BERT_MODEL_DIR, help="Directory of the pre-trained model")
+parser.add_argument("--n_tweets", type=int, default=1000, help="Number of synthetic tweets")
+parser.add_argument("--batch_size", type=int, default=32, help="Number of tweets per batch")
+parser.add_argument("--modes", nargs="+", default=["padded", "bucketed"], choices=MODES,
+                    help="Inference modes to compare (proba: predict_proba instead of run_inference, stream: "
+                         "stream_proba with background featurization, int8: quantized, "
+                         "onnx: ONNX Runtime, torchscript: traced, all bucketed)")
+parser.add_argument("--repeat", type=int, default=1, help="Number of runs per mode (best is reported)")
+parser.add_argument("--threads", type=int, default=None, help="Number of PyTorch threads (per worker)")
+parser.add_argument("--workers", type=int, nargs="*", default=[],
+                    help="Numbers of worker processes to compare for sharded scoring (bert.iter_bert_proba)")
+parser.add_argument("--layers", type=int, default=12, help="Number of layers of the random model")
+args = parser.parse_args()
+
+
+def load_inferencer(model_dir, mode, work_dir):
+    if mode == "onnx":
+        # export to the working directory
+        onnx_dir = os.path.join(work_dir, "onnx")
+        inferencer = Inferencer.load(model_dir, backend="torch")
+        inferencer.model.export_onnx(onnx_dir)
+        inferencer.processor.save(onnx_dir)
+        return Inferencer.load(onnx_dir, batch_size=args.batch_size, bucket_by_length=True, n_threads=args.threads)
+    if mode == "torchscript":
+        torchscript_dir = os.path.join(work_dir, "torchscript")
+        inferencer = Inferencer.load(model_dir, backend="torch")
+        inferencer.model.export_torchscript(torchscript_dir)
+        inferencer.processor.save(torchscript_dir)
+        return Inferencer.load(torchscript_dir, batch_size=args.batch_size, bucket_by_length=True,
+                               warmup_shapes=[(args.batch_size, 32), (args.batch_size, 64)])
+    return Inferencer.load(model_dir, batch_size=args.batch_size, bucket_by_length=(mode != "padded"),
+                           quantize=(mode == "int8"))
+
+
+def main():
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    # get model
+    if os.path.isdir(args.model_dir):
+        run_benchmark(args.model_dir)
+    else:
+        print(f'No model in {args.model_dir}, using a random model with {args.layers} layers.')
+        with tempfile.TemporaryDirectory(prefix="bert_benchmark_") as model_dir:
+            bert_benchmark.make_random_model(model_dir, num_hidden_layers=args.layers)
+            run_benchmark(model_dir)
+
+
+def run_benchmark(model_dir):
+
+    texts = bert_benchmark.make_synthetic_tweets(n_tweets=args.n_tweets)
+    print(f'Scoring {len(texts)} tweets with batch size {args.batch_size} '
+          f'on {torch.get_num_threads()} threads ...')
+
+    reference = None
+    for mode in args.modes:
+        # (exported models are held in memory once loaded)
+        with tempfile.TemporaryDirectory(prefix="bert_benchmark_") as work_dir:
+            inferencer = load_inferencer(model_dir, mode, work_dir)
+        if reference is None:
+            tweets_per_second = bert_benchmark.time_featurization(inferencer.processor, texts, word_cache=False)
+            print(f'featurization only: {tweets_per_second:8.1f} tweets/s')
+            tweets_per_second = bert_benchmark.time_featurization(inferencer.processor, texts)
+            stats = inferencer.processor.tokenizer.word_cache.stats()
+            print(f'featurization only (word cache): {tweets_per_second:8.1f} tweets/s, '
+                  f"{stats['hit_rate']:.1%} hits")
+        if mode in ["proba", "stream"]:
+            time_function = bert_benchmark.time_predict_proba if mode == "proba" else bert_benchmark.time_stream_proba
+            tweets_per_second, class_proba = time_function(inferencer, texts, repeat=args.repeat)
+            labels = [inferencer.processor.label_maps[0][i] for i in range(class_proba.shape[1])]
+            proba = bert.get_probabilities_from_class_proba(class_proba, labels)
+        else:
+            tweets_per_second, results = bert_benchmark.time_inference(inferencer, texts, repeat=args.repeat)
+            proba = bert.get_probabilities(results)
+        if reference is None:
+            reference = proba
+        print(f'{mode:>10}: {tweets_per_second:8.1f} tweets/s, '
+              f'max. probability deviation {np.abs(proba - reference).max():.2e}')
+
+    # sharded scoring (including the start of the workers)
+    for n_workers in args.workers:
+        t = time.perf_counter()
+        for _ in bert.iter_bert_proba(texts, save_dir=model_dir, n_workers=n_workers, n_threads=args.threads):
+            pass
+        print(f'{n_workers:>2} workers: {len(texts) / (time.perf_counter() - t):8.1f} tweets/s')
+
+
+if __name__ == '__main__':
+    main()
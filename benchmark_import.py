@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""Import-time benchmark for the Streamlit app.
+
+Imports app.py in fresh interpreters (cold import, nothing cached in
+sys.modules) and fails if the median import time exceeds the budget or if
+modules that must only be loaded on demand are pulled in at start-up.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import statistics
+
+
+# modules which must not be imported just by starting the app
+LAZY_MODULES = ['sklearn', 'nltk']
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--repeat", type=int, default=5, help="Number of fresh interpreters to start")
+parser.add_argument("--budget", type=float, default=6.0,
+                    help="Maximum median import time in seconds (measured median: ~5.1s)")
+args = parser.parse_args()
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import app
+t = time.perf_counter() - t
+print(json.dumps({'seconds': t, 'loaded': [m for m in %r if m in sys.modules]}))
+""" % (LAZY_MODULES,)
+
+
+def measure_cold_import():
+    """Imports app.py in a new interpreter.
+
+    Returns:
+        result: Dictionary with the import time in seconds and the lazy modules that got loaded
+    """
+    repo_dir = os.path.dirname(os.path.realpath(__file__))
+    output = subprocess.run([sys.executable, '-c', PROBE], cwd=repo_dir,
+                            stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+
+    results = [measure_cold_import() for _ in range(args.repeat)]
+    seconds = [r['seconds'] for r in results]
+    loaded = sorted({m for r in results for m in r['loaded']})
+    median = statistics.median(seconds)
+
+    print(f'Cold import of app.py: median {median:.2f}s, min {min(seconds):.2f}s, max {max(seconds):.2f}s '
+          f'({args.repeat} runs, budget {args.budget:.2f}s)')
+
+    failed = False
+    if loaded:
+        print(f'FAIL: modules loaded at import time although they should be lazy: {", ".join(loaded)}')
+        failed = True
+    if median > args.budget:
+        print('FAIL: import time over budget.')
+        failed = True
+    if not failed:
+        print('OK')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+"""Cross-validated benchmark of the party classifier:
+Runs k-fold evaluation of vectorizer and model configurations in parallel and
+writes fit time, predict throughput, memory increase and accuracy to a results table.
+Uses the pre-processed database file if given, otherwise a synthetic corpus.
+"""
+
+import argparse
+import os
+
+import pandas as pd
+
+import bundestweets.party_benchmark as party_benchmark
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--db_file", default=None, help="Pre-processed database file (synthetic corpus if not given)")
+parser.add_argument("--n_tweets", type=int, default=50000, help="Size of the synthetic corpus")
+parser.add_argument("--folds", type=int, default=5, help="Number of folds")
+parser.add_argument("--jobs", type=int, default=None, help="Number of worker processes (default: all CPUs)")
+parser.add_argument("--vectorizers", nargs="+", default=["tfidf", "hashing"], help="tfidf and/or hashing")
+parser.add_argument("--min_df", type=int, nargs="+", default=[5, 50], help="min_df values (TF-IDF)")
+parser.add_argument("--n_features", type=int, default=2**20, help="Number of hash buckets (hashing)")
+parser.add_argument("--C", type=float, nargs="+", default=[0.1, 1.0], help="Inverse regularization strengths")
+parser.add_argument("--solvers", nargs="+", default=["lbfgs", "saga"], help="LogisticRegression solvers")
+parser.add_argument("--max_iter", type=int, default=100, help="Maximum number of solver iterations")
+parser.add_argument("--output", default="party_classifier_benchmark.csv", help="CSV file for the per-fold results")
+args = parser.parse_args()
+
+
+def main():
+
+    # get corpus
+    if args.db_file is not None and os.path.isfile(args.db_file):
+        print(f'Loading tweets from {args.db_file} ...')
+        texts, labels = party_benchmark.load_corpus_from_db(args.db_file)
+    else:
+        print(f'Generating synthetic corpus with {args.n_tweets} tweets ...')
+        texts, labels = party_benchmark.make_synthetic_corpus(n_tweets=args.n_tweets)
+
+    # run all configurations
+    configurations = party_benchmark.get_configurations(vectorizers=args.vectorizers, min_dfs=args.min_df,
+                                                        Cs=args.C, solvers=args.solvers, n_features=args.n_features,
+                                                        max_iter=args.max_iter)
+    print(f'Running {len(configurations)} configurations x {args.folds} folds on {len(texts)} tweets ...')
+    results = party_benchmark.run_benchmark(texts, labels, configurations, n_splits=args.folds, n_jobs=args.jobs,
+                                            verbose=1)
+    results.to_csv(args.output, index=False)
+
+    with pd.option_context('display.width', 200, 'display.max_columns', 20):
+        print(party_benchmark.summarize(results))
+    print(f'Per-fold results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
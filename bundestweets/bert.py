@@ -5,49 +5,298 @@
 
 import bundestweets.stats_helpers as stats_helpers
 import bundestweets.nlp as my_nlp
+import bundestweets.bert_cache as bert_cache
 import pandas as pd
 import numpy as np
 import os
 import json
+import queue
+import multiprocessing
+import traceback
 import tqdm
 
 from farm.infer import Inferencer
 
 
-def run_bert(data):
+BERT_MODEL_DIR = "./bert_model/"
+CHUNK_SIZE = 256
+WORD_CACHE_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'bert_word_cache.json')
+
+
+def get_probabilities(results):
+    """Converts inference results into (Nx2) class probabilities [other, offensive]."""
+    bert_proba = []
+    for r in results:
+        for r_ in r['predictions']:
+            p = r_['probability']
+            if r_['label'] == 'OTHER':
+                p = 1.0 - p
+            bert_proba.append([1-p, p])
+    return np.array(bert_proba)
+
+
+def get_probabilities_from_class_proba(class_proba, labels):
+    """Converts class probabilities (see Inferencer.predict_proba) into (Nx2) class probabilities
+    [other, offensive], in the same way as get_probabilities (for models with more than
+    one offensive class, the probability of the most likely class counts).
+    
+    Args:
+        class_proba: (N x classes) numpy array
+        labels: Class labels in the order of the columns
+    """
+    other = list(labels).index('OTHER')
+    top_proba = class_proba.max(axis=1)
+    p = np.where(class_proba.argmax(axis=1) == other, 1.0 - top_proba, top_proba).astype(np.float64)
+    return np.stack([1 - p, p], axis=1)
+
+
+def _get_labels(model):
+    return [model.processor.label_maps[0][i] for i in range(len(model.processor.label_maps[0]))]
+
+
+def _score_chunk(model, texts):
+    return get_probabilities_from_class_proba(model.predict_proba(list(texts)), _get_labels(model))
+
+
+def _load_model(save_dir, n_threads, word_cache_file=None):
+    import torch
+    
+    if n_threads is not None:
+        torch.set_num_threads(n_threads)
+    model = Inferencer.load(save_dir, bucket_by_length=True, n_threads=n_threads)
+    if word_cache_file is not None:
+        model.processor.tokenizer.load_word_cache(word_cache_file)
+    return model
+
+
+def _save_word_cache(model, word_cache_file):
+    """Reports the hit rate of the tokenizer's word cache and saves it for the next run (or worker)."""
+    tokenizer = model.processor.tokenizer
+    if getattr(tokenizer, 'word_cache', None) is None:
+        return
+    stats = tokenizer.word_cache.stats()
+    print(f"BERT word cache: {stats['hit_rate']:.1%} hits ({stats['hits']} of {stats['hits'] + stats['misses']} "
+          f"words), {stats['size']} words cached.")
+    if word_cache_file is not None:
+        tokenizer.save_word_cache(word_cache_file)
+
+
+def _scoring_worker(save_dir, n_threads, word_cache_file, task_queue, result_queue):
+    """Worker process of iter_bert_proba: scores chunks of texts from the task queue until it gets None."""
+    try:
+        model = _load_model(save_dir, n_threads, word_cache_file)
+        for start, texts in iter(task_queue.get, None):
+            result_queue.put((start, _score_chunk(model, texts)))
+        _save_word_cache(model, word_cache_file)
+    except Exception:
+        result_queue.put((None, traceback.format_exc()))
+
+
+def stream_bert_proba(texts, save_dir=BERT_MODEL_DIR, n_threads=None, chunk_size=CHUNK_SIZE, prefetch=2,
+                      word_cache_file=None):
+    """
+    Scores a stream of texts (any iterable, e.g. a generator over database rows) with the
+    BERT model. Texts are featurized on a background thread ahead of the model, so that
+    memory is bounded by the chunk size and the prefetch depth instead of the number of texts.
+    
+    Args:
+        texts: Iterable of texts
+        save_dir: Directory of the pre-trained model
+        n_threads: Number of PyTorch (or ONNX Runtime) threads (default: all cores)
+        chunk_size: Number of texts per chunk
+        prefetch: Maximum number of featurized chunks waiting for the model
+        word_cache_file: JSON file of the tokenizer's word cache, loaded at the start and
+            saved at the end (None: in-memory cache only)
+        
+    Yields:
+        bert_proba: (Nx2) numpy array with class probabilities for each chunk (in input order)
+    """
+    model = _load_model(save_dir, n_threads, word_cache_file)
+    labels = _get_labels(model)
+    for class_proba in model.stream_proba(texts, chunk_size=chunk_size, prefetch=prefetch):
+        yield get_probabilities_from_class_proba(class_proba, labels)
+    _save_word_cache(model, word_cache_file)
+
+
+def iter_bert_proba(texts, save_dir=BERT_MODEL_DIR, n_workers=1, n_threads=None, chunk_size=CHUNK_SIZE,
+                    word_cache_file=None):
+    """
+    Scores texts in chunks with the BERT model, either in this process or sharded over
+    worker processes (each with its own model copy and thread count) which pull the
+    chunks from a shared queue.
+    
+    Args:
+        texts: List of texts
+        save_dir: Directory of the pre-trained model
+        n_workers: Number of worker processes (1: score in this process)
+        n_threads: Number of PyTorch (or ONNX Runtime) threads per worker (default: all cores)
+        chunk_size: Number of texts per chunk
+        word_cache_file: JSON file of the tokenizer's word cache shared by all workers
+            (see stream_bert_proba)
+        
+    Yields:
+        start: Index of the first text of the chunk
+        bert_proba: (Nx2) numpy array with class probabilities of the chunk
+        (chunks are yielded as they are finished, i.e. not necessarily in order)
+    """
+    starts = range(0, len(texts), chunk_size)
+    
+    if n_workers <= 1:
+        chunks = stream_bert_proba(texts, save_dir=save_dir, n_threads=n_threads, chunk_size=chunk_size,
+                                   word_cache_file=word_cache_file)
+        start = 0
+        for chunk_proba in chunks:
+            yield start, chunk_proba
+            start += len(chunk_proba)
+        return
+    
+    # fresh interpreters, PyTorch thread pools do not survive a fork
+    context = multiprocessing.get_context('spawn')
+    task_queue, result_queue = context.Queue(), context.Queue()
+    for start in starts:
+        task_queue.put((start, list(texts[start:start + chunk_size])))
+    for _ in range(n_workers):
+        task_queue.put(None)
+    worker_args = (save_dir, n_threads, word_cache_file, task_queue, result_queue)
+    workers = [context.Process(target=_scoring_worker, args=worker_args, daemon=True) for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    
+    finished = False
+    try:
+        for _ in starts:
+            while True:
+                try:
+                    start, result = result_queue.get(timeout=5)
+                    break
+                except queue.Empty:
+                    if not any(worker.is_alive() for worker in workers):
+                        raise RuntimeError('All BERT scoring workers have exited.')
+            if start is None:
+                raise RuntimeError(f'BERT scoring worker failed:\n{result}')
+            yield start, result
+        finished = True
+    finally:
+        for worker in workers:
+            # (finished workers still save the word cache)
+            worker.join(timeout=30 if finished else 1)
+            if worker.is_alive():
+                worker.terminate()
+
+
+def run_bert(data, save_dir=BERT_MODEL_DIR, cache_file=bert_cache.CACHE_FILE, n_workers=1, n_threads=None,
+             word_cache_file=WORD_CACHE_FILE):
     """
     Run pre-trained BERT model to identify offensive tweets.
+    Results are looked up in the persistent cache first (keyed by model fingerprint
+    and text), only texts which are not cached are sent to the model.
     
     Args:
         data: Tweet dataset
+        save_dir: Directory of the pre-trained model
+        cache_file: SQLite file of the prediction cache (None to disable the cache)
+        n_workers: Number of worker processes (see iter_bert_proba)
+        n_threads: Number of PyTorch threads per worker
+        word_cache_file: JSON file of the tokenizer's word cache (None: in-memory cache only)
         
     Return:
         bert_proba: (Nx2) numpy array with class probabilities
     """
+    texts = data['text'].values
+    text_hashes = [bert_cache.get_text_hash(t) for t in texts]
     
-    # get pre-trained model
-    save_dir = "./bert_model/"
-    model = Inferencer.load(save_dir)
+    # look up cached results
+    cached = dict()
+    if cache_file is not None:
+        fingerprint = bert_cache.get_model_fingerprint(save_dir)
+        conn = bert_cache.open_cache(cache_file)
+        cached = bert_cache.lookup(conn, fingerprint, text_hashes)
     
-    # format data for model
-    data_formatted = [{'text': v} for v in data['text'].values]
+    # texts to run through the model (identical texts only once)
+    missing = dict()
+    for (t, h) in zip(texts, text_hashes):
+        if (h not in cached) and (h not in missing):
+            missing[h] = t
+    missing_hashes = list(missing.keys())
+    print(f'BERT cache: {len(texts) - sum(h not in cached for h in text_hashes)} of {len(texts)} tweets cached, '
+          f'running model on {len(missing_hashes)} texts.')
     
-    # run model over dataset
-    chunk_size = 256
-    N_chunks = int(np.ceil(len(data_formatted) / chunk_size))
-    results = []
-    for c_i in tqdm.tqdm(range(N_chunks)):
-        chunk = data_formatted[c_i*chunk_size : (c_i+1)*chunk_size]
-        results.extend(model.run_inference(dicts=chunk))
-            
-    # get probabilities
-    bert_proba = []
-    for r in results:
-        for r_ in r['predictions']:
-            p = r_['probability']
-            if r_['label'] == 'OTHER':
-                p = 1.0 - p
-            bert_proba.append([1-p, p])
-    bert_proba = np.array(bert_proba)
-            
-    return bert_proba
\ No newline at end of file
+    missing_proba = np.zeros((len(missing_hashes), 2))
+    if missing_hashes:
+        # run model over dataset (results are cached after each chunk)
+        missing_texts = [missing[h] for h in missing_hashes]
+        N_chunks = int(np.ceil(len(missing_texts) / CHUNK_SIZE))
+        chunks = iter_bert_proba(missing_texts, save_dir=save_dir, n_workers=n_workers, n_threads=n_threads,
+                                 word_cache_file=word_cache_file)
+        for start, chunk_proba in tqdm.tqdm(chunks, total=N_chunks):
+            missing_proba[start : start + len(chunk_proba)] = chunk_proba
+            if cache_file is not None:
+                bert_cache.store(conn, fingerprint, missing_hashes[start : start + len(chunk_proba)], chunk_proba)
+    
+    if cache_file is not None:
+        conn.close()
+    
+    # fill in the model results and the cached results
+    missing_rows = dict(zip(missing_hashes, range(len(missing_hashes))))
+    rows = np.array([missing_rows.get(h, -1) for h in text_hashes], dtype=np.int64).reshape(-1)
+    bert_proba = np.zeros((len(texts), 2))
+    bert_proba[rows >= 0] = missing_proba[rows[rows >= 0]]
+    for i in np.flatnonzero(rows < 0):
+        bert_proba[i] = cached[text_hashes[i]]
+    return bert_proba
+
+
+def run_bert_once_per_cluster(data, canonical_ids, **kwargs):
+    """
+    Run the BERT model only once for each cluster of near-duplicate tweets
+    (see dedup.update_duplicate_clusters) and copy the results to all tweets of the cluster.
+    
+    Args:
+        data: Tweet dataset
+        canonical_ids: Canonical tweet ID for each tweet in data
+        kwargs: Passed on to run_bert
+        
+    Return:
+        bert_proba: (Nx2) numpy array with class probabilities
+    """
+    canonical_ids = np.asarray(canonical_ids)
+    
+    # first tweet of each cluster represents the cluster
+    clusters, first, inverse = np.unique(canonical_ids, return_index=True, return_inverse=True)
+    print(f'Running BERT on {len(clusters)} of {len(data)} tweets (near-duplicates share results).')
+    bert_proba = run_bert(data.iloc[first], **kwargs)
+    
+    return bert_proba[inverse]
+
+
+def compare_predictions(data, bert_proba_reference, bert_proba, thr=0.9):
+    """
+    Compares the predictions of a model variant (e.g. INT8 quantized) with those of the
+    reference model: deviation of the probabilities and of the offensive tweets
+    (as selected in the app, see vis_helpers.get_offensive_tweets).
+    
+    Args:
+        data: Tweet dataset
+        bert_proba_reference: (Nx2) class probabilities of the reference model
+        bert_proba: (Nx2) class probabilities of the model variant
+        thr: Minimum probability of offensive tweets
+        
+    Return:
+        comparison: Dictionary with the deviations and the number of changed decisions
+    """
+    # same selection as vis_helpers.get_offensive_tweets (which pulls in the app dependencies)
+    offensive_reference = bert_proba_reference[:, 1] > thr
+    offensive = bert_proba[:, 1] > thr
+    deviation = np.abs(bert_proba[:, 1] - bert_proba_reference[:, 1])
+    
+    comparison = {
+        'n_tweets': len(data),
+        'mean_abs_deviation': deviation.mean(),
+        'max_abs_deviation': deviation.max(),
+        'n_offensive_reference': int(offensive_reference.sum()),
+        'n_offensive': int(offensive.sum()),
+        'n_new_offensive': int((offensive & ~offensive_reference).sum()),
+        'n_lost_offensive': int((offensive_reference & ~offensive).sum()),
+    }
+    comparison['decision_agreement'] = 1 - (comparison['n_new_offensive'] + comparison['n_lost_offensive']) / len(data)
+    return comparison
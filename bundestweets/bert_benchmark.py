@@ -0,0 +1,165 @@
+"""Benchmark helpers for the BERT model for offensive language identification
+(requires PyTorch installed / only for offline version):
+synthetic tweets with a realistic length distribution, a randomly initialized
+model in the saved FARM format (if the pre-trained model is not available)
+and timing of the inference.
+"""
+
+import os
+import time
+
+import numpy as np
+
+
+def get_syllables(n_syllables=400, random_state=0):
+    """Random lowercase syllables (the building blocks of the synthetic vocabulary)."""
+    rng = np.random.RandomState(random_state)
+    consonants, vowels = list('bcdfghklmnprstwz'), list('aeiou')
+    syllables = set()
+    while len(syllables) < n_syllables:
+        syllables.add(rng.choice(consonants) + rng.choice(vowels) + rng.choice(consonants + ['']))
+    return sorted(syllables)
+
+
+def make_synthetic_tweets(n_tweets=2000, min_words=3, max_words=45, random_state=0):
+    """Synthetic tweets with 1-4 syllables per word. The number of words per tweet
+    is skewed towards short tweets, as for real tweets.
+
+    Returns:
+        texts: List of strings
+    """
+    rng = np.random.RandomState(random_state)
+    syllables = get_syllables()
+    n_words = np.clip(rng.exponential(scale=(max_words - min_words) / 3, size=n_tweets).astype(int) + min_words,
+                      min_words, max_words)
+    texts = []
+    for n in n_words:
+        words = [''.join(rng.choice(syllables, size=rng.randint(1, 5))) for _ in range(n)]
+        texts.append(' '.join(words))
+    return texts
+
+
+def make_random_model(save_dir, max_seq_len=128, hidden_size=768, num_hidden_layers=12, num_attention_heads=12,
+                      intermediate_size=3072):
+    """Saves a randomly initialized text classification model in the format of the
+    pre-trained model (as loaded by Inferencer.load), with a vocabulary fitting the synthetic tweets.
+
+    Args:
+        save_dir: Model directory
+        max_seq_len: Maximum number of tokens per tweet
+        hidden_size, num_hidden_layers, num_attention_heads, intermediate_size: BERT dimensions
+            (default: BERT base)
+    """
+    from pytorch_transformers.modeling_bert import BertModel, BertConfig
+
+    from farm.data_handler.processor import GermEval18CoarseProcessor
+    from farm.modeling.adaptive_model import AdaptiveModel
+    from farm.modeling.language_model import Bert
+    from farm.modeling.prediction_head import TextClassificationHead
+    from farm.modeling.tokenization import BertTokenizer
+
+    os.makedirs(save_dir, exist_ok=True)
+    syllables = get_syllables()
+    vocab = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + syllables + ['##' + s for s in syllables]
+    vocab_file = os.path.join(save_dir, 'vocab.txt')
+    with open(vocab_file, 'w') as fp:
+        fp.write('\n'.join(vocab) + '\n')
+
+    tokenizer = BertTokenizer(vocab_file, do_lower_case=True)
+    processor = GermEval18CoarseProcessor(tokenizer=tokenizer, max_seq_len=max_seq_len, data_dir=None)
+
+    config = BertConfig(vocab_size_or_config_json_file=len(vocab), hidden_size=hidden_size,
+                        num_hidden_layers=num_hidden_layers, num_attention_heads=num_attention_heads,
+                        intermediate_size=intermediate_size, max_position_embeddings=max(512, max_seq_len))
+    language_model = Bert()
+    language_model.model = BertModel(config)
+    language_model.language = 'german'
+    prediction_head = TextClassificationHead(layer_dims=[hidden_size, len(processor.label_list)])
+
+    model = AdaptiveModel(language_model=language_model, prediction_heads=[prediction_head],
+                          embeds_dropout_prob=0.1, lm_output_types=['per_sequence'], device='cpu')
+    model.save(save_dir)
+    processor.save(save_dir)
+
+
+def time_inference(inferencer, texts, chunk_size=256, repeat=1):
+    """Throughput of Inferencer.run_inference (in chunks as in bert.run_bert).
+
+    Returns:
+        tweets_per_second: Best of repeat runs
+        results: Inference results (of the last run)
+    """
+    dicts = [{'text': t} for t in texts]
+    best = np.inf
+    for _ in range(repeat):
+        results = []
+        t = time.perf_counter()
+        for start in range(0, len(dicts), chunk_size):
+            results += inferencer.run_inference(dicts=dicts[start:start + chunk_size])
+        best = min(best, time.perf_counter() - t)
+    return len(texts) / best, results
+
+
+def time_featurization(processor, texts, chunk_size=256, word_cache=True):
+    """Throughput of the tokenization and featurization alone (Processor.dataset_from_dicts).
+
+    Args:
+        word_cache: Memoize the tokens of each word (starting from an empty cache,
+            see processor.tokenizer.word_cache.stats() for the hit rate)
+
+    Returns:
+        tweets_per_second
+    """
+    dicts = [{'text': t} for t in texts]
+    tokenizer = processor.tokenizer
+    cache = getattr(tokenizer, 'word_cache', None)
+    if cache is not None:
+        cache.clear()
+        cache.reset_stats()
+        if not word_cache:
+            tokenizer.word_cache = None
+    try:
+        t = time.perf_counter()
+        for start in range(0, len(dicts), chunk_size):
+            processor.dataset_from_dicts(dicts[start:start + chunk_size])
+        return len(texts) / (time.perf_counter() - t)
+    finally:
+        tokenizer.word_cache = cache
+
+
+def get_model_size(save_dir):
+    """Size of the model files in MB."""
+    return sum(os.path.getsize(os.path.join(save_dir, f)) for f in os.listdir(save_dir)
+               if f.endswith('.bin')) / 2**20
+
+
+def time_predict_proba(inferencer, texts, chunk_size=256, repeat=1):
+    """Throughput of Inferencer.predict_proba (in chunks as in bert.run_bert).
+
+    Returns:
+        tweets_per_second: Best of repeat runs
+        class_proba: Class probabilities (of the last run)
+    """
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        class_proba = np.concatenate([inferencer.predict_proba(texts[start:start + chunk_size])
+                                      for start in range(0, len(texts), chunk_size)])
+        best = min(best, time.perf_counter() - t)
+    return len(texts) / best, class_proba
+
+
+def time_stream_proba(inferencer, texts, chunk_size=256, prefetch=2, repeat=1):
+    """Throughput of Inferencer.stream_proba (texts passed as a generator).
+
+    Returns:
+        tweets_per_second: Best of repeat runs
+        class_proba: Class probabilities (of the last run)
+    """
+    best = np.inf
+    for _ in range(repeat):
+        t = time.perf_counter()
+        class_proba = np.concatenate(list(inferencer.stream_proba((text for text in texts), chunk_size=chunk_size,
+                                                                  prefetch=prefetch)))
+        best = min(best, time.perf_counter() - t)
+    return len(texts) / best, class_proba
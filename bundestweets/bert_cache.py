@@ -0,0 +1,109 @@
+"""Persistent cache for BERT predictions:
+SQLite table with the class probabilities of each tweet text, keyed by
+(model fingerprint, normalized text hash). Entries of another model version
+are never returned, so changing the model invalidates the cache automatically.
+"""
+
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+CACHE_FILE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'bert_cache.db')
+
+# SQLite limits the number of parameters per query
+MAX_VARIABLES = 500
+
+
+def get_model_fingerprint(save_dir):
+    """Hash over the contents of all files of a saved model (weights, config, vocabulary).
+
+    Args:
+        save_dir: Model directory (as used by Inferencer.load)
+
+    Returns:
+        fingerprint: Hex digest
+    """
+    h = hashlib.sha256()
+    for root, dirs, files in sorted(os.walk(save_dir)):
+        dirs.sort()
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            h.update(os.path.relpath(file_path, save_dir).encode('utf-8'))
+            with open(file_path, 'rb') as fp:
+                for block in iter(lambda: fp.read(2**20), b''):
+                    h.update(block)
+    return h.hexdigest()
+
+
+def normalize_text(text):
+    """Text with white space collapsed (the tokenizer splits on white space anyway)."""
+    if not isinstance(text, str):
+        text = str(text)
+    return ' '.join(text.split())
+
+
+def get_text_hash(text):
+    """Hash of the normalized text."""
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+def open_cache(cache_file=CACHE_FILE):
+    """Open (and create if needed) the cache database.
+
+    Returns:
+        conn: sqlite3 connection
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    conn = sqlite3.connect(cache_file)
+    conn.execute("""CREATE TABLE IF NOT EXISTS bert_cache (
+                        fingerprint TEXT NOT NULL,
+                        text_hash TEXT NOT NULL,
+                        proba BLOB NOT NULL,
+                        PRIMARY KEY (fingerprint, text_hash)
+                    ) WITHOUT ROWID""")
+    conn.commit()
+    return conn
+
+
+def lookup(conn, fingerprint, text_hashes):
+    """Cached probabilities for a list of text hashes.
+
+    Returns:
+        cached: Dictionary mapping text hashes to probabilities (only hits)
+    """
+    text_hashes = list(set(text_hashes))
+    cached = dict()
+    for start in range(0, len(text_hashes), MAX_VARIABLES):
+        chunk = text_hashes[start:start + MAX_VARIABLES]
+        query = f"""SELECT text_hash, proba FROM bert_cache
+                    WHERE fingerprint = ? AND text_hash IN ({', '.join('?' * len(chunk))})"""
+        for text_hash, proba in conn.execute(query, [fingerprint] + chunk):
+            cached[text_hash] = np.frombuffer(proba, dtype=np.float64)
+    return cached
+
+
+def store(conn, fingerprint, text_hashes, probas):
+    """Adds probabilities to the cache (and commits, so that results survive a crash).
+
+    Args:
+        conn: sqlite3 connection
+        fingerprint: Model fingerprint
+        text_hashes: List of text hashes
+        probas: Array (texts x classes) of probabilities
+    """
+    records = [(fingerprint, h, np.asarray(p, dtype=np.float64).tobytes()) for (h, p) in zip(text_hashes, probas)]
+    conn.executemany("INSERT OR REPLACE INTO bert_cache (fingerprint, text_hash, proba) VALUES (?, ?, ?)", records)
+    conn.commit()
+
+
+def prune(conn, fingerprint):
+    """Deletes all entries of other model versions.
+
+    Returns:
+        n_deleted: Number of deleted entries
+    """
+    n_deleted = conn.execute("DELETE FROM bert_cache WHERE fingerprint != ?", (fingerprint,)).rowcount
+    conn.commit()
+    return n_deleted
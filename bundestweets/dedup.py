@@ -0,0 +1,272 @@
+"""Near-duplicate tweets:
+Clusters tweets with (near-)identical cleaned text, e.g. party campaign copy,
+cross-posts and repeated greetings, with MinHash signatures over character
+shingles and locality-sensitive hashing (banding).
+
+Clusters are updated at ingest time (see preprocess_local.py). Each cluster is
+represented by a canonical tweet ID (the oldest tweet), so that expensive
+per-tweet analyses can run once per cluster and fan out their results.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+DEDUP_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'duplicates')
+
+NUM_PERM = 64        # number of MinHash permutations
+BANDS = 8            # LSH bands (NUM_PERM / BANDS rows each)
+SHINGLE_SIZE = 5     # characters per shingle
+THRESHOLD = 0.8      # minimum estimated Jaccard similarity of duplicates
+MAX_BUCKET_SIZE = 50 # largest LSH bucket whose pairs are all verified
+
+
+def normalize_text(text):
+    """Lowercase text with single spaces ('' for missing text)."""
+    if not isinstance(text, str):
+        return ''
+    return ' '.join(text.lower().split())
+
+
+def get_hash_parameters(num_perm=NUM_PERM, random_state=1):
+    """Random (odd) multipliers and offsets for the MinHash functions."""
+    rng = np.random.RandomState(random_state)
+    a = rng.randint(0, 2**63, size=num_perm, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+    b = rng.randint(0, 2**63, size=num_perm, dtype=np.int64).astype(np.uint64)
+    return a, b
+
+
+def get_minhash_signatures(texts, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE, chunk_size=20000, random_state=1):
+    """MinHash signatures of the character shingles of each text.
+    Shingles of all texts in a chunk are hashed at once (polynomial rolling hash
+    over the code points), then each hash function is applied and reduced per text.
+
+    Args:
+        texts: List of normalized texts (non-empty)
+        num_perm: Number of hash functions
+        shingle_size: Characters per shingle
+        chunk_size: Number of texts processed at once
+        random_state: Seed for the hash functions
+
+    Returns:
+        signatures: uint32 array (texts x num_perm)
+    """
+    a, b = get_hash_parameters(num_perm, random_state)
+    signatures = np.zeros((len(texts), num_perm), dtype=np.uint32)
+
+    for start in range(0, len(texts), chunk_size):
+        chunk = [t.ljust(shingle_size, '\0') for t in texts[start:start + chunk_size]]
+        lengths = np.array([len(t) for t in chunk], dtype=np.int64)
+        codes = np.frombuffer(''.join(chunk).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+
+        # windows starting in each text which do not cross into the next one
+        n_windows = lengths - shingle_size + 1
+        text_starts = np.cumsum(lengths) - lengths
+        window_starts = np.cumsum(n_windows) - n_windows
+        positions = np.repeat(text_starts - window_starts, n_windows) + np.arange(n_windows.sum())
+
+        shingles = np.zeros(len(positions), dtype=np.uint64)
+        for j in range(shingle_size):
+            shingles = shingles * np.uint64(1000003) + codes[positions + j]
+
+        for i in range(num_perm):
+            hashes = ((a[i] * shingles + b[i]) >> np.uint64(32)).astype(np.uint32)
+            signatures[start:start + len(chunk), i] = np.minimum.reduceat(hashes, window_starts)
+
+    return signatures
+
+
+def get_band_keys(signatures, bands=BANDS, random_state=2):
+    """One hash key per LSH band (texts with equal keys in any band are candidates).
+
+    Returns:
+        keys: uint64 array (texts x bands)
+    """
+    rows = signatures.shape[1] // bands
+    rng = np.random.RandomState(random_state)
+    weights = rng.randint(0, 2**63, size=rows, dtype=np.int64).astype(np.uint64) * np.uint64(2) + np.uint64(1)
+
+    keys = np.zeros((len(signatures), bands), dtype=np.uint64)
+    for band in range(bands):
+        band_signatures = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        keys[:, band] = (band_signatures * weights).sum(axis=1)
+    return keys
+
+
+def pair_with_representatives(members, signatures, threshold=THRESHOLD):
+    """Pairs each text of a (large) bucket with the first representative it verifies against.
+    Texts which verify against no representative become representatives themselves, so the
+    number of comparisons grows with the number of distinct texts in the bucket only.
+
+    Args:
+        members: Row indices of the texts in the bucket
+        signatures: MinHash signatures of all texts
+        threshold: Minimum estimated Jaccard similarity of duplicates
+
+    Returns:
+        left: Row index of the representative of each pair
+        right: Row index of the other text of each pair
+    """
+    representatives, left, right = [], [], []
+    for member in members:
+        if representatives:
+            similarity = (signatures[representatives] == signatures[member]).mean(axis=1)
+            match = np.flatnonzero(similarity >= threshold)
+            if len(match) > 0:
+                left.append(representatives[match[0]])
+                right.append(member)
+                continue
+        representatives.append(member)
+    return np.array(left, dtype=np.int64), np.array(right, dtype=np.int64)
+
+
+def find_candidate_pairs(keys, is_new, signatures, threshold=THRESHOLD, max_bucket_size=MAX_BUCKET_SIZE):
+    """Pairs of texts with equal keys in at least one band (at least one of both new).
+    All pairs within a bucket (texts with the same key) are returned, so that a
+    colliding non-duplicate cannot separate two duplicates once the pairs are
+    verified. In buckets larger than max_bucket_size (e.g. mass-posted tweets),
+    each text is paired with a verified representative instead (see
+    pair_with_representatives).
+
+    Args:
+        keys: Band keys (texts x bands), see get_band_keys
+        is_new: Boolean array, whether each text is new
+        signatures: MinHash signatures (texts x num_perm)
+        threshold: Minimum estimated Jaccard similarity of duplicates (large buckets)
+        max_bucket_size: Largest bucket for which all pairs are returned
+
+    Returns:
+        pairs: int64 array (pairs x 2)
+    """
+    pairs = []
+    positions = np.arange(len(keys))
+    for band in range(keys.shape[1]):
+        order = np.argsort(keys[:, band], kind='mergesort')
+        sorted_keys = keys[order, band]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(sorted_keys)])
+        bucket_start = np.repeat(starts, sizes)
+        small = np.repeat(sizes <= max_bucket_size, sizes)
+
+        # all pairs (i, i + offset) within small buckets
+        left, right = [], []
+        for offset in range(1, min(max_bucket_size, sizes.max(initial=0))):
+            i, j = positions[:-offset], positions[offset:]
+            same = small[i] & (bucket_start[i] == bucket_start[j])
+            left.append(order[i[same]])
+            right.append(order[j[same]])
+        # large buckets: each text with a verified representative
+        for start, size in zip(starts[sizes > max_bucket_size], sizes[sizes > max_bucket_size]):
+            large_left, large_right = pair_with_representatives(order[start:start + size], signatures, threshold)
+            left.append(large_left)
+            right.append(large_right)
+
+        left = np.concatenate(left) if left else np.zeros(0, dtype=np.int64)
+        right = np.concatenate(right) if right else np.zeros(0, dtype=np.int64)
+        mask = is_new[left] | is_new[right]
+        pairs.append(np.stack([left[mask], right[mask]], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0) if pairs else np.zeros((0, 2), dtype=np.int64)
+    return pairs.astype(np.int64)
+
+
+def load_state(dedup_dir=DEDUP_DIR):
+    """Load the signatures of all clustered tweets.
+
+    Returns:
+        state: Dictionary with "ids", "signatures" and "canonical_ids" (row-aligned), or None
+    """
+    file_path = os.path.join(dedup_dir, 'state.npz')
+    if not os.path.isfile(file_path):
+        return None
+    with np.load(file_path) as stored:
+        return {k: stored[k] for k in ['ids', 'signatures', 'canonical_ids']}
+
+
+def save_state(state, dedup_dir=DEDUP_DIR):
+    """Save the signatures of all clustered tweets."""
+    os.makedirs(dedup_dir, exist_ok=True)
+    file_path = os.path.join(dedup_dir, 'state.npz')
+    with open(file_path + '.tmp', 'wb') as fp:
+        np.savez(fp, **state)
+    os.replace(file_path + '.tmp', file_path)
+
+
+def update_duplicate_clusters(data, dedup_dir=DEDUP_DIR, threshold=THRESHOLD, verbose=0):
+    """Adds new tweets to the near-duplicate clusters.
+    Existing clusters can grow and merge, their canonical ID is always the smallest
+    (i.e. oldest) tweet ID in the cluster.
+
+    Args:
+        data: Tweet dataset (columns "id" and "text_cleaned")
+        dedup_dir: Directory for the stored signatures
+        threshold: Minimum estimated Jaccard similarity of duplicates
+        verbose: Whether to print a summary or not
+
+    Returns:
+        canonical_ids: pandas.Series with the canonical tweet ID of each tweet in data
+            (tweets without cleaned text are their own canonical tweet)
+    """
+    from scipy import sparse as sp
+    from scipy.sparse.csgraph import connected_components
+
+    ids = data['id'].values.astype(np.int64)
+    texts = data['text_cleaned'].apply(normalize_text)
+    canonical_ids = pd.Series(ids, index=data.index)
+
+    state = load_state(dedup_dir)
+    if state is None:
+        state = {'ids': np.zeros(0, dtype=np.int64), 'signatures': np.zeros((0, NUM_PERM), dtype=np.uint32),
+                 'canonical_ids': np.zeros(0, dtype=np.int64)}
+
+    new = (texts != '').values & ~np.isin(ids, state['ids'])
+    if new.any():
+        signatures = get_minhash_signatures(list(texts.values[new]))
+        all_ids = np.concatenate([state['ids'], ids[new]])
+        all_signatures = np.concatenate([state['signatures'], signatures])
+        n_old, n = len(state['ids']), len(all_ids)
+        is_new = np.arange(n) >= n_old
+
+        # verified candidate pairs plus the known clusters (each old tweet linked to its canonical tweet)
+        pairs = find_candidate_pairs(get_band_keys(all_signatures), is_new, all_signatures, threshold=threshold)
+        similarity = (all_signatures[pairs[:, 0]] == all_signatures[pairs[:, 1]]).mean(axis=1)
+        pairs = pairs[similarity >= threshold]
+        row_of_id = pd.Series(np.arange(n_old), index=state['ids'])
+        old_links = np.stack([np.arange(n_old), row_of_id.loc[state['canonical_ids']].values], axis=1)
+        edges = np.concatenate([pairs, old_links]).astype(np.int64)
+
+        graph = sp.csr_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(n, n))
+        _, labels = connected_components(graph, directed=False)
+        canonical_of_label = pd.Series(all_ids).groupby(labels).min()
+
+        state = {'ids': all_ids, 'signatures': all_signatures,
+                 'canonical_ids': canonical_of_label.loc[labels].values.astype(np.int64)}
+        save_state(state, dedup_dir)
+
+        if verbose:
+            n_clusters = len(np.unique(state['canonical_ids']))
+            print(f'Clustered {new.sum()} new tweets ({n} tweets in {n_clusters} clusters).')
+
+    known = pd.Series(state['canonical_ids'], index=state['ids'])
+    in_state = np.isin(ids, state['ids'])
+    canonical_ids[in_state] = known.loc[ids[in_state]].values
+    return canonical_ids
+
+
+def get_cluster_summary(data, min_size=2):
+    """Summary of the near-duplicate clusters (e.g. for coordinated messaging).
+
+    Args:
+        data: Tweet dataset (columns "canonical_id", "screen_name" and "party")
+        min_size: Minimum number of tweets per cluster
+
+    Returns:
+        clusters: DataFrame indexed by canonical ID with the number of tweets, members and parties
+    """
+    clusters = data.groupby('canonical_id').agg(
+        n_tweets=('screen_name', 'size'),
+        n_members=('screen_name', 'nunique'),
+        parties=('party', lambda p: sorted(p.dropna().unique())),
+    )
+    clusters = clusters.loc[clusters.n_tweets >= min_size].sort_values(by='n_tweets', ascending=False)
+    return clusters
@@ -0,0 +1,336 @@
+"""Persistent inverted keyword index (topics page):
+Maps lowercase tokens of the tweet messages (same tokens as
+row_operators.get_tweet_as_word_set) to sorted lists of tweet row ID's.
+
+The index consists of segments, each one written once by an ingest batch and
+never modified afterwards. Postings lists are delta-encoded and stored as
+variable-length integers (7 bits per byte), so that frequent tokens mostly
+need one byte per tweet. The app memory-maps the segments, new tweets are
+added as a new segment and segments are merged once there are too many.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'keyword_index')
+MANIFEST = 'index.json'
+
+
+def get_varint_lengths(values):
+    """Number of bytes needed to store each value as a variable-length integer."""
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = np.ones(len(values), dtype=np.int64)
+    values = values >> np.uint64(7)
+    while values.any():
+        lengths += (values > 0)
+        values = values >> np.uint64(7)
+    return lengths
+
+
+def encode_varint(values):
+    """Encodes non-negative integers as variable-length integers
+    (7 bits per byte, least significant group first, high bit set on all but the last byte).
+
+    Args:
+        values: Array of non-negative integers
+
+    Returns:
+        data: uint8 array
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    lengths = get_varint_lengths(values)
+    starts = np.cumsum(lengths) - lengths
+
+    position = np.arange(lengths.sum()) - np.repeat(starts, lengths)
+    data = (np.repeat(values, lengths) >> (np.uint64(7) * position.astype(np.uint64))) & np.uint64(0x7f)
+    more = position < np.repeat(lengths, lengths) - 1
+    data = data.astype(np.uint8) | (more.astype(np.uint8) << 7)
+    return data
+
+
+def decode_varint(data):
+    """Decodes variable-length integers (inverse of encode_varint).
+
+    Args:
+        data: uint8 array
+
+    Returns:
+        values: int64 array
+    """
+    data = np.asarray(data, dtype=np.uint8)
+    if len(data) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    group = np.repeat(np.arange(len(starts)), ends - starts + 1)
+    position = np.arange(len(data)) - starts[group]
+    parts = (data & 0x7f).astype(np.uint64) << (np.uint64(7) * position.astype(np.uint64))
+    values = np.add.reduceat(parts, starts).astype(np.int64)
+    return values
+
+
+def vectorize_tweets(texts):
+    """Binary document-term matrix of the lowercase tweet tokens.
+
+    Returns:
+        matrix: CSC matrix (tweets x tokens)
+        tokens: List of tokens (one per column)
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    vectorizer = CountVectorizer(analyzer="word", tokenizer=str.split, token_pattern=None, lowercase=True,
+                                 binary=True, dtype=np.int8)
+    matrix = vectorizer.fit_transform(texts)
+    tokens = [None] * len(vectorizer.vocabulary_)
+    for token, col in vectorizer.vocabulary_.items():
+        tokens[col] = token
+    return matrix.tocsc(), tokens
+
+
+def write_segment(segment_dir, matrix, tokens, months, ids):
+    """Writes an index segment.
+
+    Args:
+        segment_dir: Output directory
+        matrix: Binary document-term matrix (tweets x tokens), rows are the local row ID's
+        tokens: List of tokens (one per column)
+        months: Month of each row (numpy datetime64[M])
+        ids: Tweet ID of each row
+    """
+    matrix = matrix.tocsc()
+    matrix.sort_indices()
+    rows, indptr = matrix.indices.astype(np.int64), matrix.indptr
+
+    # delta-encode the row ID's within each postings list (first entry stays absolute)
+    gaps = rows.copy()
+    gaps[1:] -= rows[:-1]
+    first = indptr[:-1][np.diff(indptr) > 0]
+    gaps[first] = rows[first]
+
+    lengths = get_varint_lengths(gaps)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])[indptr]
+
+    os.makedirs(segment_dir, exist_ok=True)
+    np.save(os.path.join(segment_dir, 'postings.npy'), encode_varint(gaps))
+    np.save(os.path.join(segment_dir, 'offsets.npy'), offsets.astype(np.int64))
+    np.save(os.path.join(segment_dir, 'months.npy'), np.asarray(months, dtype='datetime64[M]').astype(np.int32))
+    np.save(os.path.join(segment_dir, 'ids.npy'), np.asarray(ids, dtype=np.int64))
+    with open(os.path.join(segment_dir, 'tokens.json'), 'w') as fp:
+        json.dump(tokens, fp)
+
+
+def read_manifest(index_dir=INDEX_DIR):
+    """Load the list of segments (None if there is no index)."""
+    file_path = os.path.join(index_dir, MANIFEST)
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as fp:
+        return json.load(fp)
+
+
+def write_manifest(manifest, index_dir=INDEX_DIR):
+    """Atomically replaces the list of segments, readers never see a partial index."""
+    file_path = os.path.join(index_dir, MANIFEST)
+    with open(file_path + '.tmp', 'w') as fp:
+        json.dump(manifest, fp)
+    os.replace(file_path + '.tmp', file_path)
+
+
+class IndexSegment:
+    """Memory-mapped index segment."""
+
+    def __init__(self, segment_dir):
+        """
+        Args:
+            segment_dir: Directory written by write_segment
+        """
+        self.postings = np.load(os.path.join(segment_dir, 'postings.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(segment_dir, 'offsets.npy'), mmap_mode='r')
+        self.months = np.load(os.path.join(segment_dir, 'months.npy'), mmap_mode='r')
+        self.ids = np.load(os.path.join(segment_dir, 'ids.npy'), mmap_mode='r')
+        with open(os.path.join(segment_dir, 'tokens.json'), 'r') as fp:
+            self.tokens = json.load(fp)
+        self.vocabulary = {token: col for (col, token) in enumerate(self.tokens)}
+
+    def get_rows(self, token):
+        """Sorted local row ID's of the tweets containing a token."""
+        col = self.vocabulary.get(token)
+        if col is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.cumsum(decode_varint(self.postings[self.offsets[col]:self.offsets[col + 1]]))
+
+    def to_matrix(self):
+        """Decodes the whole segment (for merging).
+
+        Returns:
+            matrix: Binary CSC matrix (rows x tokens)
+        """
+        from scipy import sparse as sp
+
+        gaps = decode_varint(self.postings)
+        # entries per token = number of last bytes within the token's byte range
+        ends = np.flatnonzero(np.asarray(self.postings) < 0x80)
+        indptr = np.searchsorted(ends, np.asarray(self.offsets))
+
+        rows = np.cumsum(gaps)
+        # restart the cumulative sum at the beginning of each postings list
+        first = indptr[:-1][np.diff(indptr) > 0]
+        offset = np.zeros(len(rows), dtype=np.int64)
+        offset[first] = rows[first] - gaps[first]
+        rows -= np.maximum.accumulate(offset)
+
+        matrix = sp.csc_matrix((np.ones(len(rows), dtype=np.int8), rows, indptr),
+                               shape=(len(self.ids), len(self.tokens)))
+        return matrix
+
+
+class KeywordIndex:
+    """Read access to the keyword index, with monthly hit counts for keyword sets."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        """
+        Args:
+            index_dir: Index directory (see update_keyword_index)
+        """
+        manifest = read_manifest(index_dir)
+        if manifest is None:
+            raise FileNotFoundError(f'No keyword index in {index_dir}')
+        self.segments = [IndexSegment(os.path.join(index_dir, name)) for name in manifest['segments']]
+        self.first_month = np.datetime64(manifest['first_month'], 'M')
+        self.last_month = np.datetime64(manifest['last_month'], 'M')
+        self.n_rows = manifest['n_rows']
+
+    def get_month_index(self):
+        """Month end timestamps covered by the index."""
+        months = np.arange(self.first_month, self.last_month + 1)
+        return pd.PeriodIndex(months, freq='M').to_timestamp(how='end').normalize()
+
+    def get_monthly_counts(self, keywords, unique=False):
+        """Monthly hit counts for a set of keywords (case-insensitive).
+
+        Args:
+            keywords: Iterable of keywords
+            unique: Count tweets containing any of the keywords instead of keyword hits
+                (by default, a tweet with two keywords counts twice, like nlp.intersect_topics)
+
+        Returns:
+            counts: numpy.array with one entry per month of get_month_index()
+        """
+        keywords = {k.lower() for k in keywords}
+        first = self.first_month.astype(np.int64)
+        n_months = (self.last_month - self.first_month).astype(np.int64) + 1
+
+        counts = np.zeros(n_months, dtype=np.int64)
+        for segment in self.segments:
+            # merge the postings lists of all keywords
+            rows = [segment.get_rows(k) for k in keywords]
+            rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+            if unique:
+                rows = np.unique(rows)
+            counts += np.bincount(segment.months[rows] - first, minlength=n_months)
+        return counts
+
+    def get_monthly_topic_counts(self, topics):
+        """Same output as nlp.get_monthly_topic_counts.
+
+        Args:
+            topics: Dictionary mapping topic ID's (0, 1, ...) to key words
+
+        Returns:
+            monthly_counts: DataFrame indexed by month end, one column per topic
+        """
+        counts = np.stack([self.get_monthly_counts(topics[ind]) for ind in range(len(topics))], axis=1) \
+            if len(topics) else np.zeros((len(self.get_month_index()), 0), dtype=np.int64)
+        monthly_counts = pd.DataFrame(counts, index=self.get_month_index(), columns=range(len(topics)))
+        return monthly_counts
+
+
+def merge_segments(index_dir=INDEX_DIR):
+    """Merges all segments of the index into a single one."""
+    from scipy import sparse as sp
+
+    manifest = read_manifest(index_dir)
+    segments = [IndexSegment(os.path.join(index_dir, name)) for name in manifest['segments']]
+
+    # union of all vocabularies, then re-map the columns of each segment
+    tokens = sorted(set().union(*[segment.tokens for segment in segments]))
+    vocabulary = {token: col for (col, token) in enumerate(tokens)}
+    matrices = []
+    for segment in segments:
+        matrix = segment.to_matrix().tocoo()
+        cols = np.array([vocabulary[token] for token in segment.tokens], dtype=np.int64)[matrix.col]
+        matrices.append(sp.csc_matrix((matrix.data, (matrix.row, cols)), shape=(matrix.shape[0], len(tokens))))
+    matrix = sp.vstack(matrices).tocsc()
+    months = np.concatenate([segment.months for segment in segments]).astype('datetime64[M]')
+    ids = np.concatenate([segment.ids for segment in segments])
+
+    name = f'segment_{manifest["next_segment"]:05d}'
+    write_segment(os.path.join(index_dir, name), matrix, tokens, months, ids)
+
+    old_segments = manifest['segments']
+    manifest['segments'] = [name]
+    manifest['next_segment'] += 1
+    write_manifest(manifest, index_dir)
+    for old_name in old_segments:
+        shutil.rmtree(os.path.join(index_dir, old_name), ignore_errors=True)
+
+
+def update_keyword_index(data, index_dir=INDEX_DIR, max_segments=8, verbose=0):
+    """Adds tweets to the keyword index (creates the index if it does not exist).
+    Tweets which are already indexed (same tweet ID) are skipped.
+
+    Args:
+        data: Tweet dataset (columns "id", "date" and "text")
+        index_dir: Index directory
+        max_segments: Merge all segments once there are more
+        verbose: Whether to print progress or not
+
+    Returns:
+        n_added: Number of newly indexed tweets
+    """
+    data = data.loc[~data.text.isna(), :]
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        manifest = {'segments': [], 'next_segment': 0, 'n_rows': 0, 'first_month': None, 'last_month': None}
+    else:
+        indexed_ids = np.concatenate([np.load(os.path.join(index_dir, name, 'ids.npy'), mmap_mode='r')
+                                      for name in manifest['segments']])
+        data = data.loc[~np.isin(data['id'].values.astype(np.int64), indexed_ids), :]
+
+    if len(data) == 0:
+        if verbose:
+            print('Keyword index is up to date.')
+        return 0
+
+    matrix, tokens = vectorize_tweets(data['text'])
+    months = pd.DatetimeIndex(data['date']).values.astype('datetime64[M]')
+
+    name = f'segment_{manifest["next_segment"]:05d}'
+    write_segment(os.path.join(index_dir, name), matrix, tokens, months, data['id'].values)
+
+    first_month, last_month = str(months.min()), str(months.max())
+    if manifest['first_month'] is not None:
+        first_month = min(first_month, manifest['first_month'])
+        last_month = max(last_month, manifest['last_month'])
+    manifest.update({
+        'segments': manifest['segments'] + [name],
+        'next_segment': manifest['next_segment'] + 1,
+        'n_rows': manifest['n_rows'] + len(data),
+        'first_month': first_month,
+        'last_month': last_month,
+    })
+    write_manifest(manifest, index_dir)
+    if verbose:
+        print(f'Added {len(data)} tweets to the keyword index ({len(manifest["segments"])} segments).')
+
+    if len(manifest['segments']) > max_segments:
+        if verbose:
+            print('Merging index segments ...')
+        merge_segments(index_dir)
+
+    return len(data)
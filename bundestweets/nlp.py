@@ -3,28 +3,21 @@
 Functions for content-based analysis.
 """
 
-import nltk
-nltk.download('punkt')
-nltk.download('stopwords')
-
-from nltk.corpus import stopwords
-from nltk.tokenize import TweetTokenizer
-from nltk.tokenize import word_tokenize
 from bundestweets.cistem import stem
 import re
 
-from sklearn.feature_extraction.text import CountVectorizer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score
-from sklearn.decomposition import NMF
-
 from collections import defaultdict
+from functools import lru_cache
+import hashlib
+import weakref
 import pandas as pd
 import numpy as np
 import os
 
+# NLTK resources shipped with the app are looked up here first (before
+# NLTK's default search path and before any download attempt)
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'nltk_data')
+
 party2id = {'CDU/CSU': 0,
             'Die Linke': 1,
             'FDP': 2,
@@ -35,6 +28,61 @@ party2id = {'CDU/CSU': 0,
 
 id2party = {v: k for (k,v) in party2id.items()}
 
+# per-vectorizer caches for the top words report
+_feature_names_cache = weakref.WeakKeyDictionary()
+_translation_cache = weakref.WeakKeyDictionary()
+
+
+def get_nltk_resource(resource, package):
+    """Makes sure an NLTK resource is available and returns its path.
+    Looks in the bundled resource directory first, then in NLTK's default
+    search path, and only downloads (into the bundled directory) as a last resort.
+
+    Args:
+        resource: NLTK resource name, e.g. 'corpora/stopwords'
+        package: Name of the NLTK package providing the resource, e.g. 'stopwords'
+
+    Returns:
+        path: Path pointer to the resource
+    """
+    import nltk
+
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+    try:
+        return nltk.data.find(resource)
+    except LookupError:
+        nltk.download(package, download_dir=NLTK_DATA_DIR, quiet=True)
+        return nltk.data.find(resource)
+
+
+@lru_cache(maxsize=None)
+def get_stop_words():
+    """German stop words plus party names (loaded once on first use).
+
+    Returns:
+        stop_words: Set of words to be excluded from the analysis
+    """
+    get_nltk_resource('corpora/stopwords', 'stopwords')
+    from nltk.corpus import stopwords
+
+    # German stop words
+    stop_words = set(stopwords.words("german"))
+
+    # add party names to stop words (too inform)
+    stop_words = stop_words.union({'CDU', 'CDU/CSU', 'CSU', 'SPD', 'Grüne', 'Grünen', 'LINKE', 'LINKEN'
+                                   'linke', 'linken', 'AfD', 'afd', 'AFD', 'Afd', 'cdu', 'csu', 'cdu/csu',
+                                   'grüne', 'grünen', 'Linke', 'Linken', 'FDP', 'fdp', 'GRÜNE', 'GRÜNEN'})
+    return frozenset(stop_words)
+
+
+@lru_cache(maxsize=None)
+def get_tweet_tokenizer():
+    """NLTK TweetTokenizer (imported and created once on first use)."""
+    from nltk.tokenize import TweetTokenizer
+    return TweetTokenizer()
+
 
 def clean_and_stem_tweet(text):
     """Cleans and stems the text of a tweet.
@@ -46,15 +94,10 @@ def clean_and_stem_tweet(text):
         text_stemmed: Stemmed version of the input
         text_cleaned: Cleaned version of the input (but not stemmed)
     """
-    
-    # download German stop words
-    stop_words = set(stopwords.words("german"))
-    
-    # add party names to stop words (too inform)
-    stop_words = stop_words.union({'CDU', 'CDU/CSU', 'CSU', 'SPD', 'Grüne', 'Grünen', 'LINKE', 'LINKEN'
-                                   'linke', 'linken', 'AfD', 'afd', 'AFD', 'Afd', 'cdu', 'csu', 'cdu/csu',
-                                   'grüne', 'grünen', 'Linke', 'Linken', 'FDP', 'fdp', 'GRÜNE', 'GRÜNEN'})
-    
+
+    # German stop words and party names
+    stop_words = get_stop_words()
+
     ### clean text
     # remove whitespace
     RE_WSPACE = re.compile(r"\s+", re.IGNORECASE) 
@@ -80,7 +123,7 @@ def clean_and_stem_tweet(text):
     text = re.sub(RE_HASHTAGS, " ", text)
 
     # tokenize
-    tknzr = TweetTokenizer()
+    tknzr = get_tweet_tokenizer()
     text = tknzr.tokenize(text)
 
     # remove words which have only 1 or 3 characters (mostly acronyms)
@@ -145,6 +188,7 @@ def preprocess_for_nlp(data):
 def count_vectorize(x_train, x_test):
     '''Apply sklearn CountVectorizer to train and test data.
     '''
+    from sklearn.feature_extraction.text import CountVectorizer
     
     vectorizer = CountVectorizer(max_features=30000, min_df=50, max_df=0.90, tokenizer=str.split, ngram_range=(1,1))
 
@@ -155,12 +199,19 @@ def count_vectorize(x_train, x_test):
     return x_train, x_test, vectorizer
     
     
+def get_tfidf_vectorizer(min_df=50):
+    """TfidfVectorizer with the settings used for party classification."""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(analyzer="word", max_df=0.90, min_df=min_df, norm="l2", tokenizer=str.split, lowercase=False,
+                           ngram_range=(1,1))
+
+
 def tfidf_vectorize(x_train, x_test):
     '''Apply sklearn TfidfVectorizer to train and test data.
     '''
     
-    vectorizer = TfidfVectorizer(analyzer="word", max_df=0.90, min_df=50, norm="l2", tokenizer=str.split, lowercase=False,
-                                ngram_range=(1,1))
+    vectorizer = get_tfidf_vectorizer()
 
     # prevent data leakage: fit on train set, transform only on test set
     x_train = vectorizer.fit_transform(x_train)
@@ -169,35 +220,101 @@ def tfidf_vectorize(x_train, x_test):
     return x_train, x_test, vectorizer
 
 
-def perform_party_regression_analysis(data, verbose=0):
-    """Use logistic regression to perform party classification based on tweet content.
+def build_tfidf_feature_store(data):
+    """Fits the TF-IDF vocabulary and IDF weights once on the full corpus and stores
+    the document-term matrix together with dates and labels, sorted by date.
+    Date ranges can then be selected with select_date_range() without re-vectorizing.
     
     Args:
-        data: Pre-processed dataset
+        data: Pre-processed dataset (columns "date", "party" and "text_stemmed")
+        
+    Returns:
+        feature_store: Dictionary with the fitted vectorizer, the CSR document-term
+            matrix and the row-aligned arrays "dates", "party_ids" and "ids"
+    """
+    
+    # sort by date (stable, so equal dates keep their order)
+    data = data.sort_values(by='date', kind='mergesort')
+    
+    vectorizer = get_tfidf_vectorizer()
+    matrix = vectorizer.fit_transform(data['text_stemmed'].fillna('')).tocsr()
+    
+    feature_store = {
+        'vectorizer': vectorizer,
+        'matrix': matrix,
+        'dates': data['date'].values,
+        'party_ids': data['party'].map(party2id).values,
+        'ids': data['id'].values,
+    }
+    feature_store['version'] = get_feature_store_version(feature_store)
+    return feature_store
+
+
+def get_feature_store_version(feature_store):
+    """Fingerprint of the dataset in a feature store (tweets, dates, labels and vectorized text).
+    
+    Args:
+        feature_store: Output of build_tfidf_feature_store
+        
+    Returns:
+        version: Hex digest which changes whenever the underlying dataset changes
+    """
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(feature_store['ids'], dtype=np.int64).tobytes())
+    h.update(np.ascontiguousarray(feature_store['dates']).astype('datetime64[ns]').tobytes())
+    h.update(np.ascontiguousarray(feature_store['party_ids'], dtype=np.int64).tobytes())
+    h.update(feature_store['matrix'].indptr.tobytes())
+    h.update(feature_store['matrix'].indices.tobytes())
+    h.update(" ".join(sorted(feature_store['vectorizer'].vocabulary_)).encode('utf-8'))
+    version = h.hexdigest()
+    return version
+
+
+def select_date_range(feature_store, start_datetime, end_datetime):
+    """Selects all rows of the feature store within a date range (both ends inclusive).
+    Since rows are sorted by date, the range is found by binary search and the
+    matrix is sliced without copying the whole corpus.
+    
+    Args:
+        feature_store: Output of build_tfidf_feature_store
+        start_datetime: Start of the date range
+        end_datetime: End of the date range
+        
+    Returns:
+        x: CSR document-term matrix of the selected tweets
+        y: Party ID's of the selected tweets
+    """
+    dates = feature_store['dates']
+    start = np.searchsorted(dates, np.datetime64(start_datetime), side='left')
+    end = np.searchsorted(dates, np.datetime64(end_datetime), side='right')
+    
+    x = feature_store['matrix'][start:end]
+    y = feature_store['party_ids'][start:end]
+    return x, y
+
+
+def fit_party_classifier(x_train, x_test, y_train, y_test, C=0.1, verbose=0):
+    """Fits the logistic regression model for party classification and evaluates it.
+    
+    Args:
+        x_train, x_test: Vectorized train and test data
+        y_train, y_test: Party ID's for train and test data
+        C: Inverse regularization strength
         
     Returns:
         model: Fitted model
-        vectorizer: Fitted vectorizer
         train_acc: Train accuracy
         test_acc: Test accuracy
     """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import accuracy_score
     
-    # generate label-encoded column for party affiliation
-    data["party_id"] = data["party"].map(
-        lambda x: party2id[x]
-    )
-    
-    # split
-    x_train, x_test, y_train, y_test = train_test_split(data['text_stemmed'], data['party_id'], test_size=0.05, random_state=42)
-
-    # vectorize
-    x_train, x_test, vectorizer = tfidf_vectorize(x_train, x_test)
     if verbose:
         print(f"Working with {x_train.shape[0]} samples.")
         print(f"Working with {x_train.shape[1]} features.")
     
     # fit model
-    model = LogisticRegression(random_state=0, C=0.1)
+    model = LogisticRegression(random_state=0, C=C)
     if verbose:
         print(f"Fitting model ...")
     model.fit(x_train, y_train)
@@ -212,9 +329,183 @@ def perform_party_regression_analysis(data, verbose=0):
         print(f'Train acccuracy: {train_acc}')
         print(f'Test acccuracy: {test_acc}')
 
+    return model, train_acc, test_acc
+
+
+def perform_party_regression_analysis(data, verbose=0):
+    """Use logistic regression to perform party classification based on tweet content.
+    
+    Args:
+        data: Pre-processed dataset
+        
+    Returns:
+        model: Fitted model
+        vectorizer: Fitted vectorizer
+        train_acc: Train accuracy
+        test_acc: Test accuracy
+    """
+    from sklearn.model_selection import train_test_split
+    
+    # generate label-encoded column for party affiliation
+    data["party_id"] = data["party"].map(
+        lambda x: party2id[x]
+    )
+    
+    # split
+    x_train, x_test, y_train, y_test = train_test_split(data['text_stemmed'], data['party_id'], test_size=0.05, random_state=42)
+
+    # vectorize
+    x_train, x_test, vectorizer = tfidf_vectorize(x_train, x_test)
+    
+    # fit model
+    model, train_acc, test_acc = fit_party_classifier(x_train, x_test, y_train, y_test, verbose=verbose)
+
     return model, vectorizer, train_acc, test_acc
 
 
+def perform_party_regression_analysis_from_store(feature_store, start_datetime, end_datetime,
+                                                  C=0.1, test_size=0.05, random_state=42, verbose=0):
+    """Same as perform_party_regression_analysis, but works on the pre-vectorized
+    corpus in a feature store (no vectorization on this path).
+    
+    Args:
+        feature_store: Output of build_tfidf_feature_store
+        start_datetime: Start of the date range
+        end_datetime: End of the date range
+        C: Inverse regularization strength
+        test_size: Fraction of tweets held out for testing
+        random_state: Seed for the train/test split
+        
+    Returns:
+        model: Fitted model
+        vectorizer: Vectorizer of the feature store
+        train_acc: Train accuracy
+        test_acc: Test accuracy
+    """
+    from sklearn.model_selection import train_test_split
+    
+    x, y = select_date_range(feature_store, start_datetime, end_datetime)
+    
+    # split
+    x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=test_size, random_state=random_state)
+    
+    # fit model
+    model, train_acc, test_acc = fit_party_classifier(x_train, x_test, y_train, y_test, C=C, verbose=verbose)
+    
+    return model, feature_store['vectorizer'], train_acc, test_acc
+
+
+def get_feature_names_array(vectorizer):
+    """Feature names of a fitted vectorizer as a numpy array.
+    Computed once per vectorizer (get_feature_names() rebuilds the list on every call).
+    
+    Args:
+        vectorizer: Fitted vectorizer
+        
+    Returns:
+        feature_names: numpy.array of feature names
+    """
+    try:
+        return _feature_names_cache[vectorizer]
+    except KeyError:
+        pass
+    
+    if hasattr(vectorizer, 'get_feature_names_out'):
+        feature_names = vectorizer.get_feature_names_out()
+    else:
+        feature_names = vectorizer.get_feature_names()
+    feature_names = np.asarray(feature_names, dtype=object)
+    
+    _feature_names_cache[vectorizer] = feature_names
+    return feature_names
+
+
+def get_translation_array(vectorizer, translation_set):
+    """Lookup array translating each feature (word stem) of a vectorizer into the most frequent
+    original word. Computed once per vectorizer and translation set.
+    
+    Args:
+        vectorizer: Fitted vectorizer
+        translation_set: Dictionary for translation of word stems into originals
+        
+    Returns:
+        translation_array: numpy.array of original words, aligned with the feature names
+    """
+    cached = _translation_cache.get(vectorizer)
+    if (cached is not None) and (cached[0] is translation_set):
+        return cached[1]
+    
+    feature_names = get_feature_names_array(vectorizer)
+    translation_array = np.array([translate_stem(w, translation_set) for w in feature_names], dtype=object)
+    
+    _translation_cache[vectorizer] = (translation_set, translation_array)
+    return translation_array
+
+
+def get_top_n_indices(coef, n):
+    """Column indices of the n largest values in each row, sorted by decreasing value.
+    Uses a partial sort over the whole matrix (only the top n are fully sorted).
+    
+    Args:
+        coef: 2D numpy.array (e.g. model coefficients, one row per category)
+        n: Number of indices per row
+        
+    Returns:
+        top_n_ind: numpy.array of shape (rows, n)
+    """
+    n = min(n, coef.shape[1])
+    rows = np.arange(coef.shape[0])[:, None]
+    
+    top_n_ind = np.argpartition(-coef, n - 1, axis=1)[:, :n]
+    order = np.argsort(-coef[rows, top_n_ind], axis=1, kind='stable')
+    return top_n_ind[rows, order]
+
+
+def get_class_coefficients(model):
+    """Coefficients of a fitted linear model with one row per class in model.classes_.
+    For two classes the model only has one row (for classes_[1]), the other class
+    gets the negated coefficients.
+    
+    Args:
+        model: Fitted logistic regression model
+        
+    Returns:
+        coef: numpy.array of shape (classes, features)
+    """
+    coef = model.coef_
+    if len(model.classes_) == 2 and coef.shape[0] == 1:
+        coef = np.concatenate([-coef, coef])
+    return coef
+
+
+def get_top_n_words_report(model, vectorizer, n, translation_set, stemming=True):
+    """Get most important words and their coefficients for all categories at once.
+    
+    Args:
+        model: Fitted logistic regression model
+        vectorizer: Fitted vectorizer
+        n: Number of words to retrieve per category
+        translation_set: Dictionary for translation of word stems into originals
+        stemming: (bool) whether features are word stems or originals
+        
+    Returns:
+        words: numpy.array of shape (categories, n) with the most important words
+            (rows follow model.classes_)
+        importance: numpy.array of shape (categories, n) with the importance factors
+    """
+    coef = get_class_coefficients(model)
+    top_n_ind = get_top_n_indices(coef, n)
+    importance = np.take_along_axis(coef, top_n_ind, axis=1)
+    
+    if stemming:
+        # if words are stemmed take the most frequent original word
+        words = get_translation_array(vectorizer, translation_set)[top_n_ind]
+    else:
+        words = get_feature_names_array(vectorizer)[top_n_ind]
+    
+    return words, importance
+
+
 def get_top_n_words_from_model(model, vectorizer, category, n, translation_set, stemming=True):
     """Get most important word coefficients and their values for a given category.
     
@@ -231,27 +522,63 @@ def get_top_n_words_from_model(model, vectorizer, category, n, translation_set,
         importance: Importance factors
     """
     
-    # sort model coefficients and get n most important words with score
-    index = party2id[category]
-    topN_ind = model.coef_[index,:].argsort()[-n:][::-1]
-    importance = [model.coef_[index, i] for i in topN_ind]
-    words = [vectorizer.get_feature_names()[i] for i in topN_ind]
+    # get n most important words with score
+    coef = get_class_coefficients(model)
+    index = list(model.classes_).index(party2id[category])
+    topN_ind = get_top_n_indices(coef[index:index+1, :], n)[0]
+    importance = list(coef[index, topN_ind])
     
     if stemming:
         # if words are stemmed take the most frequent original word
-        words_ = []
-        for w in words:
-            try:
-                chosen_word = pd.Series(translation_set[w]).idxmax()
-            except KeyError:
-                # if word is not in translation set, take the stem instead (could happen for new words)
-                chosen_word = w
-            words_.append(chosen_word)
-        words = words_
+        words = [translate_stem(w, translation_set) for w in get_feature_names_array(vectorizer)[topN_ind]]
+    else:
+        words = list(get_feature_names_array(vectorizer)[topN_ind])
     
     return importance, words
 
 
+def translate_stem(word, translation_set):
+    """Translates a word stem into the most frequent original word.
+    
+    Args:
+        word: Word stem
+        translation_set: Dictionary for translation of word stems into originals
+        
+    Returns:
+        chosen_word: Most frequent original word (or the stem if it is unknown)
+    """
+    counts = translation_set.get(word) if translation_set else None
+    if not counts:
+        # if word is not in translation set, take the stem instead (could happen for new words)
+        return word
+    chosen_word = max(counts, key=counts.get)
+    return chosen_word
+
+
+def get_party_word_importance(model, vectorizer, translation_set, n=40, stemming=True):
+    """Get top N words and their importance for each party from a fitted model.
+    
+    Args:
+        model: Fitted logistic regression model
+        vectorizer: Fitted vectorizer
+        translation_set: Dictionary for translation word stems into originals
+        n: How many words to get
+        stemming: Whether to translate word stems into original words
+        
+    Returns:
+        party_word_importance: A dictionary containing a dictionary mapping words
+            to importance values for each party (only parties the model was trained on).
+    """
+    words, importance = get_top_n_words_report(model, vectorizer, n, translation_set, stemming=stemming)
+    
+    party_word_importance = dict()
+    for index, party_id in enumerate(model.classes_):
+        word_importance = {k:v for (k,v) in zip(words[index], importance[index])}
+        party_word_importance[id2party[party_id]] = word_importance
+    
+    return party_word_importance
+
+
 def get_all_top_n_words(data, translation_set, n=40, verbose=0):
     """Get top N words for each party from dataset.
     
@@ -268,12 +595,31 @@ def get_all_top_n_words(data, translation_set, n=40, verbose=0):
     """
     
     model, vectorizer, train_acc, test_acc = perform_party_regression_analysis(data, verbose=verbose)
+    party_word_importance = get_party_word_importance(model, vectorizer, translation_set, n=n)
     
-    party_word_importance = dict()
-    for party in party2id.keys():
-        importance, words = get_top_n_words_from_model(model, vectorizer, party, n, translation_set, stemming=True)
-        word_importance = {k:v for (k,v) in zip(words, importance)}
-        party_word_importance[party] = word_importance
+    return party_word_importance, train_acc, test_acc
+
+
+def get_all_top_n_words_from_store(feature_store, start_datetime, end_datetime, translation_set, n=40, verbose=0):
+    """Get top N words for each party for a date range of the feature store.
+    
+    Args:
+        feature_store: Output of build_tfidf_feature_store
+        start_datetime: Start of the date range
+        end_datetime: End of the date range
+        translation_set: Dictionary for translation word stems into originals
+        n: How many words to get
+        
+    Returns:
+        party_word_importance: A dictionary containing a dictionary mapping words
+            to importance values for each party.
+        train_acc: Train accuracy
+        test_acc: Test accuracy
+    """
+    
+    model, vectorizer, train_acc, test_acc = perform_party_regression_analysis_from_store(
+        feature_store, start_datetime, end_datetime, verbose=verbose)
+    party_word_importance = get_party_word_importance(model, vectorizer, translation_set, n=n)
     
     return party_word_importance, train_acc, test_acc
 
@@ -319,6 +665,8 @@ def perform_NMF_analysis(data, n_components=20, verbose=0):
         topics: Dictionary mapping topic ID to top 5 tokens
         tweet_topics: Topic for each tweet
     """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.decomposition import NMF
 
     vectorizer = TfidfVectorizer(analyzer="word", max_df=0.90, min_df=50, norm="l2", tokenizer=nmf_tokenizer, lowercase=True, ngram_range=(1,1))
     x_train = vectorizer.fit_transform(data['hashtags'])
@@ -365,4 +713,98 @@ def intersect_topics(topics, wordsets):
         # save length of intersection with each topic
         intersections[:, ind] = len_intersection
 
-    return intersections
\ No newline at end of file
+    return intersections
+
+def build_topic_engine(data):
+    """Builds the data structures for fast topic intersections (topics page).
+    Tweet messages are vectorized once into a lowercase binary document-term matrix
+    (same tokens as row_operators.get_tweet_as_word_set), and the tweet counts per
+    month and token are aggregated once as well.
+    
+    Args:
+        data: Tweet dataset (columns "date" and "text")
+        
+    Returns:
+        topic_engine: Dictionary with the "vocabulary" (token to column), the binary CSR
+            document-term "matrix", the row-aligned "dates", the month end "months"
+            and the CSC "month_matrix" (months x tokens) with tweet counts
+    """
+    from sklearn.feature_extraction.text import CountVectorizer
+    from scipy import sparse as sp
+    
+    vectorizer = CountVectorizer(analyzer="word", tokenizer=str.split, token_pattern=None, lowercase=True,
+                                 binary=True, dtype=np.int8)
+    matrix = vectorizer.fit_transform(data['text']).tocsr()
+    
+    # aggregate tweets per month (one-hot month assignment times document-term matrix)
+    periods = pd.DatetimeIndex(data['date']).to_period('M')
+    codes, months = pd.factorize(periods, sort=True)
+    month_assignment = sp.csr_matrix((np.ones(len(codes), dtype=np.int32), (codes, np.arange(len(codes)))),
+                                     shape=(len(months), len(codes)))
+    month_matrix = (month_assignment @ matrix).tocsc()
+    
+    topic_engine = {
+        'vocabulary': vectorizer.vocabulary_,
+        'matrix': matrix,
+        'dates': data['date'].values,
+        'months': months.to_timestamp(how='end').normalize(),
+        'month_matrix': month_matrix,
+    }
+    return topic_engine
+
+
+def get_topic_indicators(topic_engine, topics):
+    """Sparse indicator matrix of the topic key words (lowercased, unknown words are ignored).
+    
+    Args:
+        topic_engine: Output of build_topic_engine
+        topics: Dictionary mapping topic ID's (0, 1, ...) to key words
+        
+    Returns:
+        indicators: CSR matrix (tokens x topics), 1 where a token is a key word of a topic
+    """
+    from scipy import sparse as sp
+    
+    vocabulary = topic_engine['vocabulary']
+    rows, cols = [], []
+    for ind in range(len(topics)):
+        selector = {e.lower() for e in topics[ind]}
+        for word in selector:
+            if word in vocabulary:
+                rows.append(vocabulary[word])
+                cols.append(ind)
+    
+    indicators = sp.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                               shape=(len(vocabulary), len(topics)))
+    return indicators
+
+
+def intersect_topics_sparse(topic_engine, topics):
+    """Same as intersect_topics, but with a single sparse matrix product.
+    
+    Args:
+        topic_engine: Output of build_topic_engine
+        topics: Dictionary mapping topic ID's (0, 1, ...) to key words
+        
+    Returns:
+        intersections: numpy.array indicating number of word intersections 
+            for each tweet and topic
+    """
+    intersections = (topic_engine['matrix'] @ get_topic_indicators(topic_engine, topics)).toarray()
+    return intersections
+
+
+def get_monthly_topic_counts(topic_engine, topics):
+    """Monthly sums of the intersections between topics and tweet messages
+    (equivalent to resampling the output of intersect_topics_sparse per month).
+    
+    Args:
+        topic_engine: Output of build_topic_engine
+        topics: Dictionary mapping topic ID's (0, 1, ...) to key words
+        
+    Returns:
+        monthly_counts: DataFrame indexed by month end, one column per topic
+    """
+    counts = (topic_engine['month_matrix'] @ get_topic_indicators(topic_engine, topics)).toarray()
+    monthly_counts = pd.DataFrame(counts, index=topic_engine['months'], columns=range(len(topics)))
+    return monthly_counts
@@ -0,0 +1,336 @@
+"""Online topic model (topics page):
+Minibatch NMF on the TF-IDF weighted hashtags, updated incrementally from new
+tweets instead of refitting on the whole dataset.
+
+The model keeps the sufficient statistics of all batches seen so far
+(A = sum W^T W, B = sum W^T X), so that each update only needs the new batch,
+and warm-starts from the previous components. After each update, topics are
+matched to the previous ones, so that topic ID's stay the same between runs.
+The model stores the ID's of the tweets it was trained on with its state.
+Per-tweet topic assignments are stored next to the model (assignments of
+batch NMF runs in a separate file, their topic ID's refer to another model).
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from bundestweets.nlp import nmf_tokenizer
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'nmf_model')
+
+EPSILON = 1e-10
+
+# topic assignments of the online model and of batch NMF runs (see notebooks/run_nmf.py)
+TWEET_TOPICS_FILE = 'tweet_topics.npz'
+BATCH_TWEET_TOPICS_FILE = 'batch_tweet_topics.npz'
+
+
+class OnlineNMF:
+    """Minibatch NMF (Frobenius loss, multiplicative updates) with a growing vocabulary."""
+
+    def __init__(self, n_components=20, alpha=0.1, forget_factor=1.0, max_iter=200, n_inner_iter=50,
+                 min_df=50, max_df=0.9, random_state=1):
+        """
+        Args:
+            n_components: Number of topics
+            alpha: L2 regularization of the components
+            forget_factor: Weight of the previous statistics for each new batch
+                (1.0 remembers all tweets, smaller values let the topics follow recent tweets)
+            max_iter: Number of iterations for the first fit
+            n_inner_iter: Number of iterations per update (for W and for the components)
+            min_df: Minimum number of tweets for a hashtag to be used as topic keyword
+            max_df: Maximum fraction of tweets for a hashtag to be used as topic keyword
+            random_state: Seed for the initialization
+        """
+        self.n_components = n_components
+        self.alpha = alpha
+        self.forget_factor = forget_factor
+        self.max_iter = max_iter
+        self.n_inner_iter = n_inner_iter
+        self.min_df = min_df
+        self.max_df = max_df
+        self.random_state = random_state
+
+        self.tokens = []
+        self.vocabulary = dict()
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self.components_ = None
+        self.A = None
+        self.B = None
+        # ID's of the tweets the model was trained on (None: unknown, for models saved without them)
+        self.seen_ids = np.zeros(0, dtype=np.int64)
+
+    def _tokenize(self, hashtags):
+        return [nmf_tokenizer(text.lower()) for text in pd.Series(hashtags).fillna('')]
+
+    def _update_vocabulary(self, docs):
+        """Adds new tokens and updates the document frequencies."""
+        for doc in docs:
+            for token in doc:
+                if token not in self.vocabulary:
+                    self.vocabulary[token] = len(self.tokens)
+                    self.tokens.append(token)
+        doc_freq = np.zeros(len(self.tokens), dtype=np.int64)
+        doc_freq[:len(self.doc_freq)] = self.doc_freq
+        cols = [self.vocabulary[token] for doc in docs for token in set(doc)]
+        np.add.at(doc_freq, cols, 1)
+        self.doc_freq = doc_freq
+        self.n_docs += len(docs)
+
+    def _tfidf(self, docs):
+        """TF-IDF matrix (smooth IDF from all tweets seen so far, l2 normalized rows)."""
+        from scipy import sparse as sp
+
+        rows, cols = [], []
+        for (row, doc) in enumerate(docs):
+            for token in doc:
+                if token in self.vocabulary:
+                    rows.append(row)
+                    cols.append(self.vocabulary[token])
+        x = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(docs), len(self.tokens)))
+        x.sum_duplicates()
+
+        idf = np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1
+        x = x @ sp.diags(idf)
+        norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+        x = sp.diags(1 / np.maximum(norms, EPSILON)) @ x
+        return x.tocsr()
+
+    def _solve_w(self, x, h, n_iter):
+        """Topic weights of each tweet for fixed components."""
+        rng = np.random.RandomState(self.random_state)
+        w = rng.rand(x.shape[0], self.n_components) * np.sqrt(max(x.mean(), EPSILON) / self.n_components)
+        xht = x @ h.T
+        hht = h @ h.T
+        for _ in range(n_iter):
+            w *= xht / np.maximum(w @ hht, EPSILON)
+        return w
+
+    def _update_components(self, n_iter):
+        """Minimizes the accumulated loss over the components for fixed statistics."""
+        for _ in range(n_iter):
+            self.components_ *= self.B / np.maximum(self.A @ self.components_ + self.alpha * self.components_, EPSILON)
+
+    def _match_topics(self, previous):
+        """Reorders the topics such that each one gets the ID of the most similar previous topic."""
+        from scipy.optimize import linear_sum_assignment
+
+        def normalize(h):
+            return h / np.maximum(np.linalg.norm(h, axis=1, keepdims=True), EPSILON)
+
+        similarity = normalize(previous) @ normalize(self.components_).T
+        _, order = linear_sum_assignment(-similarity)
+        self.components_ = self.components_[order]
+        self.A = self.A[order][:, order]
+        self.B = self.B[order]
+
+    def partial_fit(self, hashtags, ids=None):
+        """Updates the model with a batch of tweets.
+
+        Args:
+            hashtags: Hashtags of each tweet (strings separated by white space)
+            ids: Tweet ID's (added to seen_ids)
+
+        Returns:
+            self
+        """
+        if (ids is not None) and (self.seen_ids is not None):
+            self.seen_ids = np.concatenate([self.seen_ids, np.asarray(ids, dtype=np.int64)])
+        docs = self._tokenize(hashtags)
+        self._update_vocabulary(docs)
+        x = self._tfidf(docs)
+        n_features = len(self.tokens)
+        rng = np.random.RandomState(self.random_state)
+
+        if self.components_ is None:
+            # first fit: random initialization and alternating updates on the batch
+            scale = np.sqrt(max(x.mean(), EPSILON) / self.n_components)
+            self.components_ = rng.rand(self.n_components, n_features) * scale
+            w = rng.rand(x.shape[0], self.n_components) * scale
+            for _ in range(self.max_iter):
+                w *= (x @ self.components_.T) / np.maximum(w @ (self.components_ @ self.components_.T), EPSILON)
+                self.A = w.T @ w
+                self.B = np.asarray((x.T @ w).T)
+                self._update_components(1)
+            return self
+
+        # new hashtags start with small positive weights (multiplicative updates keep zeros at zero)
+        previous = self.components_
+        n_new = n_features - previous.shape[1]
+        if n_new > 0:
+            scale = EPSILON + 0.01 * previous.mean()
+            self.components_ = np.hstack([previous, rng.rand(self.n_components, n_new) * scale])
+            self.B = np.hstack([self.B, np.zeros((self.n_components, n_new))])
+            previous = np.hstack([previous, np.zeros((self.n_components, n_new))])
+
+        # warm start from the previous components
+        w = self._solve_w(x, self.components_, self.n_inner_iter)
+        self.A = self.forget_factor * self.A + w.T @ w
+        self.B = self.forget_factor * self.B + np.asarray((x.T @ w).T)
+        self._update_components(self.n_inner_iter)
+        self._match_topics(previous)
+        return self
+
+    def transform(self, hashtags):
+        """Topic weights of each tweet.
+
+        Args:
+            hashtags: Hashtags of each tweet (strings separated by white space)
+
+        Returns:
+            w: numpy.array (tweets x topics)
+        """
+        x = self._tfidf(self._tokenize(hashtags))
+        return self._solve_w(x, self.components_, self.n_inner_iter)
+
+    def get_topics(self, n_top_words=5, verbose=0):
+        """Return the top words for each topic (only hashtags within min_df / max_df).
+
+        Returns:
+            top_words: Dictionary with the top words for each topic
+        """
+        mask = (self.doc_freq >= self.min_df) & (self.doc_freq <= self.max_df * self.n_docs)
+        components = np.where(mask, self.components_, -1)
+
+        top_words = dict()
+        for topic_idx, topic in enumerate(components):
+            top = [i for i in topic.argsort()[:-n_top_words - 1:-1] if mask[i]]
+            top_words[topic_idx] = [self.tokens[i] for i in top]
+
+            if verbose:
+                print(f"Topic #{topic_idx}: " + " ".join(top_words[topic_idx]))
+
+        return top_words
+
+    def save(self, model_dir=MODEL_DIR):
+        """Save the model state to a directory."""
+        os.makedirs(model_dir, exist_ok=True)
+
+        file_path = os.path.join(model_dir, 'state.npz')
+        with open(file_path + '.tmp', 'wb') as fp:
+            state = dict(components=self.components_, A=self.A, B=self.B, doc_freq=self.doc_freq)
+            if self.seen_ids is not None:
+                state['seen_ids'] = self.seen_ids
+            np.savez(fp, **state)
+        os.replace(file_path + '.tmp', file_path)
+
+        config = {k: getattr(self, k) for k in ['n_components', 'alpha', 'forget_factor', 'max_iter', 'n_inner_iter',
+                                                 'min_df', 'max_df', 'random_state', 'n_docs', 'tokens']}
+        file_path = os.path.join(model_dir, 'model.json')
+        with open(file_path + '.tmp', 'w') as fp:
+            json.dump(config, fp)
+        os.replace(file_path + '.tmp', file_path)
+
+    @classmethod
+    def load(cls, model_dir=MODEL_DIR):
+        """Load a model saved with save() (None if there is no model)."""
+        file_path = os.path.join(model_dir, 'model.json')
+        if not os.path.isfile(file_path):
+            return None
+        with open(file_path, 'r') as fp:
+            config = json.load(fp)
+        tokens = config.pop('tokens')
+        n_docs = config.pop('n_docs')
+
+        model = cls(**config)
+        model.tokens = tokens
+        model.vocabulary = {token: col for (col, token) in enumerate(tokens)}
+        model.n_docs = n_docs
+        with np.load(os.path.join(model_dir, 'state.npz')) as state:
+            model.components_ = state['components']
+            model.A = state['A']
+            model.B = state['B']
+            model.doc_freq = state['doc_freq']
+            model.seen_ids = state['seen_ids'] if 'seen_ids' in state.files else None
+        return model
+
+
+def get_tweet_topics(w):
+    """Topic for each tweet (-1 for tweets without hashtags of the vocabulary)."""
+    tweet_topics = w.argmax(axis=1)
+    tweet_topics[w.max(axis=1) <= EPSILON] = -1
+    return tweet_topics
+
+
+def load_tweet_topics(model_dir=MODEL_DIR, file_name=TWEET_TOPICS_FILE):
+    """Load the stored topic assignments.
+
+    Args:
+        model_dir: Model directory
+        file_name: TWEET_TOPICS_FILE (online model) or BATCH_TWEET_TOPICS_FILE (batch NMF)
+
+    Returns:
+        tweet_topics: pandas.Series mapping tweet ID's to topic ID's (empty if nothing is stored)
+    """
+    file_path = os.path.join(model_dir, file_name)
+    if not os.path.isfile(file_path):
+        return pd.Series([], dtype=np.int64)
+    with np.load(file_path) as stored:
+        return pd.Series(stored['topics'], index=stored['ids'])
+
+
+def save_tweet_topics(ids, tweet_topics, model_dir=MODEL_DIR, file_name=TWEET_TOPICS_FILE):
+    """Store topic assignments (replaces the assignments of tweets which are already stored).
+
+    Args:
+        ids: Tweet ID's
+        tweet_topics: Topic ID for each tweet
+        model_dir: Model directory
+        file_name: TWEET_TOPICS_FILE (online model) or BATCH_TWEET_TOPICS_FILE (batch NMF)
+    """
+    stored = load_tweet_topics(model_dir, file_name)
+    new = pd.Series(np.asarray(tweet_topics, dtype=np.int64), index=np.asarray(ids, dtype=np.int64))
+    stored = pd.concat([stored.loc[~stored.index.isin(new.index)], new])
+
+    os.makedirs(model_dir, exist_ok=True)
+    file_path = os.path.join(model_dir, file_name)
+    with open(file_path + '.tmp', 'wb') as fp:
+        np.savez(fp, ids=stored.index.values.astype(np.int64), topics=stored.values.astype(np.int64))
+    os.replace(file_path + '.tmp', file_path)
+
+
+def update_topic_model(data, model_dir=MODEL_DIR, n_components=20, batch_size=10000, reassign=False, verbose=0):
+    """Updates the online topic model with all tweets which it has not seen yet
+    (creates the model if it does not exist) and stores their topic assignments.
+
+    Args:
+        data: Tweet dataset (columns "id" and "hashtags")
+        model_dir: Model directory
+        n_components: Number of topics (only used when creating the model)
+        batch_size: Number of tweets per minibatch
+        reassign: Whether to recompute the topic assignments of all tweets with the updated model
+        verbose: Whether to print intermediate results or not
+
+    Returns:
+        topics: Dictionary mapping topic ID to top 5 tokens
+        n_new: Number of new tweets
+    """
+    model = OnlineNMF.load(model_dir)
+    if model is None:
+        model = OnlineNMF(n_components=n_components)
+    elif model.seen_ids is None:
+        # (models saved without their tweet ID's: all tweets with stored assignments were seen)
+        model.seen_ids = load_tweet_topics(model_dir).index.values.astype(np.int64)
+    new_data = data.loc[~data['id'].astype(np.int64).isin(model.seen_ids), :]
+
+    for start in range(0, len(new_data), batch_size):
+        batch = new_data.iloc[start:start + batch_size]
+        model.partial_fit(batch['hashtags'], ids=batch['id'])
+        if verbose:
+            print(f'Updated topic model with {start + len(batch)}/{len(new_data)} new tweets.')
+
+    if len(new_data) > 0:
+        model.save(model_dir)
+
+    assign = data if reassign else new_data
+    if len(assign) > 0:
+        tweet_topics = [get_tweet_topics(model.transform(assign['hashtags'].iloc[start:start + batch_size]))
+                        for start in range(0, len(assign), batch_size)]
+        save_tweet_topics(assign['id'], np.concatenate(tweet_topics), model_dir)
+
+    topics = model.get_topics(n_top_words=5, verbose=verbose) if model.components_ is not None else dict()
+    return topics, len(new_data)
@@ -0,0 +1,203 @@
+"""Benchmark harness for the party classification:
+k-fold cross-validation of several vectorizer and model configurations,
+run in parallel over processes. For each configuration and fold, fit time,
+predict throughput, memory increase and accuracy are recorded.
+
+Each (configuration, fold) pair runs in a fresh worker process. A forked worker
+starts with the resident memory of the parent (corpus included), so only the
+increase of its peak resident memory above that baseline is attributed to the
+fold. This is a lower bound of the memory the fold needs.
+"""
+
+import itertools
+import multiprocessing
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+from bundestweets.nlp import party2id, get_tfidf_vectorizer
+
+# corpus shared with the worker processes (set by the pool initializer)
+_corpus = {}
+
+
+def make_synthetic_corpus(n_tweets=50000, vocabulary_size=20000, n_party_words=300, random_state=0):
+    """Synthetic stemmed tweets: common words shared by all parties plus a few
+    party-specific words per tweet (Zipf-distributed word frequencies).
+
+    Args:
+        n_tweets: Number of tweets
+        vocabulary_size: Number of common words
+        n_party_words: Number of specific words per party
+        random_state: Seed
+
+    Returns:
+        texts: numpy array of strings
+        labels: Party ID for each tweet
+    """
+    rng = np.random.RandomState(random_state)
+    n_parties = len(party2id)
+    labels = rng.randint(0, n_parties, size=n_tweets)
+
+    common_p = 1 / np.arange(1, vocabulary_size + 1)
+    common_p /= common_p.sum()
+    lengths = rng.randint(5, 25, size=n_tweets)
+    common = rng.choice(vocabulary_size, size=lengths.sum(), p=common_p)
+    specific = rng.randint(0, n_party_words, size=(n_tweets, 2))
+
+    texts = []
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    for i in range(n_tweets):
+        words = [f'w{w}' for w in common[offsets[i]:offsets[i + 1]]]
+        words += [f'p{labels[i]}_{w}' for w in specific[i]]
+        texts.append(' '.join(words))
+    return np.array(texts, dtype=object), labels
+
+
+def load_corpus_from_db(db_file, chunk_size=50000):
+    """Pre-processed tweets of current members from a local database file.
+
+    Returns:
+        texts: numpy array of stemmed texts
+        labels: Party ID for each tweet
+    """
+    from bundestweets.streaming import iter_tweet_chunks
+
+    data = pd.concat(list(iter_tweet_chunks(db_file, chunk_size=chunk_size)))
+    return data['text_stemmed'].values, data['party_id'].values
+
+
+def get_configurations(vectorizers=('tfidf', 'hashing'), min_dfs=(50,), Cs=(0.1,), solvers=('lbfgs',),
+                       n_features=2**20, max_iter=100):
+    """Grid of configurations (min_df only applies to TF-IDF).
+
+    Returns:
+        configurations: List of dictionaries
+    """
+    configurations = []
+    for vectorizer in vectorizers:
+        for min_df, C, solver in itertools.product(min_dfs if vectorizer == 'tfidf' else [None], Cs, solvers):
+            configurations.append({'vectorizer': vectorizer, 'min_df': min_df, 'n_features': n_features,
+                                   'C': C, 'solver': solver, 'max_iter': max_iter})
+    return configurations
+
+
+def get_vectorizer(configuration):
+    """Unfitted vectorizer for a configuration."""
+    if configuration['vectorizer'] == 'tfidf':
+        return get_tfidf_vectorizer(min_df=configuration['min_df'])
+    if configuration['vectorizer'] == 'hashing':
+        from sklearn.feature_extraction.text import HashingVectorizer
+        return HashingVectorizer(analyzer="word", tokenizer=str.split, lowercase=False, norm="l2",
+                                 alternate_sign=False, n_features=configuration['n_features'])
+    raise ValueError(f"Unknown vectorizer: {configuration['vectorizer']}")
+
+
+def _init_worker(texts, labels):
+    _corpus['texts'] = texts
+    _corpus['labels'] = labels
+
+
+def run_fold(configuration, fold, train_index, test_index):
+    """Fits and evaluates one configuration on one fold (in a worker process).
+
+    Returns:
+        result: Dictionary with the configuration, timings, memory increase and accuracies
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    texts, labels = _corpus['texts'], _corpus['labels']
+    start_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    t = time.perf_counter()
+    vectorizer = get_vectorizer(configuration)
+    x_train = vectorizer.fit_transform(texts[train_index])
+    vectorize_time = time.perf_counter() - t
+
+    t = time.perf_counter()
+    model = LogisticRegression(random_state=0, C=configuration['C'], solver=configuration['solver'],
+                               max_iter=configuration['max_iter'])
+    model.fit(x_train, labels[train_index])
+    fit_time = time.perf_counter() - t
+
+    # prediction on raw texts (vectorization included)
+    t = time.perf_counter()
+    y_pred = model.predict(vectorizer.transform(texts[test_index]))
+    predict_time = time.perf_counter() - t
+    peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    result = dict(configuration)
+    result.update({
+        'fold': fold,
+        'n_features': x_train.shape[1],
+        'vectorize_time': vectorize_time,
+        'fit_time': fit_time,
+        'predict_throughput': len(test_index) / predict_time,
+        # ru_maxrss is in kB (Linux), its start value is inherited from the parent
+        'memory_increase_mb': (peak_memory - start_memory) / 2**10,
+        'train_acc': (model.predict(x_train) == labels[train_index]).mean(),
+        'test_acc': (y_pred == labels[test_index]).mean(),
+    })
+    return result
+
+
+def run_benchmark(texts, labels, configurations, n_splits=5, n_jobs=None, random_state=0, verbose=0):
+    """k-fold cross-validation of all configurations, (configuration, fold) pairs run in parallel.
+
+    Args:
+        texts: Stemmed texts
+        labels: Party ID for each text
+        configurations: Output of get_configurations
+        n_splits: Number of folds
+        n_jobs: Number of worker processes (default: number of CPUs)
+        random_state: Seed for the folds
+
+    Returns:
+        results: DataFrame with one row per configuration and fold
+    """
+    from sklearn.model_selection import StratifiedKFold
+
+    texts, labels = np.asarray(texts, dtype=object), np.asarray(labels)
+    folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state).split(texts, labels))
+
+    tasks = [(configuration, fold, train_index, test_index)
+             for configuration in configurations
+             for (fold, (train_index, test_index)) in enumerate(folds)]
+
+    # fork (where available), so that the corpus is shared with the workers instead of copied
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else None)
+    results = []
+    with context.Pool(processes=n_jobs, initializer=_init_worker, initargs=(texts, labels),
+                      maxtasksperchild=1) as pool:
+        pending = [pool.apply_async(run_fold, task) for task in tasks]
+        for result in pending:
+            result = result.get()
+            if verbose:
+                print(f"{result['vectorizer']} min_df={result['min_df']} C={result['C']} {result['solver']} "
+                      f"fold {result['fold']}: test accuracy {result['test_acc']:.3f}, fit {result['fit_time']:.1f}s")
+            results.append(result)
+
+    return pd.DataFrame(results)
+
+
+def summarize(results):
+    """Mean (and standard deviation of the test accuracy) over folds for each configuration.
+
+    Returns:
+        table: DataFrame with one row per configuration, sorted by test accuracy
+    """
+    keys = ['vectorizer', 'min_df', 'C', 'solver']
+    table = results.fillna({'min_df': '-'}).groupby(keys).agg(
+        n_features=('n_features', 'mean'),
+        vectorize_time=('vectorize_time', 'mean'),
+        fit_time=('fit_time', 'mean'),
+        predict_throughput=('predict_throughput', 'mean'),
+        memory_increase_mb=('memory_increase_mb', 'max'),
+        train_acc=('train_acc', 'mean'),
+        test_acc=('test_acc', 'mean'),
+        test_acc_std=('test_acc', 'std'),
+    )
+    return table.sort_values(by='test_acc', ascending=False)
@@ -0,0 +1,243 @@
+"""Persistent cache for the party classification (content page).
+
+Results (top words per party and accuracies) and fitted models are stored on disk,
+keyed by a hash of the date range, the dataset version and the hyperparameters.
+Standard time windows (months, quarters, years and all time) are precomputed
+offline by train_party_models.py, ad-hoc date ranges are trained once and then
+served from the cache as well.
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import bundestweets.nlp as my_nlp
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'party_models')
+
+# version of the stored results (part of the cache key, increase when their content changes)
+RESULT_VERSION = 2
+
+# hyperparameters of the party classification (part of the cache key)
+HYPERPARAMETERS = {
+    'C': 0.1,
+    'test_size': 0.05,
+    'random_state': 42,
+}
+
+
+def normalize_date_range(feature_store, start_datetime, end_datetime):
+    """Clamps a date range to the dates covered by the dataset.
+    Ranges which select the same tweets at the edges of the dataset (e.g. "until today")
+    are mapped to the same key.
+
+    Args:
+        feature_store: Output of nlp.build_tfidf_feature_store
+        start_datetime: Start of the date range
+        end_datetime: End of the date range
+
+    Returns:
+        start_datetime: pandas.Timestamp
+        end_datetime: pandas.Timestamp
+    """
+    dates = feature_store['dates']
+    start_datetime = max(pd.Timestamp(start_datetime), pd.Timestamp(dates[0]))
+    end_datetime = min(pd.Timestamp(end_datetime), pd.Timestamp(dates[-1]))
+    return start_datetime, end_datetime
+
+
+def get_cache_key(start_datetime, end_datetime, version, hyperparameters=HYPERPARAMETERS, n=40):
+    """Hash of (date range, dataset version, hyperparameters, result version).
+
+    Args:
+        start_datetime: Start of the (normalized) date range
+        end_datetime: End of the (normalized) date range
+        version: Dataset version (see nlp.get_feature_store_version)
+        hyperparameters: Dictionary with the model hyperparameters
+        n: Number of top words per party
+
+    Returns:
+        key: Hex digest
+    """
+    key = {
+        'start': pd.Timestamp(start_datetime).isoformat(),
+        'end': pd.Timestamp(end_datetime).isoformat(),
+        'version': version,
+        'hyperparameters': hyperparameters,
+        'n': n,
+        'result_version': RESULT_VERSION,
+    }
+    key = hashlib.sha256(json.dumps(key, sort_keys=True).encode('utf-8')).hexdigest()
+    return key
+
+
+def load_result(key, cache_dir=CACHE_DIR):
+    """Load a cached result.
+
+    Returns:
+        result: Dictionary with the cached result or None if there is no entry for the key
+    """
+    file_path = os.path.join(cache_dir, f'{key}.json')
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as fp:
+        result = json.load(fp)
+    return result
+
+
+def save_result(key, result, model=None, cache_dir=CACHE_DIR):
+    """Save a result (and optionally the fitted model) to the cache.
+    Files are written to a temporary file first and then renamed, so that
+    concurrent readers never see partially written entries.
+
+    Args:
+        key: Cache key
+        result: JSON serializable dictionary
+        model: Fitted model (stored with joblib)
+        cache_dir: Cache directory
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+
+    if model is not None:
+        import joblib
+        model_path = os.path.join(cache_dir, f'{key}.joblib')
+        joblib.dump(model, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+
+    file_path = os.path.join(cache_dir, f'{key}.json')
+    with open(file_path + '.tmp', 'w') as fp:
+        json.dump(result, fp)
+    os.replace(file_path + '.tmp', file_path)
+
+
+def load_model(key, cache_dir=CACHE_DIR):
+    """Load a fitted model from the cache (None if it was not stored)."""
+    model_path = os.path.join(cache_dir, f'{key}.joblib')
+    if not os.path.isfile(model_path):
+        return None
+    import joblib
+    return joblib.load(model_path)
+
+
+def train_party_model(feature_store, start_datetime, end_datetime, n=40, hyperparameters=HYPERPARAMETERS, verbose=0):
+    """Trains the party classifier on a date range and collects the (untranslated) top words.
+
+    Args:
+        feature_store: Output of nlp.build_tfidf_feature_store
+        start_datetime: Start of the date range
+        end_datetime: End of the date range
+        n: How many words to get
+        hyperparameters: Keyword arguments for nlp.perform_party_regression_analysis_from_store
+
+    Returns:
+        model: Fitted model
+        result: JSON serializable dictionary with top word stems, importances and accuracies
+    """
+    model, vectorizer, train_acc, test_acc = my_nlp.perform_party_regression_analysis_from_store(
+        feature_store, start_datetime, end_datetime, verbose=verbose, **hyperparameters)
+    party_word_importance = my_nlp.get_party_word_importance(model, vectorizer, None, n=n, stemming=False)
+
+    result = {
+        'start': pd.Timestamp(start_datetime).isoformat(),
+        'end': pd.Timestamp(end_datetime).isoformat(),
+        'version': feature_store['version'],
+        'party_word_importance': {party: {w: float(v) for (w, v) in word_importance.items()}
+                                  for (party, word_importance) in party_word_importance.items()},
+        'train_acc': float(train_acc),
+        'test_acc': float(test_acc),
+    }
+    return model, result
+
+
+def get_cached_top_n_words(feature_store, start_datetime, end_datetime, translation_set, n=40,
+                           cache_dir=CACHE_DIR, verbose=0):
+    """Get top N words for each party for a date range. Returns instantly for cached date ranges,
+    otherwise trains the model and stores model and result in the cache.
+
+    Args:
+        feature_store: Output of nlp.build_tfidf_feature_store
+        start_datetime: Start of the date range
+        end_datetime: End of the date range
+        translation_set: Dictionary for translation word stems into originals
+        n: How many words to get
+        cache_dir: Cache directory
+
+    Returns:
+        party_word_importance: A dictionary containing a dictionary mapping words
+            to importance values for each party.
+        train_acc: Train accuracy
+        test_acc: Test accuracy
+    """
+    start_datetime, end_datetime = normalize_date_range(feature_store, start_datetime, end_datetime)
+    key = get_cache_key(start_datetime, end_datetime, feature_store['version'], n=n)
+
+    result = load_result(key, cache_dir=cache_dir)
+    if result is None:
+        if verbose:
+            print(f'No cached result for {start_datetime} - {end_datetime}, training ...')
+        model, result = train_party_model(feature_store, start_datetime, end_datetime, n=n, verbose=verbose)
+        save_result(key, result, model=model, cache_dir=cache_dir)
+
+    # translate word stems into the most frequent original words
+    party_word_importance = dict()
+    for party, word_importance in result['party_word_importance'].items():
+        party_word_importance[party] = {my_nlp.translate_stem(w, translation_set): v
+                                        for (w, v) in word_importance.items()}
+
+    return party_word_importance, result['train_acc'], result['test_acc']
+
+
+def get_standard_windows(feature_store):
+    """Standard time windows covered by the dataset: each month, quarter and year, plus all time.
+    Windows are defined like the date selection on the content page (first day, last day).
+
+    Returns:
+        windows: List of (name, start_datetime, end_datetime)
+    """
+    first = pd.Timestamp(feature_store['dates'][0])
+    last = pd.Timestamp(feature_store['dates'][-1])
+
+    windows = [('all', first, last)]
+    for freq in ['M', 'Q', 'A']:
+        for period in pd.period_range(first, last, freq=freq):
+            start_datetime = period.start_time.normalize()
+            end_datetime = period.end_time.normalize()
+            windows.append((str(period), start_datetime, end_datetime))
+    return windows
+
+
+def precompute_standard_windows(feature_store, n=40, cache_dir=CACHE_DIR, min_tweets=100, verbose=0):
+    """Trains and stores models and results for all standard time windows (offline job).
+
+    Args:
+        feature_store: Output of nlp.build_tfidf_feature_store
+        n: How many words to get
+        cache_dir: Cache directory
+        min_tweets: Skip windows with fewer tweets
+
+    Returns:
+        n_trained: Number of newly trained windows
+    """
+    n_trained = 0
+    for name, start_datetime, end_datetime in get_standard_windows(feature_store):
+        start_datetime, end_datetime = normalize_date_range(feature_store, start_datetime, end_datetime)
+        key = get_cache_key(start_datetime, end_datetime, feature_store['version'], n=n)
+        if load_result(key, cache_dir=cache_dir) is not None:
+            continue
+
+        x, y = my_nlp.select_date_range(feature_store, start_datetime, end_datetime)
+        if (x.shape[0] < min_tweets) or (len(np.unique(y)) < 2):
+            if verbose:
+                print(f'Skipping window {name} ({x.shape[0]} tweets).')
+            continue
+
+        if verbose:
+            print(f'Training window {name} ({x.shape[0]} tweets) ...')
+        model, result = train_party_model(feature_store, start_datetime, end_datetime, n=n)
+        save_result(key, result, model=model, cache_dir=cache_dir)
+        n_trained += 1
+
+    return n_trained
@@ -0,0 +1,192 @@
+"""Out-of-core party classification:
+Reads pre-processed tweets in chunks from the database, uses stateless hashing
+features and trains a linear model incrementally (partial_fit), so that memory
+does not grow with the size of the corpus.
+"""
+
+import sqlite3
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import bundestweets.helpers as helpers
+from bundestweets.nlp import party2id
+
+
+class HashingFeatureMap:
+    """Stateless hashing vectorizer plus a reversible feature map.
+    The vectorizer needs no fitting, the map only counts word stems seen during
+    training so that hashed features can be translated back to words for the
+    top-words report. Behaves like a fitted vectorizer for nlp.get_party_word_importance.
+    """
+
+    def __init__(self, n_features=2**20):
+        """
+        Args:
+            n_features: Number of hash buckets
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.n_features = n_features
+        self.vectorizer = HashingVectorizer(analyzer="word", tokenizer=str.split, lowercase=False, norm="l2",
+                                            alternate_sign=False, n_features=n_features)
+        self.word_counts = Counter()
+
+    def transform(self, texts):
+        """Vectorize texts (no state involved)."""
+        return self.vectorizer.transform(texts)
+
+    def partial_fit(self, texts):
+        """Count word stems for the reverse mapping of hash buckets."""
+        for text in texts:
+            self.word_counts.update(text.split())
+        return self
+
+    def get_buckets(self, words):
+        """Hash bucket (feature column) of each word, as used by transform.
+
+        Args:
+            words: List of single words (stems)
+
+        Returns:
+            buckets: Integer array of length len(words)
+        """
+        X = self.vectorizer.transform(words).tocsr()
+        return X.indices[X.indptr[:-1]]
+
+    def get_feature_names(self):
+        """Most frequent word stem for each hash bucket ('' for empty buckets).
+
+        Returns:
+            feature_names: List of length n_features
+        """
+        feature_names = [''] * self.n_features
+        if not self.word_counts:
+            return feature_names
+        bucket_counts = np.zeros(self.n_features, dtype=np.int64)
+        # buckets as assigned by the vectorizer itself (one word per row)
+        words = list(self.word_counts.keys())
+        buckets = self.get_buckets(words)
+        for word, bucket in zip(words, buckets):
+            count = self.word_counts[word]
+            if count > bucket_counts[bucket]:
+                bucket_counts[bucket] = count
+                feature_names[bucket] = word
+        return feature_names
+
+
+def get_username_to_party():
+    """Mapping from Twitter user names to party ID's (current members only)."""
+    members_bundestag = helpers.get_data_twitter_members(do_fresh_download=False)
+    members_bundestag = pd.DataFrame(members_bundestag).T
+    members_bundestag = members_bundestag.loc[~members_bundestag.screen_name.isna(), :]
+
+    username2party = {k: party2id[v] for (k, v) in zip(members_bundestag.screen_name, members_bundestag.party)
+                      if v in party2id}
+    return username2party
+
+
+def iter_tweet_chunks(db_file, chunk_size=10000, username2party=None):
+    """Reads pre-processed tweets in chunks from a local database file.
+
+    Args:
+        db_file: Path to the SQL database file (pre-processed with preprocess_local.py)
+        chunk_size: Number of tweets per chunk
+        username2party: Mapping from user names to party ID's
+
+    Yields:
+        chunk: DataFrame with columns (id, text_stemmed, party_id)
+    """
+    if username2party is None:
+        username2party = get_username_to_party()
+
+    conn = sqlite3.connect(db_file)
+    try:
+        query = "SELECT id, username, text_stemmed FROM tweets WHERE text_stemmed IS NOT NULL ORDER BY id"
+        for chunk in pd.read_sql(query, conn, chunksize=chunk_size):
+            chunk['party_id'] = chunk.username.map(username2party)
+            chunk = chunk.loc[~chunk.party_id.isna(), ['id', 'text_stemmed', 'party_id']]
+            chunk['party_id'] = chunk['party_id'].astype(int)
+            yield chunk
+    finally:
+        conn.close()
+
+
+def is_test_tweet(ids, test_fraction=0.05):
+    """Deterministic train/test assignment from the tweet ID (independent of chunking).
+
+    Returns:
+        mask: Boolean array, True for held-out tweets
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    # mix the bits of the ID (multiplicative hashing) before bucketing
+    buckets = (ids * 2654435761) % 2**32 % 10000
+    return buckets < int(test_fraction * 10000)
+
+
+def perform_streaming_party_regression_analysis(get_chunks, n_features=2**20, n_epochs=3, alpha=1e-5,
+                                                test_fraction=0.05, random_state=0, verbose=0):
+    """Out-of-core version of nlp.perform_party_regression_analysis.
+    Trains a logistic regression with stochastic gradient descent on hashing
+    features, one chunk at a time.
+
+    Args:
+        get_chunks: Callable returning a new iterator over DataFrame chunks with the columns
+            (id, text_stemmed, party_id), e.g. lambda: iter_tweet_chunks(db_file)
+        n_features: Number of hash buckets
+        n_epochs: Number of passes over the data
+        alpha: Regularization strength
+        test_fraction: Fraction of tweets held out for testing
+        random_state: Seed for shuffling within chunks
+
+    Returns:
+        model: Fitted model
+        feature_map: Fitted HashingFeatureMap (use in place of a vectorizer)
+        train_acc: Train accuracy
+        test_acc: Test accuracy
+    """
+    from sklearn.linear_model import SGDClassifier
+
+    feature_map = HashingFeatureMap(n_features=n_features)
+    model = SGDClassifier(loss="log", alpha=alpha, average=True, random_state=random_state)
+    classes = np.arange(len(party2id))
+    rng = np.random.RandomState(random_state)
+
+    # train
+    for epoch in range(n_epochs):
+        n_samples = 0
+        for chunk in get_chunks():
+            chunk = chunk.loc[~is_test_tweet(chunk['id'], test_fraction)]
+            if len(chunk) == 0:
+                continue
+            chunk = chunk.iloc[rng.permutation(len(chunk))]
+
+            x = feature_map.transform(chunk['text_stemmed'])
+            model.partial_fit(x, chunk['party_id'].values, classes=classes)
+            if epoch == 0:
+                feature_map.partial_fit(chunk['text_stemmed'])
+            n_samples += len(chunk)
+        if verbose:
+            print(f"Epoch {epoch + 1}/{n_epochs}: trained on {n_samples} samples.")
+
+    # evaluate (one more pass, only counts are kept in memory)
+    correct = {'train': 0, 'test': 0}
+    total = {'train': 0, 'test': 0}
+    for chunk in get_chunks():
+        test_mask = is_test_tweet(chunk['id'], test_fraction)
+        y_pred = model.predict(feature_map.transform(chunk['text_stemmed']))
+        hits = (y_pred == chunk['party_id'].values)
+        correct['test'] += hits[test_mask].sum()
+        total['test'] += test_mask.sum()
+        correct['train'] += hits[~test_mask].sum()
+        total['train'] += (~test_mask).sum()
+
+    train_acc = correct['train'] / max(total['train'], 1)
+    test_acc = correct['test'] / max(total['test'], 1)
+
+    if verbose:
+        print(f'Train acccuracy: {train_acc}')
+        print(f'Test acccuracy: {test_acc}')
+
+    return model, feature_map, train_acc, test_acc
@@ -0,0 +1,293 @@
+"""Precomputed token-by-day counts (topics page):
+Sparse matrix with one row per lowercase token and one column per day
+(optionally per day and party), counting the tweets which contain the token.
+A keyword timeline is then a gather of a few rows plus a column sum,
+independent of the number of tweets.
+
+The cube is stored as a compressed sparse matrix and updated per ingest batch
+(see preprocess_local.py). Tweets which are already counted (same tweet ID) are skipped.
+Each update writes a new version of the cube (matrix, tokens and counted ID's) into its
+own directory and then switches the metadata file to it, so that readers never see
+files of different versions.
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from bundestweets.keyword_index import vectorize_tweets
+from bundestweets.nlp import party2id
+
+CUBE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'data', 'token_cube')
+
+# column group for tweets whose party is not in nlp.party2id
+OTHER_PARTY = len(party2id)
+
+
+def get_party_groups(parties):
+    """Column group (party ID) for each tweet."""
+    return pd.Series(parties).map(party2id).fillna(OTHER_PARTY).astype(int).values
+
+
+def cube_exists(cube_dir=CUBE_DIR):
+    """Whether a cube has been written to cube_dir (without loading it)."""
+    return os.path.isfile(os.path.join(cube_dir, 'meta.json'))
+
+
+def read_meta(cube_dir=CUBE_DIR):
+    """Load the metadata of the cube (None if there is no cube)."""
+    if not cube_exists(cube_dir):
+        return None
+    with open(os.path.join(cube_dir, 'meta.json'), 'r') as fp:
+        return json.load(fp)
+
+
+def load_cube(cube_dir=CUBE_DIR):
+    """Load the cube from disk.
+
+    Returns:
+        cube: Dictionary with the CSR "matrix" (tokens x (days * groups)), the list of "tokens",
+            the "first_day", the number of column "groups" per day and the counted tweet "ids",
+            or None if there is no cube
+    """
+    from scipy import sparse as sp
+
+    meta = read_meta(cube_dir)
+    if meta is None:
+        return None
+    # (cubes written before versioning keep their files in cube_dir itself)
+    version_dir = os.path.join(cube_dir, meta.get('version', ''))
+    with open(os.path.join(version_dir, 'tokens.json'), 'r') as fp:
+        tokens = json.load(fp)
+
+    cube = {
+        'matrix': sp.load_npz(os.path.join(version_dir, 'cube.npz')).tocsr(),
+        'tokens': tokens,
+        'first_day': np.datetime64(meta['first_day'], 'D'),
+        'groups': meta['groups'],
+        'ids': np.load(os.path.join(version_dir, 'ids.npy')),
+        'next_version': meta.get('next_version', 0),
+    }
+    return cube
+
+
+def save_cube(cube, cube_dir=CUBE_DIR):
+    """Save the cube to disk as a new version. The files are written into a new directory,
+    then the metadata file is atomically replaced and the previous version is removed.
+    """
+    from scipy import sparse as sp
+
+    old_meta = read_meta(cube_dir)
+    next_version = cube.get('next_version', 0)
+    version = f'cube_{next_version:05d}'
+    version_dir = os.path.join(cube_dir, version)
+    shutil.rmtree(version_dir, ignore_errors=True)  # (left over by an interrupted update)
+    os.makedirs(version_dir)
+
+    sp.save_npz(os.path.join(version_dir, 'cube.npz'), cube['matrix'], compressed=True)
+    np.save(os.path.join(version_dir, 'ids.npy'), cube['ids'])
+    with open(os.path.join(version_dir, 'tokens.json'), 'w') as fp:
+        json.dump(cube['tokens'], fp)
+
+    n_days = cube['matrix'].shape[1] // cube['groups']
+    meta = {
+        'version': version,
+        'next_version': next_version + 1,
+        'first_day': str(cube['first_day']),
+        'last_day': str(cube['first_day'] + n_days - 1),
+        'groups': cube['groups'],
+        'n_days': n_days,
+        'n_tweets': len(cube['ids']),
+    }
+    file_path = os.path.join(cube_dir, 'meta.json')
+    with open(file_path + '.tmp', 'w') as fp:
+        json.dump(meta, fp)
+    os.replace(file_path + '.tmp', file_path)
+    cube['next_version'] = next_version + 1
+
+    if old_meta is None:
+        return
+    if 'version' not in old_meta:
+        for name in ['cube.npz', 'ids.npy', 'tokens.json']:
+            if os.path.isfile(os.path.join(cube_dir, name)):
+                os.remove(os.path.join(cube_dir, name))
+    elif old_meta['version'] != version:
+        shutil.rmtree(os.path.join(cube_dir, old_meta['version']), ignore_errors=True)
+
+
+def count_batch(data, by_party=True):
+    """Token-by-day counts of a batch of tweets.
+
+    Args:
+        data: Tweet dataset (columns "date", "text" and "party")
+        by_party: Whether to split the counts per party
+
+    Returns:
+        matrix: CSR matrix (tokens x (days * groups)), days starting at first_day
+        tokens: List of tokens (one per row)
+        first_day: First day of the batch (numpy datetime64[D])
+    """
+    from scipy import sparse as sp
+
+    x, tokens = vectorize_tweets(data['text'])
+
+    days = pd.DatetimeIndex(data['date']).values.astype('datetime64[D]')
+    first_day = days.min()
+    groups = len(party2id) + 1 if by_party else 1
+    cols = (days - first_day).astype(np.int64) * groups
+    if by_party:
+        cols += get_party_groups(data['party'])
+    n_cols = ((days.max() - first_day).astype(np.int64) + 1) * groups
+
+    # one-hot assignment of tweets to (day, party) columns
+    assignment = sp.csr_matrix((np.ones(len(cols), dtype=np.int32), (np.arange(len(cols)), cols)),
+                               shape=(len(cols), n_cols))
+    matrix = (x.T.tocsr().astype(np.int32) @ assignment).tocsr()
+    return matrix, tokens, first_day
+
+
+def align_cube(matrix, first_day, new_first_day, n_days, groups):
+    """Shifts the columns of a cube matrix to a new first day and pads it to n_days."""
+    from scipy import sparse as sp
+
+    shift = (first_day - new_first_day).astype(np.int64) * groups
+    matrix = matrix.tocoo()
+    return sp.csr_matrix((matrix.data, (matrix.row, matrix.col + shift)),
+                         shape=(matrix.shape[0], n_days * groups))
+
+
+def update_token_cube(data, cube_dir=CUBE_DIR, by_party=True, verbose=0):
+    """Adds a batch of tweets to the cube (creates the cube if it does not exist).
+
+    Args:
+        data: Tweet dataset (columns "id", "date", "text" and "party")
+        cube_dir: Cube directory
+        by_party: Whether to split the counts per party (only used when creating the cube)
+        verbose: Whether to print progress or not
+
+    Returns:
+        n_added: Number of newly counted tweets
+    """
+    from scipy import sparse as sp
+
+    data = data.loc[~data.text.isna(), :]
+    cube = load_cube(cube_dir)
+    if cube is not None:
+        data = data.loc[~np.isin(data['id'].values.astype(np.int64), cube['ids']), :]
+        by_party = cube['groups'] > 1
+
+    if len(data) == 0:
+        if verbose:
+            print('Token cube is up to date.')
+        return 0
+
+    matrix, tokens, first_day = count_batch(data, by_party=by_party)
+    groups = len(party2id) + 1 if by_party else 1
+    if cube is None:
+        cube = {'matrix': sp.csr_matrix((0, 0), dtype=np.int32), 'tokens': [], 'first_day': first_day,
+                'groups': groups, 'ids': np.zeros(0, dtype=np.int64)}
+
+    # extend vocabulary, new tokens are appended as new rows
+    vocabulary = {token: row for (row, token) in enumerate(cube['tokens'])}
+    for token in tokens:
+        if token not in vocabulary:
+            vocabulary[token] = len(cube['tokens'])
+            cube['tokens'].append(token)
+    rows = np.array([vocabulary[token] for token in tokens], dtype=np.int64)
+
+    # common day axis of cube and batch
+    new_first_day = min(cube['first_day'], first_day)
+    last_day = max(cube['first_day'] + cube['matrix'].shape[1] // groups - 1,
+                   first_day + matrix.shape[1] // groups - 1)
+    n_days = (last_day - new_first_day).astype(np.int64) + 1
+
+    old = align_cube(cube['matrix'], cube['first_day'], new_first_day, n_days, groups)
+    old.resize((len(cube['tokens']), n_days * groups))
+    batch = align_cube(matrix, first_day, new_first_day, n_days, groups).tocoo()
+    batch = sp.csr_matrix((batch.data, (rows[batch.row], batch.col)), shape=old.shape)
+
+    cube['matrix'] = (old + batch).tocsr()
+    cube['first_day'] = new_first_day
+    cube['ids'] = np.concatenate([cube['ids'], data['id'].values.astype(np.int64)])
+    save_cube(cube, cube_dir)
+
+    if verbose:
+        print(f'Added {len(data)} tweets to the token cube ({len(cube["tokens"])} tokens, {n_days} days).')
+    return len(data)
+
+
+class TokenCube:
+    """Keyword timelines from the token-by-day counts."""
+
+    def __init__(self, cube_dir=CUBE_DIR):
+        """
+        Args:
+            cube_dir: Cube directory (see update_token_cube)
+        """
+        cube = load_cube(cube_dir)
+        if cube is None:
+            raise FileNotFoundError(f'No token cube in {cube_dir}')
+        self.matrix = cube['matrix']
+        self.groups = cube['groups']
+        self.n_days = self.matrix.shape[1] // self.groups
+        self.days = pd.date_range(pd.Timestamp(cube['first_day']), periods=self.n_days, freq='D')
+        self.vocabulary = {token: row for (row, token) in enumerate(cube['tokens'])}
+
+    def get_daily_counts(self, keywords, party=None):
+        """Daily hit counts for a set of keywords (case-insensitive). A tweet containing
+        two of the keywords counts twice (like nlp.intersect_topics).
+
+        Args:
+            keywords: Iterable of keywords
+            party: Only count tweets of this party (requires a cube split by party)
+
+        Returns:
+            counts: numpy.array (days x groups), or (days,) if party is given or the cube is not split
+        """
+        rows = [self.vocabulary[k] for k in {k.lower() for k in keywords} if k in self.vocabulary]
+        counts = np.asarray(self.matrix[rows].sum(axis=0)).ravel().reshape(self.n_days, self.groups)
+        if party is not None:
+            if self.groups == 1:
+                raise ValueError('Token cube is not split by party.')
+            return counts[:, party2id[party]]
+        if self.groups == 1:
+            return counts[:, 0]
+        return counts
+
+    def get_timeline(self, keywords, freq='M', party=None):
+        """Hit counts for a set of keywords at daily ('D'), weekly ('W') or monthly ('M') resolution.
+
+        Args:
+            keywords: Iterable of keywords
+            freq: Resampling frequency
+            party: Only count tweets of this party
+
+        Returns:
+            timeline: pandas.Series indexed by the end of each period
+        """
+        counts = self.get_daily_counts(keywords, party=party)
+        if counts.ndim == 2:
+            counts = counts.sum(axis=1)
+        timeline = pd.Series(counts, index=self.days).resample(freq).sum()
+        return timeline
+
+    def get_topic_counts(self, topics, freq='M', party=None):
+        """Same output as nlp.get_monthly_topic_counts, at any resolution.
+
+        Args:
+            topics: Dictionary mapping topic ID's (0, 1, ...) to key words
+            freq: Resampling frequency ('D', 'W' or 'M')
+            party: Only count tweets of this party
+
+        Returns:
+            counts: DataFrame indexed by the end of each period, one column per topic
+        """
+        daily = np.zeros((self.n_days, len(topics)), dtype=np.int64)
+        for ind in range(len(topics)):
+            counts = self.get_daily_counts(topics[ind], party=party)
+            daily[:, ind] = counts.sum(axis=1) if counts.ndim == 2 else counts
+        counts = pd.DataFrame(daily, index=self.days, columns=range(len(topics))).resample(freq).sum()
+        return counts
@@ -12,13 +12,18 @@ import altair as alt
 import numpy as np
 import datetime as datetime
 import json
+import os
 
 import time
 import sqlite3
 import bundestweets.helpers as helpers
 import bundestweets.stats_helpers as stats_helpers
 import bundestweets.row_operators as row_operators
-from bundestweets.nlp import intersect_topics
+import bundestweets.keyword_index as keyword_index
+import bundestweets.token_cube as token_cube
+from bundestweets.nlp import build_topic_engine
+from bundestweets.nlp import get_monthly_topic_counts
+from bundestweets.nlp import build_tfidf_feature_store
 
 import holoviews as hv
 from holoviews import opts as hv_opts
@@ -248,6 +253,20 @@ def create_word_cloud(party_word_importance, party):
     return wordcloud
 
 
+@st.cache(allow_output_mutation=True, show_spinner=False)
+def get_tfidf_feature_store(data):
+    """Vectorizes the whole corpus once for the party classification (content page).
+    
+    Args:
+        data: Pre-processed tweet dataset
+        
+    Returns:
+        feature_store: TF-IDF feature store sorted by date
+    """
+    feature_store = build_tfidf_feature_store(data)
+    return feature_store
+
+
 @st.cache(show_spinner=False)
 def get_tweets_as_wordsets(data):
     """Transforms tweets messages to set of words (for topic page).
@@ -262,24 +281,117 @@ def get_tweets_as_wordsets(data):
     return wordsets
 
 
-@st.cache(show_spinner=False)
-def get_topic_timeline_df(topics, wordsets, data):
+@st.cache(show_spinner=False, allow_output_mutation=True)
+def get_topic_engine(data):
+    """Vectorizes the tweet messages once for the topics page (see nlp.build_topic_engine).
+    
+    Args:
+        data: Tweet database
+        
+    Returns:
+        topic_engine: Binary document-term matrix and monthly token counts
+    """
+    topic_engine = build_topic_engine(data)
+    return topic_engine
+
+
+def get_file_mtime(file_path):
+    """Modification time of a file (None if it does not exist)."""
+    return os.path.getmtime(file_path) if os.path.isfile(file_path) else None
+
+
+@st.cache(show_spinner=False, allow_output_mutation=True)
+def get_keyword_index(index_dir=keyword_index.INDEX_DIR, mtime=None):
+    """Memory-maps the keyword index written during pre-processing (see preprocess_local.py).
+    
+    Args:
+        index_dir: Index directory
+        mtime: Modification time of the manifest (only part of the cache key, so that updates are loaded)
+        
+    Returns:
+        index: keyword_index.KeywordIndex or None if there is no index
+    """
+    if keyword_index.read_manifest(index_dir) is None:
+        return None
+    return keyword_index.KeywordIndex(index_dir)
+
+
+@st.cache(show_spinner=False, allow_output_mutation=True)
+def get_token_cube(cube_dir=token_cube.CUBE_DIR, mtime=None):
+    """Loads the token-by-day counts written during pre-processing (see preprocess_local.py).
+    
+    Args:
+        cube_dir: Cube directory
+        mtime: Modification time of the metadata file (only part of the cache key, so that updates are loaded)
+        
+    Returns:
+        cube: token_cube.TokenCube or None if there is no cube
+    """
+    if not token_cube.cube_exists(cube_dir):
+        return None
+    return token_cube.TokenCube(cube_dir)
+
+
+def get_topic_backends(data, local, cube_dir=token_cube.CUBE_DIR, index_dir=keyword_index.INDEX_DIR):
+    """Chooses how the topics page counts keywords: the token cube or the keyword index
+    if they were built from exactly the loaded tweets (local database, same number of
+    tweets, same last day or month), otherwise the topic engine on the loaded tweets.
+    
+    Args:
+        data: Tweets with text (content_tweets of get_data)
+        local: Whether the tweets were loaded from the local database
+        cube_dir: Directory of the token cube
+        index_dir: Directory of the keyword index
+        
+    Returns:
+        topic_engine: Output of get_topic_engine (or None)
+        index: Output of get_keyword_index (or None)
+        cube: Output of get_token_cube (or None)
+    """
+    last_day = pd.Timestamp(data['date'].max()).normalize()
+    
+    if local:
+        meta = token_cube.read_meta(cube_dir)
+        if (meta is not None) and (meta.get('n_tweets') == len(data)) and \
+                (pd.Timestamp(meta['last_day']) == last_day):
+            mtime = get_file_mtime(os.path.join(cube_dir, 'meta.json'))
+            return None, None, get_token_cube(cube_dir, mtime=mtime)
+        
+        manifest = keyword_index.read_manifest(index_dir)
+        if (manifest is not None) and (manifest['n_rows'] == len(data)) and \
+                (manifest['last_month'] == str(last_day.to_datetime64().astype('datetime64[M]'))):
+            mtime = get_file_mtime(os.path.join(index_dir, keyword_index.MANIFEST))
+            return None, get_keyword_index(index_dir, mtime=mtime), None
+    
+    return get_topic_engine(data), None, None
+
+
+def get_topic_timeline_df(topics, topic_engine=None, index=None, cube=None, freq='M'):
     """Prepares data for the timeline plot (Topics vs. time).
+    Not cached, the intersections are a single sparse matrix product on the
+    precomputed topic engine (hashing the engine would take longer), or a
+    lookup in the keyword index or token cube.
     
     Args:
         topics: Dictionary mapping topic ID's to key words
-        wordsets: pandas.Series of tweet messages formatted as sets of words
-        data: Tweet Dataset
+        topic_engine: Output of get_topic_engine
+        index: Output of get_keyword_index (used instead of the topic engine if given)
+        cube: Output of get_token_cube (used instead of index and topic engine if given)
+        freq: Time resolution, 'M' (monthly), or 'W' (weekly) and 'D' (daily) if a cube is given
         
     Returns:
         plot_df: Dataframe formatted for plotting
     """
     
-    # intersect topics with all twitter messages
-    intersections = intersect_topics(topics, wordsets)
-    my_topics = pd.DataFrame(intersections, index=data.date)
+    # intersect topics with all twitter messages (summed per month)
+    if cube is not None:
+        my_topics = cube.get_topic_counts(topics, freq=freq)
+    elif index is not None:
+        my_topics = index.get_monthly_topic_counts(topics)
+    else:
+        my_topics = get_monthly_topic_counts(topic_engine, topics)
 
-    # get new time axis (monthly resolution)
+    # get new time axis
     start_datetime = datetime.datetime.strptime('2018/01/01', '%Y/%M/%d')
     end_datetime = datetime.datetime.today()
 
@@ -293,10 +405,10 @@ def get_topic_timeline_df(topics, wordsets, data):
         month=end_datetime.month,
         day=end_datetime.day,
     )
-    new_index = pd.date_range(start_datetime, end_datetime, freq='M')
+    new_index = pd.date_range(start_datetime, end_datetime, freq=freq)
     
     # resample topic data with new time index and re-format to long format
-    plot_df = my_topics.resample('m').sum().reindex(new_index, fill_value=0).melt(value_vars=range(len(topics)), ignore_index=False)
+    plot_df = my_topics.reindex(new_index, fill_value=0).melt(value_vars=range(len(topics)), ignore_index=False)
     plot_df = plot_df.reset_index()
     plot_df.columns = ['Date', 'Keywords', 'Tweets']
     plot_df['Keywords'] = plot_df['Keywords'].apply(lambda k: " ".join(topics[k]))
@@ -358,12 +470,13 @@ def get_offensive_tweets(data, thr=0.9):
     
     Args:
         data: Tweet dataset
+        thr: Minimum probability of offensive tweets
         
     Returns 
         offensive_tweets: Offensive tweets dataset
     """
     
-    offensive_mask = (data.offensive_proba > 0.9)
+    offensive_mask = (data.offensive_proba > thr)
     offensive_tweets = data.loc[offensive_mask]
     return offensive_tweets
 
@@ -429,7 +542,7 @@ def get_member_tweets_per_month(member_tweets):
         plot_df: Member stats aggregated by month
     """
     
-    # get new time axis (monthly resolution)
+    # get new time axis
     start_datetime = datetime.datetime.strptime('2018/01/01', '%Y/%M/%d')
     end_datetime = datetime.datetime.today()
 
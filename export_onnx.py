@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+
+"""Export the BERT model for offensive language identification to ONNX:
+Writes the saved model as an ONNX graph with dynamic batch and sequence axes,
+together with the configs and vocabulary needed for inference. The exported
+directory can be used like the original one and is run with ONNX Runtime, e.g.
+python run_bert.py tweets_data.db --model_dir ./bert_model_onnx/
+"""
+
+import argparse
+
+import numpy as np
+
+import bundestweets.bert as bert
+import bundestweets.bert_benchmark as bert_benchmark
+from farm.infer import Inferencer
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model_dir", default=bert.BERT_MODEL_DIR, help="Directory of the pre-trained model")
+parser.add_argument("--output_dir", default="./bert_model_onnx/", help="Directory for the exported model")
+parser.add_argument("--opset", type=int, default=11, help="ONNX opset version")
+parser.add_argument("--n_check", type=int, default=200,
+                    help="Number of synthetic tweets to compare both models on (0 to skip, requires onnxruntime)")
+args = parser.parse_args()
+
+
+def main():
+
+    # export model
+    inferencer = Inferencer.load(args.model_dir, backend="torch")
+    inferencer.model.export_onnx(args.output_dir, opset_version=args.opset)
+    inferencer.processor.save(args.output_dir)
+    print(f'Model exported to {args.output_dir}.')
+
+    # compare predictions
+    if args.n_check > 0:
+        texts = bert_benchmark.make_synthetic_tweets(n_tweets=args.n_check)
+        dicts = [{'text': t} for t in texts]
+        proba = bert.get_probabilities(inferencer.run_inference(dicts=dicts))
+        onnx_inferencer = Inferencer.load(args.output_dir, backend="onnx")
+        onnx_proba = bert.get_probabilities(onnx_inferencer.run_inference(dicts=dicts))
+        print(f'Max. probability deviation on {len(texts)} tweets: {np.abs(onnx_proba - proba).max():.2e}')
+
+
+if __name__ == '__main__':
+    main()
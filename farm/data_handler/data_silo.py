@@ -1,6 +1,9 @@
+import hashlib
+import json
 import logging
 
 import os
+import random
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.utils.class_weight import compute_class_weight
@@ -9,11 +12,18 @@ from torch.utils.data import random_split
 from torch.utils.data.distributed import DistributedSampler
 from torch.utils.data.sampler import RandomSampler, SequentialSampler
 from farm.data_handler.dataloader import NamedDataLoader
+from farm.data_handler.dataset import load_dataset, save_dataset
 from farm.utils import MLFlowLogger as MlLogger
 from farm.data_handler.processor import Processor
 
 logger = logging.getLogger(__name__)
 
+# modules whose code determines the features (part of the dataset cache key)
+FEATURIZATION_MODULES = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ["processor.py", "input_features.py", "samples.py", "utils.py", "dataset.py"]
+] + [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "modeling", "tokenization.py")]
+
 
 class DataSilo(object):
     """ Generates and stores PyTorch DataLoader objects for the train, dev and test datasets.
@@ -21,7 +31,7 @@ class DataSilo(object):
     calculate and display some statistics.
      """
 
-    def __init__(self, processor, batch_size, distributed=False):
+    def __init__(self, processor, batch_size, distributed=False, cache_dir=None, seed=None):
         """
         :param processor: A dataset specific Processor object which will turn input (file or dict) into a Pytorch Dataset.
         :type processor: Processor
@@ -29,6 +39,12 @@ class DataSilo(object):
         :type batch_size: int
         :param distributed: Set to True if the program is running in a distributed setting.
         :type distributed: bool
+        :param cache_dir: Directory for featurized datasets. Datasets are cached per input file, processor
+                          config and featurization code, and memory-mapped in later runs (None: no cache).
+        :type cache_dir: str
+        :param seed: Seed for the featurization of processors with random features (e.g. masking). Their
+                     datasets are only cached if a seed is given.
+        :type seed: int
 
         """
         self.distributed = distributed
@@ -36,13 +52,15 @@ class DataSilo(object):
         self.data = {}
         self.batch_size = batch_size
         self.class_weights = None
+        self.cache_dir = cache_dir
+        self.seed = seed
         self._load_data()
 
     def _load_data(self):
         # train data
         train_file = os.path.join(self.processor.data_dir, self.processor.train_filename)
         logger.info("Loading train set from: {}".format(train_file))
-        self.data["train"], self.tensor_names = self.processor.dataset_from_file(train_file)
+        self.data["train"], self.tensor_names = self._dataset_from_file(train_file)
 
 
         # dev data
@@ -52,13 +70,13 @@ class DataSilo(object):
         else:
             dev_file = os.path.join(self.processor.data_dir, self.processor.dev_filename)
             logger.info("Loading dev set from: {}".format(dev_file))
-            self.data["dev"], _ = self.processor.dataset_from_file(dev_file)
+            self.data["dev"], _ = self._dataset_from_file(dev_file)
 
         # test data
         if self.processor.test_filename:
             test_file = os.path.join(self.processor.data_dir, self.processor.test_filename)
             logger.info("Loading test set from: {}".format(test_file))
-            self.data["test"], _ = self.processor.dataset_from_file(test_file)
+            self.data["test"], _ = self._dataset_from_file(test_file)
 
         # derive stats and meta data
         self._calculate_statistics()
@@ -66,6 +84,61 @@ class DataSilo(object):
         self._initialize_data_loaders()
         # fmt: on
 
+    def _dataset_from_file(self, file):
+        """ Featurizes a file with the processor, or loads the featurized dataset from the cache. """
+        if self.cache_dir is None:
+            return self.processor.dataset_from_file(file)
+        if self.processor.random_features and self.seed is None:
+            logger.info("Not caching the featurized dataset (random features, but no seed given)")
+            return self.processor.dataset_from_file(file)
+
+        cache_key = self._get_dataset_cache_key(file)
+        dataset_dir = os.path.join(self.cache_dir, cache_key)
+        if os.path.isdir(dataset_dir):
+            logger.info("Loading featurized dataset from cache: {}".format(dataset_dir))
+            return load_dataset(dataset_dir)
+
+        if self.processor.random_features:
+            # the cached dataset only depends on the key, not on what was featurized before
+            random.seed(self.seed)
+        dataset, tensor_names = self.processor.dataset_from_file(file)
+        save_dataset(dataset, tensor_names, dataset_dir)
+        logger.info("Saved featurized dataset to cache: {}".format(dataset_dir))
+        return dataset, tensor_names
+
+    def _get_dataset_cache_key(self, file):
+        """
+        Hash over the contents of the input file, the processor config (processor class, tokenizer vocabulary,
+        max_seq_len, label list and other settings) and the code of the featurization. For processors with
+        random features (e.g. masking), the seed and the number of processes (which determines the random
+        numbers of each sample) are included as well.
+        """
+        h = hashlib.sha256()
+        for path in [file] + FEATURIZATION_MODULES:
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(2 ** 20), b""):
+                    h.update(block)
+
+        processor = self.processor
+        tokenizer = processor.tokenizer
+        excluded = ["baskets", "data_dir", "train_filename", "dev_filename", "test_filename", "dev_split",
+                    "metrics", "num_processes"]
+        config = {
+            k: v for k, v in vars(processor).items()
+            if k not in excluded and isinstance(v, (str, int, float, bool, list, tuple, type(None)))
+        }
+        config["processor"] = processor.__class__.__name__
+        config["tokenizer"] = tokenizer.__class__.__name__
+        if hasattr(tokenizer, "get_vocab_fingerprint"):
+            config["vocab"] = tokenizer.get_vocab_fingerprint()
+        else:
+            config["vocab"] = hashlib.sha256("\n".join(tokenizer.vocab).encode("utf-8")).hexdigest()
+        if processor.random_features:
+            config["seed"] = self.seed
+            config["num_processes"] = processor.num_processes
+        h.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+        return h.hexdigest()
+
     def _initialize_data_loaders(self):
         if self.distributed:
             sampler_train = DistributedSampler(self.data["train"])
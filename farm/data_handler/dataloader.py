@@ -1,4 +1,4 @@
-from torch.utils.data import DataLoader, Dataset, Sampler
+from torch.utils.data import DataLoader, Dataset, Sampler, BatchSampler, TensorDataset
 import torch
 
 
@@ -6,6 +6,9 @@ class NamedDataLoader(DataLoader):
     """
     A modified version of the PyTorch DataLoader that returns a dictionary where the key is
     the name of the tensor and the value is the tensor itself.
+
+    For a TensorDataset, each batch is fetched by indexing every tensor once with the indices of the
+    whole batch (a slice for consecutive indices) instead of collecting and stacking single samples.
     """
 
     def __init__(self, dataset, sampler, batch_size, tensor_names):
@@ -20,10 +23,36 @@ class NamedDataLoader(DataLoader):
         :type tensor_names: list
         """
 
+        def batch_to_dict(batch):
+            """
+            Formats a batch fetched from a TensorDataset (one tensor per name) as a dictionary,
+            with integer tensors as int64.
+            """
+            ret = dict(zip(tensor_names, batch))
+            for key in ret:
+                if not ret[key].is_floating_point():
+                    ret[key] = ret[key].long()
+            return ret
+
+        if isinstance(dataset, TensorDataset):
+            assert len(dataset.tensors) == len(
+                tensor_names
+            ), "Dataset contains {} tensors while there are {} tensor names supplied: {}".format(
+                len(dataset.tensors), len(tensor_names), tensor_names
+            )
+            super(NamedDataLoader, self).__init__(
+                dataset=dataset,
+                sampler=TensorBatchSampler(sampler, batch_size),
+                batch_size=None,
+                collate_fn=batch_to_dict,
+            )
+            return
+
         def collate_fn(batch):
             """
             A custom collate function that formats the batch as a dictionary where the key is
-            the name of the tensor and the value is the tensor itself
+            the name of the tensor and the value is the tensor itself. Integer tensors (stored in
+            smaller dtypes by the dataset) are returned as int64, as expected by the model.
             """
             assert len(batch[0]) == len(
                 tensor_names
@@ -39,6 +68,8 @@ class NamedDataLoader(DataLoader):
 
             for key in ret:
                 ret[key] = torch.stack(ret[key])
+                if not ret[key].is_floating_point():
+                    ret[key] = ret[key].long()
 
             return ret
 
@@ -50,6 +81,33 @@ class NamedDataLoader(DataLoader):
         )
 
 
+class TensorBatchSampler(Sampler):
+    """
+    Groups the indices of a sampler into batches which index all tensors of a TensorDataset at once.
+    Batches of consecutive indices (e.g. from a SequentialSampler) are returned as slices, i.e. as views
+    of the stored tensors, all others as index tensors.
+    """
+
+    def __init__(self, sampler, batch_size):
+        """
+        :param sampler: Sampler (or any iterable) of sample indices
+        :param batch_size: Number of samples per batch (the last batch may be smaller)
+        :type batch_size: int
+        """
+        self.batch_sampler = BatchSampler(sampler, batch_size, drop_last=False)
+
+    def __iter__(self):
+        for batch in self.batch_sampler:
+            start = batch[0]
+            if batch[-1] == start + len(batch) - 1 and batch == list(range(start, start + len(batch))):
+                yield slice(start, start + len(batch))
+            else:
+                yield torch.as_tensor(batch, dtype=torch.long)
+
+    def __len__(self):
+        return len(self.batch_sampler)
+
+
 def covert_dataset_to_dataloader(dataset, sampler, batch_size):
     """
     Wraps a PyTorch Dataset with a DataLoader.
@@ -1,23 +1,102 @@
+import json
+import os
+import shutil
+import tempfile
+import warnings
+
+import numpy as np
 import torch
 from torch.utils.data import TensorDataset
 
+DATASET_META_FILE = "dataset.json"
+
 
-# TODO we need the option to handle different dtypes
 def convert_features_to_dataset(features):
     """
     Converts a list of feature dictionaries (one for each sample) into a PyTorch Dataset.
+    Each feature is stored in one NumPy array of the smallest dtype that holds its values (int16 or int32
+    for ids and masks, float32 for float values) which the tensors share without a copy. The data loader
+    (see :class:`farm.data_handler.dataloader.NamedDataLoader`) casts integer features to int64 per batch.
 
     :param features: A list of dictionaries. Each dictionary corresponds to one sample. Its keys are the
                      names of the type of feature and the keys are the features themselves.
     :Return: a Pytorch dataset and a list of tensor names.
     """
-    tensor_names = features[0].keys()
+    tensor_names = list(features[0].keys())
     all_tensors = []
     for t_name in tensor_names:
-        cur_tensor = torch.tensor(
-            [sample[t_name] for sample in features], dtype=torch.long
-        )
-        all_tensors.append(cur_tensor)
+        array = _values_to_array([sample[t_name] for sample in features])
+        all_tensors.append(torch.from_numpy(array))
 
     dataset = TensorDataset(*all_tensors)
     return dataset, tensor_names
+
+
+def _values_to_array(values):
+    """
+    Fills the values of one feature (numbers or equally long lists of numbers) into an array, int32 for
+    integers (int64 if they do not fit) and float32 for floats. Integer arrays are narrowed to int16 where
+    all values fit.
+    """
+    first = values[0]
+    while isinstance(first, (list, tuple)):
+        first = first[0]
+    if isinstance(first, float):
+        return np.array(values, dtype=np.float32)
+
+    with warnings.catch_warnings():
+        # (out-of-bound python integers only warn in older NumPy versions)
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            array = np.array(values, dtype=np.int32)
+        except (OverflowError, DeprecationWarning):
+            return np.array(values, dtype=np.int64)
+    if array.size == 0 or (array.min() >= np.iinfo(np.int16).min and array.max() <= np.iinfo(np.int16).max):
+        array = array.astype(np.int16)
+    return array
+
+
+def save_dataset(dataset, tensor_names, save_dir):
+    """
+    Saves the tensors of a dataset (as created by convert_features_to_dataset) as one .npy file per tensor,
+    which load_dataset memory-maps. The directory is written under a temporary name and renamed when complete.
+
+    :param dataset: TensorDataset
+    :param tensor_names: The names of the tensors
+    :type tensor_names: list
+    :param save_dir: Directory for the dataset (must not exist yet)
+    :type save_dir: str
+    """
+    parent_dir = os.path.dirname(os.path.abspath(save_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp_dataset_")
+    try:
+        for t_name, tensor in zip(tensor_names, dataset.tensors):
+            np.save(os.path.join(tmp_dir, t_name + ".npy"), tensor.numpy())
+        with open(os.path.join(tmp_dir, DATASET_META_FILE), "w") as f:
+            json.dump({"tensor_names": list(tensor_names), "n_samples": len(dataset)}, f)
+        os.rename(tmp_dir, save_dir)
+    except OSError:
+        # (e.g. written by a concurrent run in the meantime)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(save_dir):
+            raise
+
+
+def load_dataset(load_dir):
+    """
+    Loads a dataset saved by save_dataset. The arrays are memory-mapped (copy-on-write), so only the
+    samples which are accessed are read from disk.
+
+    :param load_dir: Directory of the dataset
+    :type load_dir: str
+    :return: a Pytorch dataset and a list of tensor names.
+    """
+    with open(os.path.join(load_dir, DATASET_META_FILE)) as f:
+        meta = json.load(f)
+    tensor_names = meta["tensor_names"]
+    all_tensors = [
+        torch.from_numpy(np.load(os.path.join(load_dir, t_name + ".npy"), mmap_mode="c"))
+        for t_name in tensor_names
+    ]
+    return TensorDataset(*all_tensors), tensor_names
@@ -2,6 +2,9 @@ import torch
 import os
 import abc
 from abc import ABC
+import copy
+import math
+import multiprocessing
 import random
 import logging
 import json
@@ -48,6 +51,12 @@ class Processor(ABC):
 
     subclasses = {}
 
+    # processors whose samples depend on other baskets create them in the main process
+    # (only the featurization runs in the worker processes)
+    init_samples_in_workers = True
+    # processors with random features (e.g. masked tokens) are cached per random state (see DataSilo)
+    random_features = False
+
     def __init__(
         self,
         tokenizer,
@@ -108,6 +117,7 @@ class Processor(ABC):
             self.label_maps.append(map)
 
         self.baskets = []
+        self.num_processes = 1
 
         self._log_params()
 
@@ -119,7 +129,7 @@ class Processor(ABC):
         cls.subclasses[cls.__name__] = cls
 
     @classmethod
-    def load(cls, processor_name, data_dir, tokenizer, max_seq_len):
+    def load(cls, processor_name, data_dir, tokenizer, max_seq_len, num_processes=1):
         """
         Loads the class of processor specified by processor name.
 
@@ -130,11 +140,15 @@ class Processor(ABC):
         :param tokenizer: A tokenizer object
         :param max_seq_len: Sequences longer than this will be truncated.
         :type max_seq_len: int
+        :param num_processes: Number of processes for tokenization and featurization (1: in this process).
+        :type num_processes: int
         :return: An instance of the specified processor.
         """
-        return cls.subclasses[processor_name](
+        processor = cls.subclasses[processor_name](
             data_dir=data_dir, tokenizer=tokenizer, max_seq_len=max_seq_len
         )
+        processor.num_processes = num_processes
+        return processor
 
     @classmethod
     def load_from_dir(cls, load_dir):
@@ -207,6 +221,40 @@ class Processor(ABC):
             for sample in basket.samples:
                 sample.features = self._sample_to_features(sample=sample)
 
+    def _init_and_featurize_samples(self):
+        """
+        Creates and featurizes the samples of all baskets, in chunks over worker processes
+        if num_processes is larger than 1.
+        """
+        if self.num_processes > 1 and len(self.baskets) > self.num_processes:
+            self._init_and_featurize_samples_in_processes()
+        else:
+            self._init_samples_in_baskets()
+            self._featurize_samples()
+
+    def _init_and_featurize_samples_in_processes(self):
+        if not self.init_samples_in_workers:
+            self._init_samples_in_baskets()
+
+        # a few chunks per process for load balancing, in order
+        chunk_size = math.ceil(len(self.baskets) / (self.num_processes * 4))
+        chunks = [self.baskets[i:i + chunk_size] for i in range(0, len(self.baskets), chunk_size)]
+        # (random masking etc. stays reproducible with the seed of this process)
+        seeds = [random.randrange(2 ** 32) for _ in chunks]
+
+        # each worker gets a copy of the processor (and its tokenizer) once
+        worker_processor = copy.copy(self)
+        worker_processor.baskets = []
+        with multiprocessing.Pool(
+            self.num_processes, initializer=_init_featurization_worker, initargs=(worker_processor,)
+        ) as pool:
+            results = pool.imap(
+                _featurize_chunk, [(chunk, seed, self.init_samples_in_workers) for chunk, seed in zip(chunks, seeds)]
+            )
+            for chunk, samples_per_basket in zip(chunks, results):
+                for basket, samples in zip(chunk, samples_per_basket):
+                    basket.samples = samples
+
     def _create_dataset(self):
         baskets = self.baskets
         features_flat = []
@@ -226,28 +274,30 @@ class Processor(ABC):
         :return: a Pytorch dataset and a list of tensor names.
         """
         self._init_baskets_from_file(file)
-        self._init_samples_in_baskets()
-        self._featurize_samples()
+        self._init_and_featurize_samples()
         self._log_samples(3)
         dataset, tensor_names = self._create_dataset()
         return dataset, tensor_names
 
-    def dataset_from_dicts(self, dicts):
+    def dataset_from_dicts(self, dicts, return_baskets=False):
         """
         Contains all the functionality to turn a list of dict objects into a PyTorch Dataset and a
         list of tensor names. This is used for inference mode.
 
         :param dicts: List of dictionaries where each contains the data of one input sample.
         :type dicts: list of dicts
-        :return: a Pytorch dataset and a list of tensor names.
+        :param return_baskets: Also return the baskets with the (tokenized) samples, e.g. to format predictions.
+        :type return_baskets: bool
+        :return: a Pytorch dataset and a list of tensor names (and the list of baskets if return_baskets is True).
         """
         self.baskets = [
             SampleBasket(raw=tr, id="infer - {}".format(i))
             for i, tr in enumerate(dicts)
         ]
-        self._init_samples_in_baskets()
-        self._featurize_samples()
+        self._init_and_featurize_samples()
         dataset, tensor_names = self._create_dataset()
+        if return_baskets:
+            return dataset, tensor_names, self.baskets
         return dataset, tensor_names
 
     def _log_samples(self, n_samples):
@@ -272,6 +322,28 @@ class Processor(ABC):
             logger.warning(f"ML logging didn't work: {e}")
 
 
+_worker_processor = None
+
+
+def _init_featurization_worker(processor):
+    global _worker_processor
+    _worker_processor = processor
+
+
+def _featurize_chunk(args):
+    """
+    Creates (if init_samples) and featurizes the samples of a chunk of baskets in a worker process.
+    Returns the samples of each basket.
+    """
+    baskets, seed, init_samples = args
+    random.seed(seed)
+    _worker_processor.baskets = baskets
+    if init_samples:
+        _worker_processor._init_samples_in_baskets()
+    _worker_processor._featurize_samples()
+    return [basket.samples for basket in _worker_processor.baskets]
+
+
 #########################################
 # Sequence Classification Processors ####
 #########################################
@@ -733,6 +805,9 @@ class BertStyleLMProcessor(Processor):
         dicts = read_docs_from_txt(filename=file, delimiter=self.delimiter)
         return dicts
 
+    init_samples_in_workers = False
+    random_features = True
+
     def _init_samples_in_baskets(self):
         """ Overriding the method of the parent class here, because in this case we cannot simply convert one dict to samples.
         We need to know about the other dicts as well since we want with prob 50% to use sentences of other docs!
@@ -820,15 +895,16 @@ class SquadProcessor(Processor):
         self.counts = {}
         self.stage = None
 
-    def dataset_from_dicts(self, dicts):
+    def dataset_from_dicts(self, dicts, return_baskets=False):
         dicts_converted = [self._convert_inference(x) for x in dicts]
         self.baskets = [
             SampleBasket(raw=tr, id="infer - {}".format(i))
             for i, tr in enumerate(dicts_converted)
         ]
-        self._init_samples_in_baskets()
-        self._featurize_samples()
+        self._init_and_featurize_samples()
         dataset, tensor_names = self._create_dataset()
+        if return_baskets:
+            return dataset, tensor_names, self.baskets
         return dataset, tensor_names
 
     def _convert_inference(self, infer_dict):
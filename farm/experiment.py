@@ -60,10 +60,15 @@ def run_experiment(args):
         tokenizer=tokenizer,
         max_seq_len=args.max_seq_len,
         data_dir=args.data_dir,
+        num_processes=args.get("num_processes", 1),
     )
 
     data_silo = DataSilo(
-        processor=processor, batch_size=args.batch_size, distributed=distributed
+        processor=processor,
+        batch_size=args.batch_size,
+        distributed=distributed,
+        cache_dir=args.get("dataset_cache_dir"),
+        seed=args.seed,
     )
 
     class_weights = None
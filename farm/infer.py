@@ -1,15 +1,29 @@
 import os
+import logging
+import queue
+import threading
+
+import numpy as np
 import torch
 
 from torch.utils.data.sampler import SequentialSampler
 
 from farm.data_handler.dataloader import NamedDataLoader
-from farm.modeling.adaptive_model import AdaptiveModel
+from farm.modeling.adaptive_model import (
+    AdaptiveModel,
+    ONNXAdaptiveModel,
+    TorchScriptAdaptiveModel,
+    ONNX_MODEL_FILE,
+    TORCHSCRIPT_MODEL_FILE,
+    EXPORT_INPUT_NAMES,
+)
 
 from farm.utils import initialize_device_settings
 from farm.data_handler.processor import Processor
 from farm.utils import set_all_seeds
 
+logger = logging.getLogger(__name__)
+
 
 class Inferencer:
     """ Loads a saved AdaptiveModel from disk and runs it in inference mode.
@@ -27,7 +41,7 @@ class Inferencer:
      model.extract_vectors(dicts=basic_texts)
     ```
     """
-    def __init__(self, model, processor, batch_size=4, gpu=False, name=None):
+    def __init__(self, model, processor, batch_size=4, gpu=False, name=None, bucket_by_length=False):
         """
         Initializes inferencer from an AdaptiveModel and a Processor instance.
         :param model: AdaptiveModel to run in inference mode
@@ -40,6 +54,10 @@ class Inferencer:
         :type gpu: bool
         :param name: Name for the current inferencer model, displayed in the REST API
         :type name: string
+        :param bucket_by_length: Run samples sorted by length and pad each batch only to its longest sample
+                                 (results are returned in input order). Only used for prediction heads
+                                 with one prediction per sequence (e.g. text classification).
+        :type bucket_by_length: bool
         :return: An instance of the Inferencer.
         """
         # Init device and distributed settings
@@ -47,12 +65,21 @@ class Inferencer:
             use_cuda=gpu, local_rank=-1, fp16=False
         )
 
+        if model.quantized and str(device) != "cpu":
+            logger.warning("Quantized models only run on CPU, running inference on CPU.")
+            device = torch.device("cpu")
+            model.to(device)
+
         self.processor = processor
         self.model = model
         self.model.eval()
         self.batch_size = batch_size
+        self.bucket_by_length = bucket_by_length
         self.device = device
-        self.language = self.model.language_model.language
+        if isinstance(self.model, AdaptiveModel):
+            self.language = self.model.language_model.language
+        else:
+            self.language = self.model.language
         # TODO adjust for multiple prediction heads
         if len(self.model.prediction_heads) == 1:
             self.prediction_type = self.model.prediction_heads[0].model_type
@@ -63,7 +90,8 @@ class Inferencer:
         set_all_seeds(42, n_gpu)
 
     @classmethod
-    def load(cls, load_dir, batch_size=4, gpu=False):
+    def load(cls, load_dir, batch_size=4, gpu=False, bucket_by_length=False, quantize=False, backend=None,
+             n_threads=None, warmup_shapes=None):
         """
         Initializes inferencer from directory with saved model.
         :param load_dir: Directory where the saved model is located.
@@ -72,6 +100,22 @@ class Inferencer:
         :type batch_size: int
         :param gpu: If GPU shall be used
         :type gpu: bool
+        :param bucket_by_length: Sort samples by length and pad each batch only to its longest sample
+        :type bucket_by_length: bool
+        :param quantize: Apply dynamic INT8 quantization to the model (CPU only). Models saved after
+                         quantization are loaded as quantized models anyway.
+        :type quantize: bool
+        :param backend: "torch" to run the saved AdaptiveModel, "onnx" to run an exported ONNX model
+                        (see AdaptiveModel.export_onnx) with ONNX Runtime on CPU or "torchscript" to run a
+                        traced model (see AdaptiveModel.export_torchscript).
+                        Default: "onnx" / "torchscript" if the directory contains a model.onnx /
+                        model_torchscript.pt, otherwise "torch".
+        :type backend: str
+        :param n_threads: Number of threads per operator of ONNX Runtime (default: all cores)
+        :type n_threads: int
+        :param warmup_shapes: (batch size, sequence length) pairs to run the model on once loaded, so that
+                              the first batches do not pay for allocations and graph optimizations.
+        :type warmup_shapes: list of tuples
         :return: An instance of the Inferencer.
         """
 
@@ -79,10 +123,56 @@ class Inferencer:
             use_cuda=gpu, local_rank=-1, fp16=False
         )
 
-        model = AdaptiveModel.load(load_dir, device)
+        if backend is None:
+            if os.path.exists(os.path.join(load_dir, ONNX_MODEL_FILE)):
+                backend = "onnx"
+            elif os.path.exists(os.path.join(load_dir, TORCHSCRIPT_MODEL_FILE)):
+                backend = "torchscript"
+            else:
+                backend = "torch"
+
+        if backend == "onnx":
+            if quantize or gpu:
+                logger.warning("The ONNX backend runs the exported model on CPU without further quantization.")
+                gpu = False
+            model = ONNXAdaptiveModel.load(load_dir, n_threads=n_threads)
+        elif backend == "torchscript":
+            if quantize:
+                logger.warning("TorchScript models cannot be quantized after tracing, trace a quantized model instead.")
+            model = TorchScriptAdaptiveModel.load(load_dir, device)
+        elif backend == "torch":
+            model = AdaptiveModel.load(load_dir, device)
+            if quantize and not model.quantized:
+                model.to(torch.device("cpu"))
+                model.quantize()
+        else:
+            raise ValueError(f"Unknown backend: {backend} (choose from 'torch', 'onnx' and 'torchscript')")
         processor = Processor.load_from_dir(load_dir)
         name = os.path.basename(load_dir)
-        return cls(model, processor, batch_size=batch_size, gpu=gpu, name=name)
+        inferencer = cls(model, processor, batch_size=batch_size, gpu=gpu, name=name,
+                         bucket_by_length=bucket_by_length)
+        if warmup_shapes:
+            inferencer.warm_up(warmup_shapes)
+        return inferencer
+
+    def warm_up(self, shapes, n_runs=2):
+        """
+        Runs the model on dummy batches of the given shapes (e.g. typical batch sizes and tweet lengths).
+        Allocator caches are filled and TorchScript optimizes the graph for these shapes
+        (which takes more than one run).
+
+        :param shapes: (batch size, sequence length) pairs
+        :type shapes: list of tuples
+        :param n_runs: Number of runs per shape
+        :type n_runs: int
+        """
+        for batch_size, seq_len in shapes:
+            batch = {name: torch.ones((batch_size, seq_len), dtype=torch.long, device=self.device)
+                     for name in EXPORT_INPUT_NAMES}
+            batch["segment_ids"].zero_()
+            for _ in range(n_runs):
+                with torch.no_grad():
+                    self.model.forward(**batch)
 
     def run_inference(self, dicts):
         """
@@ -97,10 +187,13 @@ class Inferencer:
                             "If you want to: "
                             "a) ... extract vectors from the language model: call `Inferencer.extract_vectors(...)`"
                             f"b) ... run inference on a downstream task: make sure your model path {self.name} contains a saved prediction head")
-        dataset, tensor_names = self.processor.dataset_from_dicts(dicts)
-        samples = []
-        for dict in dicts:
-            samples.extend(self.processor._dict_to_samples(dict))
+        dataset, tensor_names, samples = self._get_dataset_and_samples(dicts)
+
+        if self.bucket_by_length:
+            if all(head.ph_output_type == "per_sequence" for head in self.model.prediction_heads):
+                return self._run_inference_bucketed(dataset, tensor_names, samples)
+            logger.warning("Length bucketing is only supported for prediction heads with one prediction per "
+                           "sequence, running inference with full padding.")
 
         data_loader = NamedDataLoader(
             dataset=dataset,
@@ -126,6 +219,173 @@ class Inferencer:
 
         return preds_all
 
+    def _get_dataset_and_samples(self, dicts):
+        """
+        Tokenizes and featurizes the dicts in a single pass.
+
+        :return: a Pytorch dataset, a list of tensor names and the samples (aligned with the dataset)
+        """
+        dataset, tensor_names, baskets = self.processor.dataset_from_dicts(dicts, return_baskets=True)
+        samples = [sample for basket in baskets for sample in basket.samples]
+        return dataset, tensor_names, samples
+
+    def _run_inference_bucketed(self, dataset, tensor_names, samples):
+        """
+        Runs the model on batches of samples with similar length, each padded only to its longest sample.
+        The logits are put back into input order before formatting, so that the output is the same as
+        for fully padded batches.
+        """
+        logits_all = self._get_logits(dataset, tensor_names, bucket_by_length=True)
+
+        preds_all = []
+        for start in range(0, len(samples), self.batch_size):
+            preds = self.model.formatted_preds(
+                logits=[head_logits[start:start + self.batch_size] for head_logits in logits_all],
+                label_maps=self.processor.label_maps,
+                samples=samples[start:start + self.batch_size],
+                tokenizer=self.processor.tokenizer,
+            )
+            preds_all += preds
+
+        return preds_all
+
+    def _get_logits(self, dataset, tensor_names, bucket_by_length=False):
+        """
+        Runs the model on the whole dataset (for prediction heads with one prediction per sequence).
+
+        :param bucket_by_length: Run the samples longest first, each batch padded only to its longest sample
+        :type bucket_by_length: bool
+        :return: The logits of each prediction head in dataset order
+        """
+        if bucket_by_length:
+            padding_mask = dataset.tensors[list(tensor_names).index("padding_mask")]
+            lengths = padding_mask.sum(dim=1).numpy()
+            # longest first, ties in input order
+            order = np.argsort(-lengths, kind="mergesort")
+            sampler = order.tolist()
+        else:
+            sampler = SequentialSampler(dataset)
+
+        data_loader = NamedDataLoader(
+            dataset=dataset,
+            sampler=sampler,
+            batch_size=self.batch_size,
+            tensor_names=tensor_names,
+        )
+
+        logits_batches = [[] for _ in self.model.prediction_heads]
+        for batch in data_loader:
+            if bucket_by_length:
+                batch = self._trim_batch(batch)
+            batch = {key: batch[key].to(self.device) for key in batch}
+            with torch.no_grad():
+                logits = self.model.forward(**batch)
+            for head_logits, logits_for_head in zip(logits_batches, logits):
+                head_logits.append(logits_for_head.cpu())
+        logits_all = [torch.cat(head_logits) for head_logits in logits_batches]
+
+        if bucket_by_length:
+            # back to input order
+            inverse = torch.from_numpy(np.argsort(order))
+            logits_all = [head_logits[inverse] for head_logits in logits_all]
+        return logits_all
+
+    def predict_proba(self, texts):
+        """
+        Class probabilities of a text classification model. Unlike run_inference, no predictions are
+        formatted, which makes this the faster choice for scoring many texts.
+
+        :param texts: Texts to classify
+        :type texts: list of str
+        :return: numpy array (texts x classes), the columns are in the order of processor.label_maps[0]
+        """
+        if getattr(self, "prediction_type", None) != "text_classification":
+            raise TypeError("predict_proba is only available for models with a single text classification head.")
+        if len(texts) == 0:
+            return np.zeros((0, len(self.processor.label_maps[0])), dtype=np.float32)
+
+        dataset, tensor_names = self.processor.dataset_from_dicts([{"text": text} for text in texts])
+        logits = self._get_logits(dataset, tensor_names, bucket_by_length=self.bucket_by_length)[0]
+        return self.model.prediction_heads[0].logits_to_probs(logits, return_class_probs=True)
+
+    def stream_proba(self, texts, chunk_size=256, prefetch=2):
+        """
+        Streaming version of predict_proba for any iterable of texts (e.g. a generator over a database):
+        texts are read and featurized chunk by chunk on a background thread, ahead of the model,
+        and the class probabilities are yielded chunk by chunk. At most prefetch featurized chunks are
+        held in memory at any time. The processor must not be used elsewhere while streaming.
+
+        :param texts: Texts to classify
+        :type texts: iterable of str
+        :param chunk_size: Number of texts per chunk
+        :type chunk_size: int
+        :param prefetch: Maximum number of featurized chunks waiting for the model
+        :type prefetch: int
+        :return: Generator of numpy arrays (chunk x classes), in input order, the columns are in the order of
+                 processor.label_maps[0]
+        """
+        if getattr(self, "prediction_type", None) != "text_classification":
+            raise TypeError("stream_proba is only available for models with a single text classification head.")
+
+        chunks = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+        end = object()
+
+        def put(item):
+            # gives up when the consumer has stopped
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def featurize():
+            try:
+                chunk = []
+                for text in texts:
+                    chunk.append({"text": text})
+                    if len(chunk) == chunk_size:
+                        if not put(self.processor.dataset_from_dicts(chunk)):
+                            return
+                        chunk = []
+                if chunk and not put(self.processor.dataset_from_dicts(chunk)):
+                    return
+                put(end)
+            except Exception as e:
+                put(e)
+
+        thread = threading.Thread(target=featurize, daemon=True)
+        thread.start()
+        head = self.model.prediction_heads[0]
+        try:
+            while True:
+                item = chunks.get()
+                if item is end:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                dataset, tensor_names = item
+                logits = self._get_logits(dataset, tensor_names, bucket_by_length=self.bucket_by_length)[0]
+                yield head.logits_to_probs(logits, return_class_probs=True)
+        finally:
+            stop.set()
+            thread.join()
+
+    @staticmethod
+    def _trim_batch(batch):
+        """
+        Cuts all per-token tensors of a batch after the longest sample (all-padding columns are removed).
+        """
+        padding_mask = batch["padding_mask"]
+        max_seq_len = padding_mask.shape[1]
+        seq_len = max(int(padding_mask.sum(dim=1).max()), 1)
+        return {
+            key: tensor[:, :seq_len] if tensor.dim() > 1 and tensor.shape[1] == max_seq_len else tensor
+            for key, tensor in batch.items()
+        }
+
     def extract_vectors(self, dicts, extraction_strategy="pooled"):
         """
         Converts a text into vector(s) using the language model only (no prediction head involved).
@@ -135,10 +395,9 @@ class Inferencer:
         :type extraction_strategy: str
         :return: dict of predictions
         """
-        dataset, tensor_names = self.processor.dataset_from_dicts(dicts)
-        samples = []
-        for dict in dicts:
-            samples.extend(self.processor._dict_to_samples(dict))
+        if not isinstance(self.model, AdaptiveModel):
+            raise TypeError("extract_vectors is not available for exported models, load the saved AdaptiveModel instead.")
+        dataset, tensor_names, samples = self._get_dataset_and_samples(dicts)
 
         data_loader = NamedDataLoader(
             dataset=dataset,
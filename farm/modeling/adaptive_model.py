@@ -1,15 +1,24 @@
+import inspect
+import json
 import logging
 import os
 
+import torch
 from torch import nn
 
 from farm.file_utils import create_folder
 from farm.modeling.language_model import LanguageModel
-from farm.modeling.prediction_head import PredictionHead, BertLMHead
+from farm.modeling.prediction_head import PredictionHead, BertLMHead, TextClassificationHead
 from farm.utils import MLFlowLogger as MlLogger
 
 logger = logging.getLogger(__name__)
 
+QUANTIZED_MODEL_FILE = "quantized_model.bin"
+ONNX_MODEL_FILE = "model.onnx"
+TORCHSCRIPT_MODEL_FILE = "model_torchscript.pt"
+# inputs of exported models (in this order)
+EXPORT_INPUT_NAMES = ["input_ids", "segment_ids", "padding_mask"]
+
 
 class AdaptiveModel(nn.Module):
     """ Contains all the modelling needed for your NLP task. Combines a language model and a prediction head.
@@ -51,6 +60,7 @@ class AdaptiveModel(nn.Module):
         self.lm_output_types = (
             [lm_output_types] if isinstance(lm_output_types, str) else lm_output_types
         )
+        self.quantized = False
 
         self.log_params()
 
@@ -63,11 +73,24 @@ class AdaptiveModel(nn.Module):
         :type save_dir: str
         """
         create_folder(save_dir)
+        if self.quantized:
+            self._save_quantized(save_dir)
+            return
         self.language_model.save(save_dir)
         for i, ph in enumerate(self.prediction_heads):
             ph.save(save_dir, i)
             # Need to save config and pipeline
 
+    def _save_quantized(self, save_dir):
+        """
+        Saves the configs of the language model and the prediction heads together with one state dict of the
+        whole quantized model (quantized layers cannot be loaded into the unquantized modules).
+        """
+        self.language_model.save_config(save_dir)
+        for i, ph in enumerate(self.prediction_heads):
+            ph.save_config(save_dir, i)
+        torch.save(self.state_dict(), os.path.join(save_dir, QUANTIZED_MODEL_FILE))
+
     @classmethod
     def load(cls, load_dir, device):
         """
@@ -80,28 +103,119 @@ class AdaptiveModel(nn.Module):
         * processor_config.json config for transforming input
         * vocab.txt vocab file for language model, turning text to Wordpiece Tokens
 
+        A quantized model (see quantize()) is stored as a quantized_model.bin instead of the
+        language_model.bin and prediction_head_X.bin files and is loaded as such.
+
         :param load_dir: location where adaptive model is stored
         :type load_dir: str
         :param device: to which device we want to sent the model, either cpu or cuda
         :type device: torch.device
         """
+        quantized = os.path.exists(os.path.join(load_dir, QUANTIZED_MODEL_FILE))
+        if quantized and str(device) != "cpu":
+            logger.warning("Quantized models only run on CPU, loading the model to CPU.")
+            device = torch.device("cpu")
 
         # Language Model
-        language_model = LanguageModel.load(load_dir)
+        if quantized:
+            language_model = LanguageModel.load_from_config(load_dir)
+        else:
+            language_model = LanguageModel.load(load_dir)
 
         # Prediction heads
-        _, ph_config_files = cls._get_prediction_head_files(load_dir)
+        _, ph_config_files = cls._get_prediction_head_files(load_dir, load_weights=not quantized)
         prediction_heads = []
         ph_output_type = []
         for config_file in ph_config_files:
-            head = PredictionHead.load(config_file)
+            head = PredictionHead.load(config_file, load_weights=not quantized)
             # set shared weights between LM and PH
             if type(head) == BertLMHead:
                 head.set_shared_weights(language_model)
             prediction_heads.append(head)
             ph_output_type.append(head.ph_output_type)
 
-        return cls(language_model, prediction_heads, 0.1, ph_output_type, device)
+        model = cls(language_model, prediction_heads, 0.1, ph_output_type, device)
+        if quantized:
+            model.quantize()
+            model.load_state_dict(torch.load(os.path.join(load_dir, QUANTIZED_MODEL_FILE)))
+        return model
+
+    def quantize(self):
+        """
+        Applies dynamic INT8 quantization to the linear layers of the language model and of the text
+        classification heads: weights are stored as int8, activations are quantized on the fly.
+        Quantized models only run on CPU and cannot be trained any further.
+
+        :return: The model itself (quantized in place)
+        """
+        torch.quantization.quantize_dynamic(self.language_model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+        for head in self.prediction_heads:
+            if isinstance(head, TextClassificationHead):
+                torch.quantization.quantize_dynamic(head, {nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.quantized = True
+        return self
+
+    def export_onnx(self, save_dir, opset_version=11):
+        """
+        Exports the model to an ONNX graph (model.onnx) with dynamic batch and sequence axes, together with the
+        configs of the language model and the prediction heads. The graph can be run with ONNXAdaptiveModel.
+
+        :param save_dir: Directory for the ONNX model
+        :type save_dir: str
+        :param opset_version: ONNX opset version
+        :type opset_version: int
+        """
+        if self.quantized:
+            raise ValueError("Quantized models cannot be exported to ONNX, export the FP32 model instead.")
+        self._save_configs(save_dir)
+
+        output_names = [f"logits_{i}" for i in range(len(self.prediction_heads))]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in EXPORT_INPUT_NAMES}
+        for name, lm_out in zip(output_names, self.lm_output_types):
+            dynamic_axes[name] = {0: "batch"} if lm_out == "per_sequence" else {0: "batch", 1: "sequence"}
+
+        # the exporter restores the training mode of the exported module afterwards, so both are set to eval
+        self.eval()
+        wrapper = _ExportWrapper(self).eval()
+        export_kwargs = dict(
+            input_names=EXPORT_INPUT_NAMES,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=opset_version,
+        )
+        # recent PyTorch versions default to the dynamo based exporter
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+        with torch.no_grad():
+            torch.onnx.export(wrapper, self._get_example_input(), os.path.join(save_dir, ONNX_MODEL_FILE),
+                              **export_kwargs)
+
+    def export_torchscript(self, save_dir):
+        """
+        Traces the model into a TorchScript module (model_torchscript.pt), saved together with the configs of the
+        language model and the prediction heads. The traced module can be run with TorchScriptAdaptiveModel,
+        without building the Python module tree and loading the weights separately. Also works for
+        quantized models.
+
+        :param save_dir: Directory for the traced model
+        :type save_dir: str
+        """
+        self._save_configs(save_dir)
+        self.eval()
+        with torch.no_grad():
+            traced = torch.jit.trace(_ExportWrapper(self).eval(), self._get_example_input(), check_trace=False)
+        torch.jit.save(traced, os.path.join(save_dir, TORCHSCRIPT_MODEL_FILE))
+
+    def _save_configs(self, save_dir):
+        create_folder(save_dir)
+        self.language_model.save_config(save_dir)
+        for i, ph in enumerate(self.prediction_heads):
+            ph.save_config(save_dir, i)
+
+    def _get_example_input(self):
+        # the values do not matter, batch and sequence length are dynamic in the exported models
+        device = next(self.parameters()).device
+        return tuple(torch.ones((2, 16), dtype=torch.long, device=device) for _ in EXPORT_INPUT_NAMES)
 
     def logits_to_loss_per_head(self, logits, **kwargs):
 
@@ -225,7 +339,7 @@ class AdaptiveModel(nn.Module):
         return all_logits
 
     @classmethod
-    def _get_prediction_head_files(cls, load_dir):
+    def _get_prediction_head_files(cls, load_dir, load_weights=True):
         files = os.listdir(load_dir)
         model_files = [
             os.path.join(load_dir, f)
@@ -246,7 +360,8 @@ class AdaptiveModel(nn.Module):
             "This might be because the Language Model Prediction Head "
             "does not currently support saving and loading"
         )
-        assert len(model_files) == len(config_files), error_str
+        if load_weights:
+            assert len(model_files) == len(config_files), error_str
         logger.info(f"Found files for loading {len(model_files)} prediction heads")
 
         return model_files, config_files
@@ -266,3 +381,168 @@ class AdaptiveModel(nn.Module):
             MlLogger.log_params(params)
         except Exception as e:
             logger.warning(f"ML logging didn't work: {e}")
+
+
+class _ExportWrapper(nn.Module):
+    """ Calls AdaptiveModel.forward with positional inputs (as needed for the ONNX export and tracing). """
+
+    def __init__(self, model):
+        super(_ExportWrapper, self).__init__()
+        self.model = model
+
+    def forward(self, input_ids, segment_ids, padding_mask):
+        return tuple(self.model.forward(input_ids=input_ids, segment_ids=segment_ids, padding_mask=padding_mask))
+
+
+class _ExportedAdaptiveModel:
+    """ Base class for exported models: provides the inference interface of AdaptiveModel (forward and
+    formatted_preds), so that they can be used by the Inferencer. The prediction heads are built from their
+    configs and only used to format the predictions."""
+
+    def __init__(self, language, prediction_heads):
+        """
+        :param language: Language of the exported language model
+        :type language: str
+        :param prediction_heads: Prediction heads (only used for formatting the predictions)
+        :type prediction_heads: list
+        """
+        self.language = language
+        self.prediction_heads = prediction_heads
+        self.lm_output_types = [head.ph_output_type for head in prediction_heads]
+        self.quantized = False
+
+    @staticmethod
+    def _load_configs(load_dir):
+        """
+        :return: The language of the language model and the prediction heads (without weights)
+        """
+        language_config = json.load(open(os.path.join(load_dir, "language_model_config.json")))
+        _, ph_config_files = AdaptiveModel._get_prediction_head_files(load_dir, load_weights=False)
+        prediction_heads = [PredictionHead.load(config_file, load_weights=False) for config_file in ph_config_files]
+        for head in prediction_heads:
+            head.eval()
+        return language_config.get("language"), prediction_heads
+
+    def forward(self, **kwargs):
+        raise NotImplementedError()
+
+    def formatted_preds(self, logits, label_maps, **kwargs):
+        """
+        Format predictions for inference (see AdaptiveModel.formatted_preds).
+        """
+        all_preds = []
+        for head, logits_for_head, label_map_for_head in zip(
+            self.prediction_heads, logits, label_maps
+        ):
+            preds = head.formatted_preds(
+                logits=logits_for_head, label_map=label_map_for_head, **kwargs
+            )
+            all_preds.append(preds)
+        return all_preds
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+class ONNXAdaptiveModel(_ExportedAdaptiveModel):
+    """ An AdaptiveModel exported to ONNX (see AdaptiveModel.export_onnx) that is run with ONNX Runtime on CPU.
+    Requires the onnxruntime package."""
+
+    def __init__(self, session, language, prediction_heads):
+        """
+        :param session: ONNX Runtime session of the exported model
+        :type session: onnxruntime.InferenceSession
+        :param language: Language of the exported language model
+        :type language: str
+        :param prediction_heads: Prediction heads (only used for formatting the predictions)
+        :type prediction_heads: list
+        """
+        super(ONNXAdaptiveModel, self).__init__(language, prediction_heads)
+        self.session = session
+
+    @classmethod
+    def load(cls, load_dir, n_threads=None):
+        """
+        Loads an exported model from a directory. The directory must contain:
+
+        * model.onnx
+        * language_model_config.json
+        * prediction_head_X_config.json  multiple PH possible
+
+        :param load_dir: location where the exported model is stored
+        :type load_dir: str
+        :param n_threads: Number of threads used by ONNX Runtime within each operator (default: all cores)
+        :type n_threads: int
+        """
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if n_threads is not None:
+            options.intra_op_num_threads = n_threads
+        session = onnxruntime.InferenceSession(
+            os.path.join(load_dir, ONNX_MODEL_FILE), options, providers=["CPUExecutionProvider"]
+        )
+        language, prediction_heads = cls._load_configs(load_dir)
+        return cls(session, language, prediction_heads)
+
+    def forward(self, **kwargs):
+        """
+        Runs the ONNX graph.
+
+        :param kwargs: Holds the input tensors (input_ids, segment_ids and padding_mask)
+        :return: all logits as a list of torch.tensor, one for each prediction head
+        """
+        inputs = {name: kwargs[name].cpu().numpy() for name in EXPORT_INPUT_NAMES}
+        return [torch.from_numpy(logits) for logits in self.session.run(None, inputs)]
+
+
+class TorchScriptAdaptiveModel(_ExportedAdaptiveModel):
+    """ An AdaptiveModel traced into TorchScript (see AdaptiveModel.export_torchscript)."""
+
+    def __init__(self, module, language, prediction_heads):
+        """
+        :param module: The traced model
+        :type module: torch.jit.ScriptModule
+        :param language: Language of the exported language model
+        :type language: str
+        :param prediction_heads: Prediction heads (only used for formatting the predictions)
+        :type prediction_heads: list
+        """
+        super(TorchScriptAdaptiveModel, self).__init__(language, prediction_heads)
+        self.module = module
+
+    @classmethod
+    def load(cls, load_dir, device):
+        """
+        Loads a traced model from a directory. The directory must contain:
+
+        * model_torchscript.pt
+        * language_model_config.json
+        * prediction_head_X_config.json  multiple PH possible
+
+        :param load_dir: location where the traced model is stored
+        :type load_dir: str
+        :param device: to which device we want to sent the model, either cpu or cuda
+        :type device: torch.device
+        """
+        module = torch.jit.load(os.path.join(load_dir, TORCHSCRIPT_MODEL_FILE), map_location=device)
+        module.eval()
+        language, prediction_heads = cls._load_configs(load_dir)
+        return cls(module, language, prediction_heads)
+
+    def forward(self, **kwargs):
+        """
+        Runs the traced model.
+
+        :param kwargs: Holds the input tensors (input_ids, segment_ids and padding_mask)
+        :return: all logits as a list of torch.tensor, one for each prediction head
+        """
+        return list(self.module(*[kwargs[name] for name in EXPORT_INPUT_NAMES]))
+
+    def to(self, device):
+        self.module.to(device)
+        return self
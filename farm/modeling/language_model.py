@@ -78,6 +78,19 @@ class LanguageModel(nn.Module):
             language_model = cls.subclasses["Bert"].load(pretrained_model_name_or_path)
         return language_model
 
+    @classmethod
+    def load_from_config(cls, load_dir):
+        """
+        Builds the language model saved in a directory from its config file only (the weights are randomly
+        initialized), e.g. to load the state dict of a quantized model into it afterwards.
+
+        :param load_dir: The directory containing a 'language_model_config.json'
+        :type load_dir: str
+        """
+        config_file = os.path.join(load_dir, "language_model_config.json")
+        config = json.load(open(config_file))
+        return cls.subclasses[config["name"]].load_from_config(load_dir)
+
     def freeze(self, layers):
         """ To be implemented"""
         raise NotImplementedError()
@@ -187,6 +200,14 @@ class Bert(LanguageModel):
             bert.language = cls._infer_language_from_name(pretrained_model_name_or_path)
         return bert
 
+    @classmethod
+    def load_from_config(cls, load_dir):
+        bert = cls()
+        bert_config = BertConfig.from_pretrained(os.path.join(load_dir, "language_model_config.json"))
+        bert.model = BertModel(bert_config)
+        bert.language = bert.model.config.language
+        return bert
+
     def forward(
         self,
         input_ids,
@@ -90,20 +90,24 @@ class PredictionHead(nn.Module):
         self.config = config
 
     @classmethod
-    def load(cls, config_file):
+    def load(cls, config_file, load_weights=True):
         """
         Loads a Prediction Head. Infers the class of prediction head from config_file.
 
         :param config_file: location where corresponding config is stored
         :type config_file: str
+        :param load_weights: Whether to load the weights from the corresponding model file
+                             (otherwise they are randomly initialized)
+        :type load_weights: bool
         :return: PredictionHead
         :rtype: PredictionHead[T]
         """
         config = json.load(open(config_file))
         prediction_head = cls.subclasses[config["name"]](**config)
-        model_file = cls._get_model_file(config_file=config_file)
-        logger.info("Loading prediction head from {}".format(model_file))
-        prediction_head.load_state_dict(torch.load(model_file, map_location=torch.device("cpu")))
+        if load_weights:
+            model_file = cls._get_model_file(config_file=config_file)
+            logger.info("Loading prediction head from {}".format(model_file))
+            prediction_head.load_state_dict(torch.load(model_file, map_location=torch.device("cpu")))
         return prediction_head
 
     def logits_to_loss(self, logits, labels):
@@ -194,10 +198,11 @@ class TextClassificationHead(PredictionHead):
     def logits_to_loss(self, logits, label_ids, **kwargs):
         return self.loss_fct(logits, label_ids.view(-1))
 
-    def logits_to_probs(self, logits, **kwargs):
+    def logits_to_probs(self, logits, return_class_probs=False, **kwargs):
         softmax = torch.nn.Softmax(dim=1)
         probs = softmax(logits)
-        probs = torch.max(probs, dim=1)[0]
+        if not return_class_probs:
+            probs = torch.max(probs, dim=1)[0]
         probs = probs.cpu().numpy()
         return probs
 
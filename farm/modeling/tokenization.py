@@ -16,6 +16,8 @@
 from __future__ import absolute_import, division, print_function, unicode_literals
 
 import collections
+import hashlib
+import json
 import logging
 from io import open
 import os
@@ -25,6 +27,8 @@ from pytorch_transformers.tokenization_bert import BertTokenizer, WordpieceToken
 
 logger = logging.getLogger(__name__)
 
+WORD_CACHE_SIZE = 100000
+
 
 class BasicTokenizer(BasicTokenizer):
     def __init__(self, do_lower_case=True, never_split=None, never_split_chars=None, tokenize_chinese_chars=True):
@@ -75,7 +79,7 @@ class BertTokenizer(BertTokenizer):
 
     def __init__(self, vocab_file, do_lower_case=True, do_basic_tokenize=True, never_split=None, never_split_chars=None,
                  unk_token="[UNK]", sep_token="[SEP]", pad_token="[PAD]", cls_token="[CLS]",
-                 mask_token="[MASK]", tokenize_chinese_chars=True, **kwargs):
+                 mask_token="[MASK]", tokenize_chinese_chars=True, word_cache_size=WORD_CACHE_SIZE, **kwargs):
         """Constructs a BertTokenizer.
 
         Args:
@@ -92,6 +96,9 @@ class BertTokenizer(BertTokenizer):
                 Whether to tokenize Chinese characters.
                 This should likely be desactivated for Japanese:
                 see: https://github.com/huggingface/pytorch-pretrained-BERT/issues/328
+            **word_cache_size**: (`optional`) int (default 100000)
+                Number of words whose subword tokens are memoized (see :class:`WordTokenCache`).
+                0 disables the cache.
         """
         super(BertTokenizer, self).__init__(vocab_file, do_lower_case=True, do_basic_tokenize=True, never_split=None, never_split_chars=None,
                  unk_token="[UNK]", sep_token="[SEP]", pad_token="[PAD]", cls_token="[CLS]",
@@ -111,6 +118,7 @@ class BertTokenizer(BertTokenizer):
                                                   never_split_chars=never_split_chars,
                                                   tokenize_chinese_chars=tokenize_chinese_chars)
         self.wordpiece_tokenizer = WordpieceTokenizer(vocab=self.vocab, unk_token=self.unk_token)
+        self.word_cache = WordTokenCache(max_size=word_cache_size) if word_cache_size > 0 else None
 
 
     def add_custom_vocab(self, custom_vocab_file):
@@ -118,6 +126,70 @@ class BertTokenizer(BertTokenizer):
         self.ids_to_tokens = collections.OrderedDict(
             [(ids, tok) for tok, ids in self.vocab.items()])
         self.wordpiece_tokenizer = WordpieceTokenizer(vocab=self.vocab, unk_token=self.unk_token)
+        self._clear_word_cache()
+
+    def add_tokens(self, new_tokens):
+        # added tokens change how words are split
+        self._clear_word_cache()
+        return super(BertTokenizer, self).add_tokens(new_tokens)
+
+    def _clear_word_cache(self):
+        if getattr(self, "word_cache", None) is not None:
+            self.word_cache.clear()
+
+    def get_vocab_fingerprint(self):
+        """
+        Hash over everything that determines how a word is tokenized (vocabulary, added and
+        special tokens, lower casing). Used to check that a persisted word cache fits the tokenizer.
+
+        :return: Hex digest
+        """
+        h = hashlib.sha256()
+        h.update("\n".join(self.vocab.keys()).encode("utf-8"))
+        h.update(json.dumps([sorted(self.added_tokens_encoder), sorted(self.all_special_tokens),
+                             self.do_basic_tokenize and self.basic_tokenizer.do_lower_case]).encode("utf-8"))
+        return h.hexdigest()
+
+    def load_word_cache(self, cache_file):
+        """
+        Fills the word cache with a table saved by :meth:`save_word_cache` (e.g. by another process).
+        Tables of another vocabulary are ignored.
+
+        :param cache_file: JSON file of the table
+        :type cache_file: str
+        :return: Number of words loaded
+        """
+        if self.word_cache is None or not os.path.isfile(cache_file):
+            return 0
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                table = json.load(f)
+        except ValueError:
+            logger.warning("Could not read word cache {}, starting with an empty cache.".format(cache_file))
+            return 0
+        if table.get("fingerprint") != self.get_vocab_fingerprint():
+            logger.info("Word cache {} belongs to another vocabulary, not loaded.".format(cache_file))
+            return 0
+        self.word_cache.update(table["words"])
+        logger.info("Loaded {} words into the word cache from {}".format(len(table["words"]), cache_file))
+        return len(table["words"])
+
+    def save_word_cache(self, cache_file):
+        """
+        Saves the word cache as a table that other processes can load with :meth:`load_word_cache`.
+        The file is replaced atomically, so concurrent writers never leave a partial table.
+
+        :param cache_file: JSON file of the table
+        :type cache_file: str
+        """
+        if self.word_cache is None:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.get_vocab_fingerprint(), "words": self.word_cache.to_dict()}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
 
     def _load_custom_vocab(self, custom_vocab_file):
         custom_vocab = {}
@@ -158,6 +230,84 @@ class BertTokenizer(BertTokenizer):
 
 
 
+class WordTokenCache(object):
+    """
+    Bounded LRU cache of the subword tokens of single words. Hashtags, party names and function
+    words recur across many texts, so most words are only split by the basic and WordPiece
+    tokenizer once. Besides the tokens, the offsets of the tokens within the word are stored.
+    """
+
+    def __init__(self, max_size=WORD_CACHE_SIZE):
+        """
+        :param max_size: Maximum number of words in the cache (least recently used ones are evicted)
+        :type max_size: int
+        """
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def tokenize(self, word, tokenizer):
+        """
+        Subword tokens of a word as returned by ``tokenizer.tokenize(word)``, together with
+        the offset of each token relative to the start of the word.
+
+        :return: tuple of tokens, tuple of offsets
+        """
+        entry = self.entries.get(word)
+        if entry is not None:
+            self.hits += 1
+            self.entries.move_to_end(word)
+            return entry
+        self.misses += 1
+        entry = self._make_entry(tokenizer.tokenize(word))
+        self.entries[word] = entry
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    def _make_entry(tokens_word):
+        offsets = []
+        w_off = 0
+        for tok in tokens_word:
+            offsets.append(w_off)
+            w_off += len(tok.replace("##", ""))
+        return tuple(tokens_word), tuple(offsets)
+
+    def update(self, words):
+        """
+        Adds words with known tokens (e.g. from a persisted table).
+
+        :param words: dict of word to list of tokens
+        """
+        for word, tokens_word in words.items():
+            self.entries[word] = self._make_entry(tokens_word)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def to_dict(self):
+        """ Words and tokens in least recently used order. """
+        return {word: list(entry[0]) for word, entry in self.entries.items()}
+
+    def clear(self):
+        self.entries.clear()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        """
+        :return: dict with the number of cached words, hits, misses and the hit rate
+        """
+        n_lookups = self.hits + self.misses
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / n_lookups if n_lookups else 0.0}
+
+    def __len__(self):
+        return len(self.entries)
+
 
 def tokenize_with_metadata(text, tokenizer, max_seq_len):
     # split text into "words" (here: simple whitespace tokenizer)
@@ -181,9 +331,13 @@ def _words_to_tokens(words, word_offsets, tokenizer, max_seq_len):
     tokens = []
     token_offsets = []
     start_of_word = []
+    word_cache = getattr(tokenizer, "word_cache", None)
     for w, w_off in zip(words, word_offsets):
-        # Get tokens of single word
-        tokens_word = tokenizer.tokenize(w)
+        # Get tokens of single word (and their offsets within the word)
+        if word_cache is not None:
+            tokens_word, offsets_word = word_cache.tokenize(w, tokenizer)
+        else:
+            tokens_word, offsets_word = WordTokenCache._make_entry(tokenizer.tokenize(w))
 
         # Sometimes the tokenizer returns no tokens
         if len(tokens_word) == 0:
@@ -191,15 +345,12 @@ def _words_to_tokens(words, word_offsets, tokenizer, max_seq_len):
         tokens += tokens_word
 
         # get gloabl offset for each token in word + save marker for first tokens of a word
-        first_tok = True
-        for tok in tokens_word:
-            token_offsets.append(w_off)
-            w_off += len(tok.replace("##", ""))
-            if first_tok:
-                start_of_word.append(True)
-                first_tok = False
-            else:
-                start_of_word.append(False)
+        token_offsets += [w_off + off for off in offsets_word]
+        start_of_word += [True] + [False] * (len(tokens_word) - 1)
+
+        # tokens beyond max_seq_length are clipped anyway
+        if 0 < max_seq_len - 2 <= len(tokens):
+            break
 
     # Clip at max_seq_length. The "-2" is for CLS and SEP token
     tokens = tokens[: max_seq_len - 2]
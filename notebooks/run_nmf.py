@@ -6,6 +6,7 @@ Run NMF analysis on dataset and save results
 
 import bundestweets.stats_helpers as stats_helpers
 import bundestweets.nlp as my_nlp
+import bundestweets.online_nmf as online_nmf
 
 import json
 import argparse
@@ -14,6 +15,12 @@ import argparse
 # parse arguments
 parser = argparse.ArgumentParser()
 parser.add_argument("file", help="Input file to preprocess")
+parser.add_argument("--online", default=False, action="store_true",
+                    help="Update the online topic model with new tweets instead of refitting")
+parser.add_argument("--reassign", default=False, action="store_true",
+                    help="Recompute the topic assignments of all tweets (online mode)")
+parser.add_argument("--model_dir", default=online_nmf.MODEL_DIR, help="Directory of the online topic model")
+parser.add_argument("--batch_size", type=int, default=10000, help="Number of tweets per minibatch (online mode)")
 args = parser.parse_args()
 
 
@@ -49,8 +56,16 @@ def main():
     # get data
     data = stats_helpers.get_raw_data(db_file=args.file)
     
-    # run NMF analysis
-    topics, _ = my_nlp.perform_NMF_analysis(data, verbose=1)
+    if args.online:
+        # update online NMF with new tweets (stores topic assignments of the new tweets)
+        topics, n_new = online_nmf.update_topic_model(data, model_dir=args.model_dir, batch_size=args.batch_size,
+                                                      reassign=args.reassign, verbose=1)
+        print(f'{n_new} new tweets.')
+    else:
+        # run NMF analysis (assignments are stored apart from those of the online model)
+        topics, tweet_topics = my_nlp.perform_NMF_analysis(data, verbose=1)
+        online_nmf.save_tweet_topics(data['id'], tweet_topics, model_dir=args.model_dir,
+                                     file_name=online_nmf.BATCH_TWEET_TOPICS_FILE)
 
     # save results
     with open('bundestweets/data/nmf_topics.json', 'w+') as fp:
@@ -11,6 +11,7 @@ import bundestweets.helpers as helpers
 import bundestweets.vis_helpers as vis_helpers
 import bundestweets.stats_helpers as stats_helpers
 import bundestweets.nlp as my_nlp
+import bundestweets.party_models as party_models
 
 
 def write(analysis):
@@ -83,14 +84,20 @@ def write(analysis):
     # run analysis
     if st.button('Train the algorithm and show results!'):
         
-        # get word importance scores per party
-        party_word_importance, train_acc, test_acc = my_nlp.get_all_top_n_words(data_subset, translation_set, n=40, verbose=1)
+        # get word importance scores per party (corpus is vectorized only once,
+        # results for known date ranges come from the cache)
+        feature_store = vis_helpers.get_tfidf_feature_store(my_data)
+        party_word_importance, train_acc, test_acc = party_models.get_cached_top_n_words(
+            feature_store, start_datetime, end_datetime, translation_set, n=40, verbose=1)
         
         st.write(f"""Model accuracy: {test_acc*100:.2f}% / Chance level: {1/7*100:.2f}%
         """)
 
         # show word clouds
         for party in my_nlp.party2id.keys():
+            if party not in party_word_importance:
+                # (no tweets of this party in the date range)
+                continue
             wordcloud = vis_helpers.create_word_cloud(party_word_importance, party)
             
             fig = plt.figure(figsize=(10,5))
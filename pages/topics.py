@@ -17,8 +17,9 @@ def write(analysis):
     """Writes the Topics Page"""
     
     # get data
-    my_data = analysis['my_data']
-    wordsets = analysis['wordsets']
+    topic_engine = analysis['topic_engine']
+    index = analysis['keyword_index']
+    cube = analysis['token_cube']
     
     st.write("""
     # Topic identification
@@ -53,9 +54,15 @@ def write(analysis):
     options = st.multiselect('Choose keywords ...', option_list,
                              default=[option_list[15], option_list[16]])
     
+    # daily and weekly resolution only with precomputed token counts
+    freq = 'M'
+    if cube is not None:
+        resolutions = {'Monthly': 'M', 'Weekly': 'W', 'Daily': 'D'}
+        freq = resolutions[st.selectbox('Resolution', list(resolutions.keys()))]
+    
     ## Timeline plot
     topics = {i: options[i].split() for i in range(len(options))}
-    plot_df = vis_helpers.get_topic_timeline_df(topics, wordsets, my_data)
+    plot_df = vis_helpers.get_topic_timeline_df(topics, topic_engine, index, cube, freq=freq)
         
     timechart = alt.Chart(plot_df).mark_line().encode(
         x=alt.X('Date:T', axis=alt.Axis(title='Date')),
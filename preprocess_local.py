@@ -11,9 +11,15 @@ import bundestweets.nlp as my_nlp
 import sqlite3
 import json
 import bundestweets.bert as bert
+import bundestweets.keyword_index as keyword_index
+import bundestweets.token_cube as token_cube
+import bundestweets.dedup as dedup
 
 parser = argparse.ArgumentParser()
 parser.add_argument("file", help="Input file to preprocess")
+parser.add_argument("--index_dir", default=keyword_index.INDEX_DIR, help="Directory of the keyword index (topics page)")
+parser.add_argument("--dedup_dir", default=dedup.DEDUP_DIR, help="Directory of the near-duplicate detection state")
+parser.add_argument("--cube_dir", default=token_cube.CUBE_DIR, help="Directory of the token-by-day counts (topics page)")
 args = parser.parse_args()
 
 
@@ -31,9 +37,21 @@ def main():
     #with open('bundestweets/data/translation_set.json', 'w+') as fp:
     #    json.dump(translation_set, fp)
         
-    # run bert model for offensive language identification
+    # add new tweets to the keyword index (topics page)
+    print('Updating keyword index...')
+    keyword_index.update_keyword_index(data, index_dir=args.index_dir, verbose=1)
+    
+    # add new tweets to the token-by-day counts (topics page)
+    print('Updating token cube...')
+    token_cube.update_token_cube(data, cube_dir=args.cube_dir, verbose=1)
+        
+    # cluster near-duplicate tweets
+    print('Clustering near-duplicate tweets...')
+    data['canonical_id'] = dedup.update_duplicate_clusters(data, dedup_dir=args.dedup_dir, verbose=1)
+    
+    # run bert model for offensive language identification (once per cluster of near-duplicates)
     print('Running BERT model for offensive language identification...')
-    bert_proba = bert.run_bert(data)
+    bert_proba = bert.run_bert_once_per_cluster(data, data['canonical_id'])
     data['offensive_proba'] = bert_proba[:, 1]
     
     # open database file and save preprocessed columns
@@ -64,6 +82,19 @@ def main():
     cur.executemany(sqlite_update_query, recordList)
     conn.commit()
     
+    # create new column "canonical_id"
+    try:
+        cur.execute('ALTER TABLE tweets ADD canonical_id INTEGER;')
+    except sqlite3.OperationalError:
+        print('Column "canonical_id" exists already.')
+        
+    # update column "canonical_id"
+    print("Uploading 'canonical_id' column...")
+    recordList = list(zip(data.canonical_id.astype('int'), data.id.astype('int')))
+    sqlite_update_query = """UPDATE tweets set canonical_id = ? where id = ?"""
+    cur.executemany(sqlite_update_query, recordList)
+    conn.commit()
+    
     # generate column "offensive_proba"
     try:
         cur.execute('ALTER TABLE tweets ADD offensive_proba FLOAT CONSTRAINT d_offensive_zero DEFAULT 0;')
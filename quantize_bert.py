@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""Dynamic INT8 quantization of the BERT model for offensive language identification:
+Quantizes the linear layers of the language model and the classification head,
+saves the quantized model as its own model directory and compares its predictions
+with the FP32 model (probabilities, offensive tweets at the app threshold,
+throughput and size).
+
+The quantized model can be used like the original one, e.g.
+python run_bert.py tweets_data.db --model_dir ./bert_model_int8/
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import bundestweets.bert as bert
+import bundestweets.bert_benchmark as bert_benchmark
+import bundestweets.stats_helpers as stats_helpers
+from farm.infer import Inferencer
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model_dir", default=bert.BERT_MODEL_DIR, help="Directory of the pre-trained model")
+parser.add_argument("--output_dir", default="./bert_model_int8/", help="Directory for the quantized model")
+parser.add_argument("--db_file", default=None, help="Database file with tweets for the comparison (synthetic tweets if not given)")
+parser.add_argument("--n_tweets", type=int, default=2000, help="Number of tweets for the comparison")
+parser.add_argument("--thr", type=float, default=0.9, help="Minimum probability of offensive tweets (as in the app)")
+parser.add_argument("--batch_size", type=int, default=32, help="Number of tweets per batch")
+args = parser.parse_args()
+
+
+def main():
+
+    # quantize and save model
+    print(f'Quantizing model from {args.model_dir} ...')
+    inferencer = Inferencer.load(args.model_dir, quantize=True)
+    inferencer.model.save(args.output_dir)
+    inferencer.processor.save(args.output_dir)
+    print(f'Quantized model saved to {args.output_dir}.')
+
+    # get tweets
+    if args.db_file is not None:
+        data = stats_helpers.get_raw_data(local=True, db_file=args.db_file)
+        data = data.loc[data['text'].notnull()]
+        data = data.sample(n=min(args.n_tweets, len(data)), random_state=0)
+    else:
+        data = pd.DataFrame({'text': bert_benchmark.make_synthetic_tweets(n_tweets=args.n_tweets)})
+    texts = list(data['text'].values)
+
+    # run both models (the quantized one as loaded from its own directory)
+    results = dict()
+    for name, model_dir in [('fp32', args.model_dir), ('int8', args.output_dir)]:
+        inferencer = Inferencer.load(model_dir, batch_size=args.batch_size, bucket_by_length=True)
+        tweets_per_second, predictions = bert_benchmark.time_inference(inferencer, texts)
+        results[name] = {'proba': bert.get_probabilities(predictions), 'tweets_per_second': tweets_per_second,
+                         'size_mb': bert_benchmark.get_model_size(model_dir)}
+
+    comparison = bert.compare_predictions(data, results['fp32']['proba'], results['int8']['proba'], thr=args.thr)
+    for name in ['fp32', 'int8']:
+        print(f"{name}: {results[name]['tweets_per_second']:.1f} tweets/s, {results[name]['size_mb']:.1f} MB")
+    print(f"Speed-up: {results['int8']['tweets_per_second'] / results['fp32']['tweets_per_second']:.2f}x")
+    for key, value in comparison.items():
+        print(f'{key}: {value:.4g}' if isinstance(value, float) else f'{key}: {value}')
+    print(f"Correlation of probabilities: "
+          f"{np.corrcoef(results['fp32']['proba'][:, 1], results['int8']['proba'][:, 1])[0, 1]:.4f}")
+
+
+if __name__ == '__main__':
+    main()
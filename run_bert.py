@@ -14,10 +14,16 @@ import argparse
 import datetime
 
 import bundestweets.bert as bert
+import bundestweets.bert_cache as bert_cache
 
 
 parser = argparse.ArgumentParser()
 parser.add_argument("file", help="Input file to preprocess")
+parser.add_argument("--model_dir", default=bert.BERT_MODEL_DIR, help="Directory of the pre-trained model")
+parser.add_argument("--cache_file", default=bert_cache.CACHE_FILE, help="SQLite file of the prediction cache")
+parser.add_argument("--no_cache", default=False, action="store_true", help="Score all tweets without the cache")
+parser.add_argument("--workers", type=int, default=1, help="Number of worker processes, each with its own model copy")
+parser.add_argument("--threads", type=int, default=None, help="Number of threads per worker (default: all cores)")
 args = parser.parse_args()
 
 
@@ -27,7 +33,9 @@ def main():
     data = stats_helpers.get_raw_data(local=True, db_file=args.file)
     
     # run model on data
-    bert_proba = bert.run_bert(data)
+    cache_file = None if args.no_cache else args.cache_file
+    bert_proba = bert.run_bert(data, save_dir=args.model_dir, cache_file=cache_file,
+                               n_workers=args.workers, n_threads=args.threads)
     
     # save results
     datestr = datetime.datetime.now().strftime(format='%Y-%m-%d_%H:%M')
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from bundestweets import dedup
+
+
+def test_find_candidate_pairs_links_duplicates_across_a_collision():
+    # one band: duplicates 0 and 2, with the colliding non-duplicate 1 between them
+    keys = np.array([[7], [7], [7], [3]], dtype=np.uint64)
+    signatures = np.zeros((4, dedup.NUM_PERM), dtype=np.uint32)
+    pairs = dedup.find_candidate_pairs(keys, np.ones(4, dtype=bool), signatures)
+    assert {(0, 1), (0, 2), (1, 2)} == {tuple(pair) for pair in pairs}
+
+
+def test_find_candidate_pairs_large_bucket_with_non_duplicate_first():
+    text = 'Heute im Bundestag: Wir stimmen für den Klimaschutz und gegen neue Schulden!'
+    texts = ['Ganz etwas anderes, nämlich Fußball am Wochenende.'] + [text + '!' * i for i in range(9)]
+    signatures = dedup.get_minhash_signatures([dedup.normalize_text(t) for t in texts])
+    keys = np.zeros((10, 1), dtype=np.uint64)
+
+    pairs = dedup.find_candidate_pairs(keys, np.ones(10, dtype=bool), signatures, max_bucket_size=4)
+    assert {(1, i) for i in range(2, 10)} == {tuple(pair) for pair in pairs}
+
+
+def test_update_duplicate_clusters_with_colliding_non_duplicate(tmp_path, monkeypatch):
+    # all tweets collide in every band, the non-duplicate sorts between the duplicates
+    monkeypatch.setattr(dedup, 'get_band_keys', lambda signatures: np.zeros((len(signatures), dedup.BANDS), dtype=np.uint64))
+    text = 'Heute im Bundestag: Wir stimmen für den Klimaschutz und gegen neue Schulden!'
+    data = pd.DataFrame({'id': [1, 2, 3],
+                         'text_cleaned': [text, 'Ganz etwas anderes, nämlich Fußball am Wochenende.', text + ' #btw']})
+
+    canonical_ids = dedup.update_duplicate_clusters(data, dedup_dir=str(tmp_path))
+    assert canonical_ids.tolist() == [1, 2, 1]
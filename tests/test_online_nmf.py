@@ -0,0 +1,58 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import bundestweets.online_nmf as online_nmf
+
+HASHTAGS = ['#klima #energie', '#schule #bildung', '#rente #arbeit', '#klima #kohle', '#bildung #digital']
+
+
+def make_tweets(ids):
+    return pd.DataFrame({'id': ids, 'hashtags': [HASHTAGS[i % len(HASHTAGS)] for i in ids]})
+
+
+def save_batch_assignments(ids, model_dir):
+    online_nmf.save_tweet_topics(ids, np.zeros(len(ids), dtype=np.int64), model_dir=model_dir,
+                                 file_name=online_nmf.BATCH_TWEET_TOPICS_FILE)
+
+
+def test_batch_assignments_do_not_count_as_seen(tmp_path):
+    model_dir = str(tmp_path)
+    first, second = make_tweets(np.arange(300)), make_tweets(np.arange(300, 600))
+
+    save_batch_assignments(first['id'], model_dir)
+    _, n_new = online_nmf.update_topic_model(first, model_dir=model_dir, n_components=3)
+    assert n_new == 300
+
+    # a batch run after the online model exists
+    save_batch_assignments(second['id'], model_dir)
+    both = pd.concat([first, second])
+    _, n_new = online_nmf.update_topic_model(both, model_dir=model_dir, n_components=3)
+    assert n_new == 300
+    assert sorted(online_nmf.OnlineNMF.load(model_dir).seen_ids) == list(range(600))
+
+    # assignments of the online model refer to its own topics
+    model = online_nmf.OnlineNMF.load(model_dir)
+    stored = online_nmf.load_tweet_topics(model_dir)
+    expected = online_nmf.get_tweet_topics(model.transform(second['hashtags']))
+    assert stored.loc[second['id']].tolist() == expected.tolist()
+    assert online_nmf.load_tweet_topics(model_dir, online_nmf.BATCH_TWEET_TOPICS_FILE).tolist() == [0] * 600
+
+    _, n_new = online_nmf.update_topic_model(both, model_dir=model_dir, n_components=3)
+    assert n_new == 0
+
+
+def test_model_saved_without_seen_ids(tmp_path):
+    model_dir = str(tmp_path)
+    online_nmf.update_topic_model(make_tweets(np.arange(300)), model_dir=model_dir, n_components=3)
+
+    # state written before the model stored its tweet ID's
+    with np.load(os.path.join(model_dir, 'state.npz')) as state:
+        state = {k: state[k] for k in state.files if k != 'seen_ids'}
+    np.savez(os.path.join(model_dir, 'state.npz'), **state)
+    assert online_nmf.OnlineNMF.load(model_dir).seen_ids is None
+
+    _, n_new = online_nmf.update_topic_model(make_tweets(np.arange(400)), model_dir=model_dir, n_components=3)
+    assert n_new == 100
+    assert len(online_nmf.OnlineNMF.load(model_dir).seen_ids) == 400
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import bundestweets.nlp as my_nlp
+import bundestweets.party_models as party_models
+
+# distinctive word stem per party
+PARTY_WORDS = {'CDU/CSU': 'union', 'SPD': 'sozial', 'FDP': 'freiheit', 'AfD': 'heimat'}
+
+
+def make_data(parties_per_month, n_per_party=200):
+    rng = np.random.RandomState(0)
+    rows = []
+    for month, parties in parties_per_month.items():
+        for party in parties:
+            for i in range(n_per_party):
+                common = ' '.join(rng.choice(['bund', 'tag', 'land', 'zeit', 'recht'], size=2))
+                rows.append({'date': pd.Timestamp(month) + pd.Timedelta(days=i % 28), 'party': party,
+                             'text_stemmed': f'{common} {PARTY_WORDS[party]}'})
+    data = pd.DataFrame(rows)
+    data['id'] = np.arange(len(data))
+    return data
+
+
+@pytest.mark.parametrize('parties', [['CDU/CSU', 'SPD'], ['SPD', 'FDP', 'AfD']])
+def test_party_word_importance_with_missing_parties(parties):
+    feature_store = my_nlp.build_tfidf_feature_store(make_data({'2020-01-01': parties}))
+    model, vectorizer, _, _ = my_nlp.perform_party_regression_analysis_from_store(
+        feature_store, '2020-01-01', '2020-01-31', **party_models.HYPERPARAMETERS)
+
+    party_word_importance = my_nlp.get_party_word_importance(model, vectorizer, None, n=1, stemming=False)
+    assert set(party_word_importance) == set(parties)
+    for party in parties:
+        assert list(party_word_importance[party]) == [PARTY_WORDS[party]]
+
+
+def test_precompute_standard_windows_with_missing_parties(tmp_path):
+    feature_store = my_nlp.build_tfidf_feature_store(
+        make_data({'2020-01-01': ['CDU/CSU', 'SPD'], '2020-02-01': ['CDU/CSU', 'FDP', 'AfD']}))
+    n_trained = party_models.precompute_standard_windows(feature_store, n=1, cache_dir=str(tmp_path), min_tweets=10)
+    assert n_trained > 0
+
+    party_word_importance, _, _ = party_models.get_cached_top_n_words(
+        feature_store, '2020-01-01', '2020-01-31', None, n=1, cache_dir=str(tmp_path))
+    assert set(party_word_importance) == {'CDU/CSU', 'SPD'}
+    for party, word_importance in party_word_importance.items():
+        assert list(word_importance) == [PARTY_WORDS[party]]
@@ -0,0 +1,27 @@
+from bundestweets.streaming import HashingFeatureMap
+
+
+def test_feature_names_round_trip():
+    feature_map = HashingFeatureMap(n_features=2**12)
+    words = [f'wort{i}' for i in range(2000)] + ['klima', 'bundestag', 'afd', 'spd', 'grün']
+    feature_map.partial_fit([' '.join(words), 'klima klima bundestag'])
+    feature_names = feature_map.get_feature_names()
+
+    # word -> bucket of the vectorizer -> word (the most frequent one in that bucket)
+    X = feature_map.transform(words).tocsr()
+    for row, word in enumerate(words):
+        bucket = X.indices[X.indptr[row]]
+        name = feature_names[bucket]
+        name_X = feature_map.transform([name]).tocsr()
+        assert name_X.indices[0] == bucket
+        assert feature_map.word_counts[name] >= feature_map.word_counts[word]
+    assert feature_names[feature_map.get_buckets(['klima'])[0]] == 'klima'
+
+
+def test_feature_names_unused_buckets_are_empty():
+    feature_map = HashingFeatureMap(n_features=2**20)
+    feature_map.partial_fit(['a b c'])
+    feature_names = feature_map.get_feature_names()
+
+    assert len(feature_names) == 2**20
+    assert sorted(name for name in feature_names if name) == ['a', 'b', 'c']
@@ -0,0 +1,66 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bundestweets.token_cube as token_cube
+
+
+def make_batch(ids, day):
+    return pd.DataFrame({'id': ids, 'date': pd.Timestamp(day), 'text': 'Klima und Schule', 'party': 'SPD'})
+
+
+def get_klima_count(cube_dir):
+    return token_cube.TokenCube(cube_dir).get_timeline(['klima'], freq='D').sum()
+
+
+def test_update_writes_a_new_version(tmp_path):
+    cube_dir = str(tmp_path)
+    token_cube.update_token_cube(make_batch([1, 2], '2020-01-01'), cube_dir=cube_dir)
+    token_cube.update_token_cube(make_batch([2, 3], '2020-01-03'), cube_dir=cube_dir)
+
+    meta = token_cube.read_meta(cube_dir)
+    assert set(os.listdir(cube_dir)) == {'meta.json', meta['version']}
+    assert meta['last_day'] == '2020-01-03'
+    assert get_klima_count(cube_dir) == 3
+
+
+def test_interrupted_update_keeps_the_previous_version(tmp_path, monkeypatch):
+    cube_dir = str(tmp_path)
+    token_cube.update_token_cube(make_batch([1, 2], '2020-01-01'), cube_dir=cube_dir)
+
+    # the process dies after the matrix of the new version is written
+    def fail(*args, **kwargs):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(np, 'save', fail)
+        with pytest.raises(KeyboardInterrupt):
+            token_cube.update_token_cube(make_batch([3], '2020-01-02'), cube_dir=cube_dir)
+    cube = token_cube.load_cube(cube_dir)
+    assert cube['ids'].tolist() == [1, 2]
+    assert cube['matrix'].shape[0] == len(cube['tokens'])
+    assert get_klima_count(cube_dir) == 2
+
+    # the batch is counted exactly once when the update is repeated
+    token_cube.update_token_cube(make_batch([3], '2020-01-02'), cube_dir=cube_dir)
+    assert get_klima_count(cube_dir) == 3
+
+
+def test_cube_without_versions_is_loaded_and_replaced(tmp_path):
+    cube_dir = str(tmp_path)
+    token_cube.update_token_cube(make_batch([1, 2], '2020-01-01'), cube_dir=cube_dir)
+
+    # move the files into the layout written before versioning
+    meta = token_cube.read_meta(cube_dir)
+    for name in ['cube.npz', 'ids.npy', 'tokens.json']:
+        os.replace(os.path.join(cube_dir, meta['version'], name), os.path.join(cube_dir, name))
+    os.rmdir(os.path.join(cube_dir, meta['version']))
+    with open(os.path.join(cube_dir, 'meta.json'), 'w') as fp:
+        json.dump({k: meta[k] for k in ['first_day', 'groups', 'n_days']}, fp)
+    assert get_klima_count(cube_dir) == 2
+
+    token_cube.update_token_cube(make_batch([3], '2020-01-02'), cube_dir=cube_dir)
+    assert set(os.listdir(cube_dir)) == {'meta.json', token_cube.read_meta(cube_dir)['version']}
+    assert get_klima_count(cube_dir) == 3
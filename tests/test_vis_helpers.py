@@ -0,0 +1,55 @@
+import pandas as pd
+
+import bundestweets.vis_helpers as vis_helpers
+
+
+def test_get_member_tweets_per_month():
+    member_tweets = pd.DataFrame({
+        'date': pd.to_datetime(['2019-03-02', '2019-03-20', '2019-05-11']),
+        'real_name': ['Erika Mustermann'] * 3,
+        'id': [1, 2, 3],
+        'favorites': [5, 1, 0],
+        'retweets': [2, 0, 4],
+    })
+
+    plot_df = vis_helpers.get_member_tweets_per_month(member_tweets)
+
+    assert list(plot_df.columns) == ['date', 'real_name', 'count', 'favorites', 'retweets']
+    by_month = plot_df.set_index('date')
+    assert by_month.loc['2019-03-31', 'count'] == 2
+    assert by_month.loc['2019-03-31', 'favorites'] == 6
+    assert by_month.loc['2019-05-31', 'retweets'] == 4
+    assert plot_df['count'].sum() == 3
+
+
+def make_tweets(ids, day):
+    return pd.DataFrame({'id': ids, 'date': pd.Timestamp(day), 'text': 'Klima und Schule', 'party': 'SPD'})
+
+
+def test_get_topic_backends(tmp_path):
+    import bundestweets.keyword_index as keyword_index
+    import bundestweets.token_cube as token_cube
+
+    cube_dir, index_dir = str(tmp_path / 'cube'), str(tmp_path / 'index')
+    tweets = make_tweets([1, 2], '2020-01-01')
+    token_cube.update_token_cube(tweets, cube_dir=cube_dir)
+    keyword_index.update_keyword_index(tweets, index_dir=index_dir)
+
+    topic_engine, index, cube = vis_helpers.get_topic_backends(tweets, True, cube_dir=cube_dir, index_dir=index_dir)
+    assert (topic_engine, index) == (None, None)
+    assert cube.get_timeline(['klima'], freq='D').sum() == 2
+
+    # live data, or local data which the precomputed counts do not cover yet
+    topic_engine, index, cube = vis_helpers.get_topic_backends(tweets, False, cube_dir=cube_dir, index_dir=index_dir)
+    assert (topic_engine is not None) and (index, cube) == (None, None)
+    more_tweets = pd.concat([tweets, make_tweets([3], '2020-01-02')])
+    topic_engine, index, cube = vis_helpers.get_topic_backends(more_tweets, True, cube_dir=cube_dir, index_dir=index_dir)
+    assert (topic_engine is not None) and (index, cube) == (None, None)
+
+    # the keyword index covers the same month, the updated cube is reloaded
+    keyword_index.update_keyword_index(more_tweets, index_dir=index_dir)
+    _, index, cube = vis_helpers.get_topic_backends(more_tweets, True, cube_dir=str(tmp_path / 'none'), index_dir=index_dir)
+    assert (index is not None) and (cube is None)
+    token_cube.update_token_cube(more_tweets, cube_dir=cube_dir)
+    _, _, cube = vis_helpers.get_topic_backends(more_tweets, True, cube_dir=cube_dir, index_dir=index_dir)
+    assert cube.get_timeline(['klima'], freq='D').sum() == 3
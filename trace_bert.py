@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""Trace the BERT model for offensive language identification into TorchScript:
+Writes the saved model as a TorchScript module together with the configs and
+vocabulary needed for inference, and compares startup time (load and warm-up),
+first batch latency and throughput with the saved model. The traced directory
+can be used like the original one, e.g.
+python run_bert.py tweets_data.db --model_dir ./bert_model_torchscript/
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import bundestweets.bert as bert
+import bundestweets.bert_benchmark as bert_benchmark
+from farm.infer import Inferencer
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--model_dir", default=bert.BERT_MODEL_DIR, help="Directory of the pre-trained model")
+parser.add_argument("--output_dir", default="./bert_model_torchscript/", help="Directory for the traced model")
+parser.add_argument("--quantize", default=False, action="store_true", help="Trace the INT8 quantized model")
+parser.add_argument("--warmup_batch_size", type=int, default=32, help="Batch size of the warm-up batches")
+parser.add_argument("--warmup_lengths", type=int, nargs="*", default=[32, 64],
+                    help="Sequence lengths of the warm-up batches (none to skip the warm-up)")
+parser.add_argument("--n_check", type=int, default=500, help="Number of synthetic tweets for the comparison (0 to skip)")
+parser.add_argument("--batch_size", type=int, default=32, help="Number of tweets per batch")
+args = parser.parse_args()
+
+
+def main():
+
+    # trace model
+    inferencer = Inferencer.load(args.model_dir, backend="torch", quantize=args.quantize)
+    inferencer.model.export_torchscript(args.output_dir)
+    inferencer.processor.save(args.output_dir)
+    print(f'Traced model saved to {args.output_dir}.')
+
+    if args.n_check == 0:
+        return
+
+    # compare startup, first batch and throughput
+    texts = bert_benchmark.make_synthetic_tweets(n_tweets=args.n_check)
+    warmup_shapes = [(args.warmup_batch_size, seq_len) for seq_len in args.warmup_lengths]
+    reference = None
+    for name, model_dir, backend in [('saved model', args.model_dir, 'torch'),
+                                     ('TorchScript', args.output_dir, 'torchscript')]:
+        t = time.perf_counter()
+        inferencer = Inferencer.load(model_dir, batch_size=args.batch_size, bucket_by_length=True, backend=backend,
+                                     quantize=args.quantize and backend == 'torch', warmup_shapes=warmup_shapes)
+        startup_time = time.perf_counter() - t
+
+        t = time.perf_counter()
+        inferencer.run_inference(dicts=[{'text': t} for t in texts[:args.batch_size]])
+        first_batch_time = time.perf_counter() - t
+
+        tweets_per_second, results = bert_benchmark.time_inference(inferencer, texts)
+        proba = bert.get_probabilities(results)
+        if reference is None:
+            reference = proba
+        print(f'{name}: startup {startup_time:.2f}s, first batch {first_batch_time:.3f}s, '
+              f'{tweets_per_second:.1f} tweets/s, max. probability deviation {np.abs(proba - reference).max():.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""Offline job: trains and stores party classification models and top-word results
+for standard time windows (each month, quarter and year, plus all time).
+The content page then serves these windows directly from the cache.
+"""
+
+import argparse
+
+import bundestweets.stats_helpers as stats_helpers
+import bundestweets.nlp as my_nlp
+import bundestweets.party_models as party_models
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-l', '--local', default=False, action='store_true', help="Use local database file instead of Cloud SQL")
+parser.add_argument('--db_file', default='bundestweets/data/tweets_data.db', help="Local database file")
+parser.add_argument('--cache_dir', default=party_models.CACHE_DIR, help="Directory of the result cache")
+parser.add_argument('--n', type=int, default=40, help="Number of top words per party")
+args = parser.parse_args()
+
+
+def main():
+    
+    # get data (same dataset as the app, so that dataset versions match)
+    data = stats_helpers.get_raw_data(local=args.local, db_file=args.db_file)
+    
+    # vectorize corpus
+    print(f'Vectorizing {len(data)} tweets ...')
+    feature_store = my_nlp.build_tfidf_feature_store(data)
+    print(f'Dataset version: {feature_store["version"]}')
+    
+    # train models for all standard windows
+    n_trained = party_models.precompute_standard_windows(feature_store, n=args.n, cache_dir=args.cache_dir, verbose=1)
+    print(f'Trained {n_trained} new models.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+"""Trains the party classifier out-of-core:
+Reads pre-processed tweets in chunks from a local database file and trains
+incrementally on hashing features, so memory does not grow with the corpus.
+"""
+
+import argparse
+import json
+import os
+
+import bundestweets.nlp as my_nlp
+import bundestweets.streaming as streaming
+
+parser = argparse.ArgumentParser()
+parser.add_argument("file", help="Pre-processed database file")
+parser.add_argument("--chunk_size", type=int, default=10000, help="Number of tweets read per chunk")
+parser.add_argument("--n_features", type=int, default=2**20, help="Number of hash buckets")
+parser.add_argument("--epochs", type=int, default=3, help="Number of passes over the database")
+parser.add_argument("--output", default="party_classifier_streaming.joblib", help="File for model and feature map")
+args = parser.parse_args()
+
+
+def main():
+    import joblib
+    
+    # read members once, then stream tweets from the database
+    username2party = streaming.get_username_to_party()
+    get_chunks = lambda: streaming.iter_tweet_chunks(args.file, chunk_size=args.chunk_size,
+                                                     username2party=username2party)
+    
+    # train
+    model, feature_map, train_acc, test_acc = streaming.perform_streaming_party_regression_analysis(
+        get_chunks, n_features=args.n_features, n_epochs=args.epochs, verbose=1)
+    
+    # top words report
+    translation_set = {}
+    if os.path.isfile('bundestweets/data/translation_set.json'):
+        with open('bundestweets/data/translation_set.json', 'r') as fp:
+            translation_set = json.load(fp)
+    party_word_importance = my_nlp.get_party_word_importance(model, feature_map, translation_set, n=10)
+    for party, word_importance in party_word_importance.items():
+        print(f'{party}: {" ".join(word_importance.keys())}')
+    
+    # save results
+    joblib.dump({'model': model, 'feature_map': feature_map}, args.output)
+
+
+if __name__ == '__main__':
+    main()